@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Attachments - Large outputs stored next to the notebook
+"""
+
+import os
+import gzip
+import json
+import zlib
+import shutil
+import hashlib
+import tempfile
+
+# Chiave nei metadati dell'output che sostituisce quello salvato a parte
+ATTACHMENT_KEY = 'qnotebook_attachment'
+
+# Campione usato per capire se conviene comprimere
+SAMPLE_SIZE = 64 * 1024
+
+
+def attachment_directory(filename):
+    """Folder of the attachments of the notebook ``filename``."""
+    root, _ = os.path.splitext(os.path.abspath(filename))
+    return root + '.qnotebook-files'
+
+
+def compression_level(data):
+    """gzip level for ``data``: 0 if it is already compressed, like PNG in base64."""
+    sample = data[:SAMPLE_SIZE]
+    if len(zlib.compress(sample, 1)) > len(sample) * 0.7:
+        return 0
+    return 6
+
+
+def reference_digest(output_data):
+    """Hash of the attachment an output refers to, or None."""
+    reference = output_data.get('metadata', {}).get(ATTACHMENT_KEY)
+    if isinstance(reference, dict):
+        return reference.get('sha256')
+    return None
+
+
+class AttachmentStore:
+    """Content-addressed store of compressed notebook outputs.
+
+    Outputs larger than ``threshold`` bytes of JSON are written once, gzip
+    compressed and named by their SHA-256, to a folder next to the notebook.
+    The notebook keeps a small ``display_data`` output in their place, so
+    other tools show a placeholder text. With ``threshold=None`` references
+    are resolved and every output is written inline again.
+
+    ``source`` is the store the notebook was loaded from; attachments
+    missing here are copied from it, e.g. after "Save as".
+    """
+
+    def __init__(self, directory, threshold=None, source=None):
+        self.directory = directory
+        self.threshold = threshold
+        self.source = source
+        self.used = set()
+
+    def path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest + '.json.gz')
+
+    def put(self, data):
+        """Store the bytes ``data`` and return their hash."""
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.path(digest)
+        if not os.path.exists(path):
+            # Contenuto già presente: nessuna riscrittura
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+            try:
+                with os.fdopen(handle, 'wb') as f:
+                    f.write(gzip.compress(data, compression_level(data), mtime=0))
+                os.replace(temp_path, path)
+            except BaseException:
+                if os.path.exists(temp_path):
+                    os.remove(temp_path)
+                raise
+        self.used.add(digest)
+        return digest
+
+    def get(self, digest):
+        """Return the bytes stored under ``digest`` (OSError if missing)."""
+        with open(self.path(digest), 'rb') as f:
+            return gzip.decompress(f.read())
+
+    def has(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def externalize(self, outputs):
+        """Prepare the outputs of a cell for saving.
+
+        ``outputs`` is a list of output dictionaries or raw JSON bytes;
+        raw outputs without references that are small enough are returned
+        unchanged.
+        """
+        if isinstance(outputs, bytes):
+            has_references = ATTACHMENT_KEY.encode() in outputs
+            if not has_references and (self.threshold is None or len(outputs) <= self.threshold):
+                return outputs
+            if has_references and self.threshold is not None and len(outputs) <= self.threshold:
+                # Solo riferimenti: restano così, basta che i file esistano. Letti
+                # dal JSON, non dal testo: un altro programma può averlo riformattato
+                for output_data in json.loads(outputs):
+                    digest = reference_digest(output_data)
+                    if digest is not None:
+                        self.keep(digest)
+                return outputs
+            outputs = json.loads(outputs)
+
+        result = []
+        for output_data in outputs:
+            digest = reference_digest(output_data)
+            if digest is not None:
+                if self.threshold is None:
+                    output_data = self.load(output_data)
+                else:
+                    self.keep(digest)
+                result.append(output_data)
+                continue
+            if self.threshold is not None:
+                data = json.dumps(output_data, ensure_ascii=False, sort_keys=True).encode('utf-8')
+                if len(data) > self.threshold:
+                    output_data = self.reference(output_data, self.put(data), len(data))
+            result.append(output_data)
+        return result
+
+    def reference(self, output_data, digest, size):
+        """Output saved in the notebook in place of ``output_data``."""
+        name = os.path.basename(self.directory)
+        return {
+            'output_type': 'display_data',
+            'data': {'text/plain': f"[{output_data.get('output_type', 'output')} "
+                                   f"of {size // 1024} KB stored in {name}]"},
+            'metadata': {ATTACHMENT_KEY: {'sha256': digest, 'size': size}},
+        }
+
+    def keep(self, digest):
+        """Record that ``digest`` is still referenced, copying it if needed."""
+        if not self.has(digest) and self.source is not None and self.source.has(digest):
+            os.makedirs(os.path.dirname(self.path(digest)), exist_ok=True)
+            shutil.copyfile(self.source.path(digest), self.path(digest))
+        self.used.add(digest)
+
+    def load(self, output_data):
+        """Return the output a reference stands for; the reference if missing."""
+        digest = reference_digest(output_data)
+        for store in (self, self.source):
+            if store is not None and store.has(digest):
+                try:
+                    return json.loads(store.get(digest))
+                except (OSError, ValueError):
+                    pass
+        return output_data
+
+    def resolve(self, outputs):
+        """Replace the references in ``outputs`` with the stored outputs."""
+        return [self.load(output_data) if reference_digest(output_data) else output_data
+                for output_data in outputs]
+
+    def prune(self):
+        """Delete the attachments not used by the last save."""
+        if not os.path.isdir(self.directory):
+            return
+        for prefix in os.listdir(self.directory):
+            folder = os.path.join(self.directory, prefix)
+            if not os.path.isdir(folder):
+                continue
+            for name in os.listdir(folder):
+                if name.endswith('.json.gz') and name[:-len('.json.gz')] not in self.used:
+                    try:
+                        os.remove(os.path.join(folder, name))
+                    except OSError:
+                        pass
+            if not os.listdir(folder):
+                os.rmdir(folder)
+
+
+def attach_store(notebook, filename):
+    """Let the cells of a notebook read from ``filename`` resolve their references."""
+    directory = attachment_directory(filename)
+    if os.path.isdir(directory):
+        notebook.attachments = AttachmentStore(directory)
+        for cell in notebook.cells:
+            cell.attachments = notebook.attachments
+    return notebook
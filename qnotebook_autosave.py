@@ -0,0 +1,345 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Autosave - Background saving and edit journal
+"""
+
+import os
+import glob
+import json
+import time
+import shutil
+
+from qgis.PyQt.QtCore import (
+    QObject, QThread, QTimer, QSettings, QEvent, QCoreApplication, pyqtSignal
+)
+
+from .qnotebook_attachments import AttachmentStore, attachment_directory
+from .qnotebook_model import CellModel, atomic_write, write_snapshot
+
+
+def recovery_directory():
+    """Folder for the autosaves of notebooks that were never saved."""
+    try:
+        from qgis.core import QgsApplication
+        base = QgsApplication.qgisSettingsDirPath()
+    except ImportError:
+        base = ''
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.qnotebook')
+    return os.path.join(base, 'qnotebook', 'autosave')
+
+
+def journal_path(filename):
+    """Path of the edit journal kept next to ``filename``."""
+    directory, name = os.path.split(os.path.abspath(filename))
+    return os.path.join(directory, f".{name}.qnotebook-journal")
+
+
+class EditJournal:
+    """Append-only log of cell edits, one JSON object per line.
+
+    Entries refer to cells by index and are replayed in order on top of the
+    last saved file: ``cell`` sets type and source, ``insert`` adds an empty
+    cell, ``delete`` removes one.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+    def record(self, op, **fields):
+        fields['op'] = op
+        fields['time'] = time.time()
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(fields, ensure_ascii=False) + '\n')
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def discard_before(self, offset):
+        """Drop the entries written before ``offset`` (already in a saved file)."""
+        try:
+            with open(self.path, 'rb') as f:
+                f.seek(offset)
+                rest = f.read()
+        except OSError:
+            return
+        if rest:
+            atomic_write(self.path, lambda f: f.write(rest))
+        else:
+            self.remove()
+
+    def remove(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+    def entries(self):
+        """Return the recorded entries; a truncated last line is ignored."""
+        entries = []
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    try:
+                        entries.append(json.loads(line))
+                    except ValueError:
+                        break
+        except OSError:
+            pass
+        return entries
+
+
+def apply_journal(notebook, entries):
+    """Replay journal ``entries`` on a NotebookModel; return how many applied."""
+    applied = 0
+    for entry in entries:
+        op = entry.get('op')
+        index = entry.get('index', -1)
+        if op == 'insert' and 0 <= index <= len(notebook.cells):
+            notebook.cells.insert(index, CellModel(entry.get('cell_type', 'code')))
+        elif op == 'delete' and 0 <= index < len(notebook.cells):
+            del notebook.cells[index]
+        elif op == 'cell' and 0 <= index < len(notebook.cells):
+            cell = notebook.cells[index]
+            cell.cell_type = entry.get('cell_type', cell.cell_type)
+            cell.source = entry.get('source', '')
+        else:
+            continue
+        applied += 1
+    if applied:
+        notebook.touch()
+    return applied
+
+
+class NotebookSaver(QThread):
+    """Write a notebook snapshot to disk on a worker thread."""
+
+    saved = pyqtSignal(str, int)
+    failed = pyqtSignal(str)
+
+    def __init__(self, snapshot, filename, revision, attachments=None, parent=None):
+        super().__init__(parent)
+        self.snapshot = snapshot
+        self.filename = filename
+        self.revision = revision
+        self.attachments = attachments
+
+    def run(self):
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.filename)), exist_ok=True)
+            atomic_write(self.filename,
+                         lambda f: write_snapshot(f, self.snapshot, self.attachments))
+            if self.attachments is not None and self.attachments.threshold is not None:
+                self.attachments.prune()
+        except (OSError, ValueError) as e:
+            self.failed.emit(str(e))
+            return
+        self.saved.emit(self.filename, self.revision)
+
+
+class QNotebookAutosave(QObject):
+    """Periodic background saving of a notebook widget.
+
+    The notebook is written only when its revision changed since the last
+    save, to its own file or, if it was never saved, to the recovery folder.
+    The recovery files are removed once the notebook is saved under a name
+    or QGIS quits normally: they are only for crashes.
+    With the ``QNotebook/edit_journal`` setting, cell edits are also
+    appended to a journal within a second, so little is lost between two
+    saves; the journal is emptied once a save contains its entries.
+
+    With ``QNotebook/external_outputs``, outputs larger than
+    ``QNotebook/external_output_kb`` are saved in an AttachmentStore next
+    to the notebook instead of inline.
+    """
+
+    saved = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    # Ritardo (ms) prima di scrivere le modifiche nel diario
+    JOURNAL_DELAY = 1000
+
+    def __init__(self, widget):
+        super().__init__(widget)
+        self.widget = widget
+        self.filename = None
+        self.saved_revision = 0
+        self.saver = None
+        self.journal = None
+        self.journal_offset = 0
+        self.edited = []
+
+        settings = QSettings()
+        self.interval = int(settings.value('QNotebook/autosave_seconds', 120))
+        self.journal_enabled = settings.value('QNotebook/edit_journal', False, type=bool)
+        self.external_outputs = settings.value('QNotebook/external_outputs', False, type=bool)
+        self.external_threshold = int(settings.value('QNotebook/external_output_kb', 64)) * 1024
+        self.recovery_filename = os.path.join(
+            recovery_directory(), f"untitled-{os.getpid()}-{id(widget):x}.ipynb")
+        self.recovery_written = False
+        application = QCoreApplication.instance()
+        if application is not None:
+            application.aboutToQuit.connect(self.remove_recovery)
+
+        self.timer = QTimer(self)
+        self.timer.timeout.connect(self.autosave)
+        if self.interval > 0:
+            self.timer.start(self.interval * 1000)
+
+        self.journal_timer = QTimer(self)
+        self.journal_timer.setSingleShot(True)
+        self.journal_timer.setInterval(self.JOURNAL_DELAY)
+        self.journal_timer.timeout.connect(self.flush_journal)
+
+        self.reset(None)
+
+    def target(self):
+        return self.filename or self.recovery_filename
+
+    def is_dirty(self):
+        return self.widget.notebook.revision != self.saved_revision
+
+    def mark_clean(self):
+        """Consider the notebook saved as it is (e.g. the first empty cell)."""
+        self.saved_revision = self.widget.notebook.revision
+
+    def reset(self, filename):
+        """Start tracking a notebook just loaded from (or saved to) ``filename``."""
+        self.edited = []
+        self.journal_timer.stop()
+        self.filename = filename
+        self.saved_revision = self.widget.notebook.revision
+        self.journal = None
+        if self.journal_enabled:
+            self.journal = EditJournal(journal_path(self.target()))
+            self.journal_offset = 0
+            os.makedirs(os.path.dirname(self.journal.path), exist_ok=True)
+
+    def pending_recovery(self, filename):
+        """Journal entries left for ``filename`` by a session that did not save."""
+        journal = EditJournal(journal_path(filename))
+        try:
+            if os.path.getmtime(journal.path) < os.path.getmtime(filename):
+                return []
+        except OSError:
+            return []
+        return journal.entries()
+
+    def discard_recovery(self, filename):
+        EditJournal(journal_path(filename)).remove()
+
+    def cell_edited(self, model):
+        """Remember an edited cell for the journal."""
+        if self.journal is None:
+            return
+        if model not in self.edited:
+            self.edited.append(model)
+        if not self.journal_timer.isActive():
+            self.journal_timer.start()
+
+    def cell_inserted(self, index, model):
+        if self.journal is not None:
+            self.record('insert', index=index, cell_type=model.cell_type)
+
+    def cell_deleted(self, index):
+        if self.journal is not None:
+            self.record('delete', index=index)
+
+    def flush_journal(self):
+        """Append the pending cell edits to the journal.
+
+        Must run before cells are inserted or removed, since edits are
+        recorded by cell position.
+        """
+        self.journal_timer.stop()
+        edited, self.edited = self.edited, []
+        cells = self.widget.notebook.cells
+        for model in edited:
+            if model in cells:
+                self.record('cell', index=cells.index(model),
+                            cell_type=model.cell_type, source=model.source)
+
+    def record(self, op, **fields):
+        try:
+            self.journal.record(op, **fields)
+        except OSError as e:
+            self.journal = None
+            self.failed.emit(f"Edit journal disabled: {str(e)}")
+
+    def autosave(self):
+        if self.is_dirty():
+            self.save()
+
+    def save(self, filename=None):
+        """Save in the background; return False if a save is already running."""
+        if self.saver is not None:
+            return False
+        if filename is not None and filename != self.filename:
+            self.filename = filename
+            self.journal = EditJournal(journal_path(filename)) if self.journal_enabled else None
+            self.journal_offset = 0
+
+        if self.journal is not None:
+            self.flush_journal()
+            self.journal_offset = self.journal.size()
+
+        if self.filename is None:
+            self.recovery_written = True
+        notebook = self.widget.sync_notebook(self.target())
+        self.saver = NotebookSaver(notebook.snapshot(), self.target(), notebook.revision,
+                                   self.attachment_store(notebook), self)
+        self.saver.saved.connect(self.on_saved)
+        self.saver.failed.connect(self.failed)
+        self.saver.finished.connect(self.on_saver_finished)
+        self.saver.start()
+        return True
+
+    def attachment_store(self, notebook):
+        """Store the outputs are written through, or None to write them inline."""
+        if not self.external_outputs and notebook.attachments is None:
+            return None
+        # Senza l'opzione, i riferimenti letti dal file tornano inline
+        threshold = self.external_threshold if self.external_outputs else None
+        return AttachmentStore(attachment_directory(self.target()), threshold, notebook.attachments)
+
+    def on_saved(self, filename, revision):
+        self.saved_revision = revision
+        if self.journal is not None:
+            self.journal.discard_before(self.journal_offset)
+            self.journal_offset = 0
+        if filename != self.recovery_filename and self.recovery_written:
+            self.remove_recovery()
+        self.saved.emit(filename)
+
+    def on_saver_finished(self):
+        if self.saver is not None:
+            self.saver.deleteLater()
+            self.saver = None
+
+    def wait(self):
+        """Block until the running save, if any, is finished and reported."""
+        if self.saver is not None:
+            self.saver.wait()
+            # saved/failed/finished sono in coda: consegnali ora, non dopo il
+            # salvataggio successivo
+            QCoreApplication.sendPostedEvents(None, QEvent.MetaCall)
+            self.on_saver_finished()
+
+    def remove_recovery(self):
+        """Delete the autosave of the untitled notebook and its side files."""
+        if self.saver is not None and self.saver.filename == self.recovery_filename:
+            self.saver.wait()
+        self.recovery_written = False
+        root, _ = os.path.splitext(self.recovery_filename)
+        paths = glob.glob(glob.escape(root) + '.*') + [journal_path(self.recovery_filename)]
+        for path in paths:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+                continue
+            try:
+                os.remove(path)
+            except OSError:
+                pass
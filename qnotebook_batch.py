@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Batch - Run many notebooks in parallel worker processes
+"""
+
+import os
+import re
+import sys
+import json
+import time
+import tempfile
+import subprocess
+from concurrent.futures import ThreadPoolExecutor
+
+# Righe finali del log di un notebook riportate nel riepilogo
+LOG_TAIL_LINES = 20
+
+
+def find_notebooks(paths):
+    """Expand files and folders into the sorted list of notebooks to run."""
+    notebooks = []
+    for path in paths:
+        if not os.path.isdir(path):
+            notebooks.append(path)
+            continue
+        for root, folders, files in os.walk(path):
+            folders[:] = sorted(f for f in folders if not f.startswith('.'))
+            notebooks.extend(os.path.join(root, name) for name in sorted(files)
+                             if name.endswith('.ipynb') and not name.startswith('.'))
+    return notebooks
+
+
+def output_paths(tasks, output_dir):
+    """Files the executed copies of ``(notebook, set name)`` tasks are written to.
+
+    Without an output folder notebooks are written in place, or next to the
+    original with the parameter set name appended.
+    """
+    paths = []
+    used = set()
+    for notebook, set_name in tasks:
+        if output_dir is None and set_name is None:
+            paths.append(None)
+            continue
+        root, extension = os.path.splitext(os.path.basename(notebook))
+        if set_name is not None:
+            root += '-' + re.sub(r'[^\w.-]+', '_', set_name)
+        folder = output_dir or os.path.dirname(notebook)
+        path, number = os.path.join(folder, root + extension), 1
+        while path in used:
+            number += 1
+            path = os.path.join(folder, f"{root}-{number}{extension}")
+        used.add(path)
+        paths.append(path)
+    return paths
+
+
+class BatchRunner:
+    """Run notebooks with ``python -m <plugin>.run``, ``jobs`` at a time.
+
+    Every notebook gets its own process, and so its own QgsApplication and
+    namespace: a crash, a leak or a stuck cell only affects that notebook,
+    and a notebook running longer than ``timeout`` seconds is killed.
+    """
+
+    def __init__(self, jobs=None, timeout=None, output_dir=None, allow_errors=False,
+                 save=True, trace_allocations=False, progress=None):
+        self.jobs = jobs or os.cpu_count() or 1
+        self.timeout = timeout
+        self.output_dir = output_dir
+        self.allow_errors = allow_errors
+        self.save = save
+        self.trace_allocations = trace_allocations
+        # Chiamata con il riepilogo di ogni notebook appena finito
+        self.progress = progress
+
+    def command(self, notebook, output, report, parameters=None):
+        package = __spec__.parent if __spec__ is not None else ''
+        command = [sys.executable, '-m', f'{package}.run' if package else 'run',
+                   notebook, '--quiet', '--report', report]
+        if parameters:
+            command += ['--parameters', parameters]
+        if output:
+            command += ['--output', output]
+        if self.allow_errors:
+            command.append('--allow-errors')
+        if not self.save:
+            command.append('--no-save')
+        if self.trace_allocations:
+            command.append('--trace-allocations')
+        return command
+
+    def environment(self):
+        """Environment of the workers, able to import the plugin package."""
+        env = dict(os.environ)
+        plugins_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        env['PYTHONPATH'] = os.pathsep.join(filter(None, [plugins_dir, env.get('PYTHONPATH')]))
+        return env
+
+    def run_one(self, notebook, set_name, parameters, output, env):
+        handle, report = tempfile.mkstemp(prefix='qnotebook-report-', suffix='.json')
+        os.close(handle)
+        parameters_file = None
+        if parameters:
+            handle, parameters_file = tempfile.mkstemp(prefix='qnotebook-parameters-', suffix='.json')
+            with os.fdopen(handle, 'w', encoding='utf-8') as f:
+                json.dump(parameters, f)
+        summary = {'notebook': notebook, 'parameters': set_name, 'output': output or notebook,
+                   'status': 'ok', 'seconds': 0.0, 'cells': 0, 'failed_cell': None}
+        start = time.perf_counter()
+        try:
+            process = subprocess.run(self.command(notebook, output, report, parameters_file), env=env,
+                                     stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                                     timeout=self.timeout)
+            log = process.stdout
+            summary['exit_code'] = process.returncode
+            summary['status'] = {0: 'ok', 1: 'failed'}.get(process.returncode, 'error')
+        except subprocess.TimeoutExpired as e:
+            # subprocess.run ha già terminato il processo
+            log = e.output or b''
+            summary['status'] = 'timeout'
+        summary['seconds'] = time.perf_counter() - start
+
+        try:
+            with open(report, encoding='utf-8') as f:
+                cells = json.load(f)['cells']
+            summary['cells'] = len(cells)
+            failed = [cell for cell in cells if not cell['ok']]
+            if failed:
+                summary['failed_cell'] = failed[0]['index'] + 1
+        except (OSError, ValueError, KeyError):
+            pass
+        finally:
+            os.remove(report)
+            if parameters_file:
+                os.remove(parameters_file)
+
+        if summary['status'] != 'ok':
+            lines = log.decode('utf-8', 'replace').splitlines()
+            summary['log'] = '\n'.join(lines[-LOG_TAIL_LINES:])
+        if self.progress is not None:
+            self.progress(summary)
+        return summary
+
+    def run(self, notebooks, parameters=None, parameter_sets=None):
+        """Run ``notebooks``; return their summaries in the same order.
+
+        ``parameters`` are injected in every run. With ``parameter_sets``
+        (set name -> parameters) each notebook runs once per set.
+        """
+        tasks = []
+        for notebook in notebooks:
+            if parameter_sets is None:
+                tasks.append((notebook, None, dict(parameters or {})))
+                continue
+            for set_name, values in parameter_sets.items():
+                tasks.append((notebook, set_name, dict(parameters or {}, **values)))
+
+        if self.output_dir:
+            os.makedirs(self.output_dir, exist_ok=True)
+        outputs = output_paths([(notebook, set_name) for notebook, set_name, _ in tasks],
+                               self.output_dir)
+        env = self.environment()
+        with ThreadPoolExecutor(max_workers=self.jobs) as pool:
+            futures = [pool.submit(self.run_one, notebook, set_name, values, output, env)
+                       for (notebook, set_name, values), output in zip(tasks, outputs)]
+            return [future.result() for future in futures]
+
+
+def format_summary(summaries, seconds):
+    """Text table of the batch results."""
+    lines = []
+    def label(summary):
+        name = os.path.basename(summary['notebook'])
+        return f"{name} [{summary['parameters']}]" if summary['parameters'] is not None else name
+
+    width = max([len(label(s)) for s in summaries] + [8])
+    for summary in summaries:
+        status = summary['status']
+        if summary['failed_cell']:
+            status += f" (cell {summary['failed_cell']})"
+        lines.append(f"{label(summary):<{width}}  "
+                     f"{summary['seconds']:8.1f} s  {summary['cells']:>4} cells  {status}")
+    counts = {}
+    for summary in summaries:
+        counts[summary['status']] = counts.get(summary['status'], 0) + 1
+    totals = ', '.join(f"{count} {status}" for status, count in sorted(counts.items()))
+    lines.append(f"{len(summaries)} notebooks in {seconds:.1f} s: {totals}")
+    return '\n'.join(lines)
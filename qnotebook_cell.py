@@ -3,138 +3,122 @@
 QNotebook Cell - Single notebook cell implementation
 """
 
-import sys
-import traceback
-from io import StringIO
-
 from qgis.PyQt.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QTextEdit,
-    QPushButton, QLabel, QFrame
+    QPushButton, QLabel, QFrame, QTableWidget, QTableWidgetItem, QAbstractItemView
 )
-from qgis.PyQt.QtCore import Qt, pyqtSignal
-from qgis.PyQt.QtGui import QFont
+from qgis.PyQt.QtCore import Qt, QTimer, QUrl, pyqtSignal
+from qgis.PyQt.QtGui import QFont, QColor, QTextCursor, QTextCharFormat, QDesktopServices
 
 from qgis.gui import QgsCodeEditorPython
 
+from .qnotebook_output import CellOutputStore
+from .qnotebook_model import CellModel
+from .qnotebook_codecache import cell_filename
+from .qnotebook_metrics import format_metrics
+from .qnotebook_profiler import PROFILE_MIME, PROFILE_KEY, format_value, sort_value
+from .qnotebook_session import QNotebookSession
+
+class ProfileItem(QTableWidgetItem):
+    """Cella della tabella del profilo, ordinata per valore e non per testo."""
+    
+    def __init__(self, value, column):
+        super().__init__(format_value(value, column))
+        self.value = sort_value(value)
+        if not isinstance(self.value, str):
+            self.setTextAlignment(int(Qt.AlignRight | Qt.AlignVCenter))
+    
+    def __lt__(self, other):
+        if isinstance(other, ProfileItem) and type(self.value) is type(other.value):
+            return self.value < other.value
+        return super().__lt__(other)
+
+
 class QNotebookCell(QFrame):
     """Single notebook cell."""
     
     executed = pyqtSignal(object)
+    execution_finished = pyqtSignal(object, bool)
     deleted = pyqtSignal(object)
     selected = pyqtSignal(object)
+    # Sorgente, tipo o output modificati (per il salvataggio automatico)
+    changed = pyqtSignal(object)
     
-    def __init__(self, shell=None, cell_type='code', iface=None, parent=None, shared_namespace=None):
+    def __init__(self, shell=None, cell_type='code', iface=None, parent=None, session=None,
+                 model=None):
         super().__init__(parent)
         self.shell = shell
-        self.cell_type = cell_type
         self.iface = iface
-        self.execution_count = 0
-        self.outputs = []
+        # Dati della cella (sorgente, output, metadati); il widget ne è la vista
+        self.model = model if model is not None else CellModel(cell_type)
+        self.cell_number = 0
+        # Prefisso dei nomi di file della vista notebook (es. "nb2")
+        self.filename_prefix = None
+        self.current_job = None
+        
+        # Output di stream con limite di memoria (il resto va su file)
+        self.output_store = CellOutputStore()
         
-        # Usa namespace condiviso se fornito, altrimenti creane uno
-        self.shared_namespace = shared_namespace if shared_namespace is not None else self.create_default_namespace()
+        # Kernel condiviso dal notebook, altrimenti uno dedicato
+        self.session = session if session is not None else QNotebookSession(iface, self)
+        self.executor = self.session.executor
         
         self.setup_ui()
+        if model is not None:
+            self.show_model()
     
-    def create_default_namespace(self):
-        """Crea un namespace di default con le variabili QGIS."""
-        from qgis.core import (
-            Qgis, QgsProject, QgsVectorLayer, QgsRasterLayer,
-            QgsFeature, QgsGeometry, QgsPointXY, QgsField,
-            QgsVectorFileWriter, QgsCoordinateTransformContext,
-            QgsMapSettings, QgsSymbol, QgsSimpleMarkerSymbolLayer,
-            QgsGraduatedSymbolRenderer, QgsRendererRange,
-            QgsClassificationRange, QgsStyle, QgsColorRamp,
-            QgsGradientColorRamp, QgsApplication, QgsProcessingFeedback,
-            QgsCoordinateReferenceSystem, QgsRectangle, QgsExpression,
-            QgsExpressionContext, QgsExpressionContextUtils
-        )
-        from qgis.PyQt.QtCore import QVariant
-        from qgis.PyQt.QtGui import QColor
-        
-        try:
-            from qgis.utils import iface
-        except:
-            iface = self.iface
-        
-        namespace = {
-            '__name__': '__main__',
-            '__builtins__': __builtins__,
-            'iface': iface,
-            'Qgis': Qgis,
-            'QgsProject': QgsProject,
-            'QgsVectorLayer': QgsVectorLayer,
-            'QgsRasterLayer': QgsRasterLayer,
-            'QgsFeature': QgsFeature,
-            'QgsGeometry': QgsGeometry,
-            'QgsPointXY': QgsPointXY,
-            'QgsField': QgsField,
-            'QVariant': QVariant,
-            'QgsVectorFileWriter': QgsVectorFileWriter,
-            'QgsCoordinateTransformContext': QgsCoordinateTransformContext,
-            'QgsMapSettings': QgsMapSettings,
-            'QgsSymbol': QgsSymbol,
-            'QgsSimpleMarkerSymbolLayer': QgsSimpleMarkerSymbolLayer,
-            'QgsGraduatedSymbolRenderer': QgsGraduatedSymbolRenderer,
-            'QgsRendererRange': QgsRendererRange,
-            'QgsClassificationRange': QgsClassificationRange,
-            'QgsStyle': QgsStyle,
-            'QgsColorRamp': QgsColorRamp,
-            'QgsGradientColorRamp': QgsGradientColorRamp,
-            'QgsApplication': QgsApplication,
-            'QgsProcessingFeedback': QgsProcessingFeedback,
-            'QgsCoordinateReferenceSystem': QgsCoordinateReferenceSystem,
-            'QgsRectangle': QgsRectangle,
-            'QgsExpression': QgsExpression,
-            'QgsExpressionContext': QgsExpressionContext,
-            'QgsExpressionContextUtils': QgsExpressionContextUtils,
-            'QColor': QColor,
-            'canvas': iface.mapCanvas() if iface else None,
-            'project': QgsProject.instance(),
-        }
-        
-        # Aggiungi moduli comuni se disponibili
-        try:
-            import processing
-            namespace['processing'] = processing
-        except:
-            pass
-        
-        try:
-            import numpy as np
-            namespace['np'] = np
-        except:
-            pass
-        
-        try:
-            import pandas as pd
-            namespace['pd'] = pd
-        except:
-            pass
-        
-        try:
-            import matplotlib.pyplot as plt
-            namespace['plt'] = plt
-        except:
-            pass
-        
-        try:
-            import statistics
-            namespace['statistics'] = statistics
-        except:
-            pass
-        
-        return namespace
+    @property
+    def cell_id(self):
+        return self.model.cell_id
+    
+    @property
+    def cell_type(self):
+        return self.model.cell_type
+    
+    @cell_type.setter
+    def cell_type(self, value):
+        self.model.cell_type = value
+    
+    @property
+    def execution_count(self):
+        return self.model.execution_count
+    
+    @execution_count.setter
+    def execution_count(self, value):
+        self.model.execution_count = value
+    
+    @property
+    def outputs(self):
+        return self.model.outputs
+    
+    @outputs.setter
+    def outputs(self, value):
+        self.model.outputs = value
+    
+    @property
+    def stale(self):
+        # True se il sorgente è cambiato dall'ultima esecuzione riuscita
+        return self.model.stale
+    
+    @stale.setter
+    def stale(self, value):
+        self.model.stale = value
     
     def setup_ui(self):
         """Setup cell UI."""
         self.setFrameStyle(QFrame.Box)
         layout = QHBoxLayout()
         
-        # Cell number (solo per celle code)
+        # Cell number (solo per celle code) e durata dell'ultima esecuzione
+        number_layout = QVBoxLayout()
         self.number_label = QLabel("[]: ")
         self.number_label.setMinimumWidth(50)
-        layout.addWidget(self.number_label)
+        number_layout.addWidget(self.number_label)
+        self.metrics_label = QLabel()
+        self.metrics_label.setStyleSheet("color: gray; font-size: 8pt;")
+        number_layout.addWidget(self.metrics_label)
+        number_layout.addStretch()
+        layout.addLayout(number_layout)
         
         # Main content area
         content_layout = QVBoxLayout()
@@ -142,6 +126,7 @@ class QNotebookCell(QFrame):
         # Code editor
         self.editor = QgsCodeEditorPython()
         self.editor.setMinimumHeight(60)
+        self.editor.textChanged.connect(self.mark_stale)
         content_layout.addWidget(self.editor)
         
         # Output area
@@ -151,6 +136,16 @@ class QNotebookCell(QFrame):
         self.output.setVisible(False)
         content_layout.addWidget(self.output)
         
+        # Tabella del profilo (%%prun / %%lprun), ordinabile per colonna
+        self.profile_table = QTableWidget()
+        self.profile_table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        self.profile_table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        self.profile_table.verticalHeader().setVisible(False)
+        self.profile_table.horizontalHeader().setStretchLastSection(True)
+        self.profile_table.setMaximumHeight(250)
+        self.profile_table.setVisible(False)
+        content_layout.addWidget(self.profile_table)
+        
         # Buttons
         button_layout = QHBoxLayout()
         self.run_btn = QPushButton("▶ Run")
@@ -165,12 +160,29 @@ class QNotebookCell(QFrame):
         self.delete_btn.clicked.connect(self.delete_cell)
         button_layout.addWidget(self.delete_btn)
         
+        self.full_output_btn = QPushButton("Full output")
+        self.full_output_btn.setToolTip("Open the complete output of this cell")
+        self.full_output_btn.clicked.connect(self.open_full_output)
+        self.full_output_btn.setVisible(False)
+        button_layout.addWidget(self.full_output_btn)
+        
         button_layout.addStretch()
+        
+        # Tag della cella (es. "parameters")
+        self.tags_label = QLabel()
+        self.tags_label.setStyleSheet("color: gray;")
+        button_layout.addWidget(self.tags_label)
         content_layout.addLayout(button_layout)
         
         layout.addLayout(content_layout)
         self.setLayout(layout)
         
+        # Ridisegno (limitato nel tempo) dell'output troncato
+        self.refresh_timer = QTimer(self)
+        self.refresh_timer.setSingleShot(True)
+        self.refresh_timer.setInterval(250)
+        self.refresh_timer.timeout.connect(self.render_outputs)
+        
         # Aggiorna UI in base al tipo di cella
         self.update_cell_type_ui()
     
@@ -183,10 +195,15 @@ class QNotebookCell(QFrame):
             self.number_label.setText("    ")
             self.run_btn.setEnabled(False)
         else:  # code
-            self.number_label.setText(f"[{self.execution_count if self.execution_count else ''}]: ")
+            self.update_number_label()
             self.run_btn.setText("▶ Run")
             self.run_btn.setEnabled(True)
     
+    def update_number_label(self):
+        """Show the execution count of a code cell."""
+        if self.cell_type == 'code':
+            self.number_label.setText(f"[{self.execution_count if self.execution_count else ''}]: ")
+    
     def run_cell(self, advance=True):
         """Execute the cell based on its type."""
         if self.cell_type == 'markdown':
@@ -245,63 +262,207 @@ class QNotebookCell(QFrame):
     
     def get_execution_namespace(self):
         """Ottieni il namespace per l'esecuzione del codice."""
-        # Se abbiamo accesso alla shell della console, usa il suo namespace
-        if self.shell and hasattr(self.shell, 'locals'):
-            return self.shell.locals
-        
-        # Altrimenti usa il namespace condiviso
-        return self.shared_namespace
+        # Namespace della sessione (quello della console, se collegata)
+        return self.session.namespace
     
     def execute_code(self, advance=True):
-        """Execute Python code."""
+        """Execute Python code on the notebook executor."""
         code = self.editor.text()
         if not code.strip():
             return
+        if self.is_running():
+            return
         
-        self.execution_count += 1
+        # Numerazione della sessione: condivisa con le altre viste
+        self.execution_count = self.session.next_execution_count()
         self.number_label.setText(f"[{self.execution_count}]: ")
         
         # Clear previous output
         self.clear_output()
         self.output.setVisible(True)
+        self.outputs = []
         
-        # Capture output
-        old_stdout = sys.stdout
-        old_stderr = sys.stderr
-        stdout_capture = StringIO()
-        stderr_capture = StringIO()
-        
-        sys.stdout = stdout_capture
-        sys.stderr = stderr_capture
-        
-        try:
-            # Ottieni il namespace per l'esecuzione
-            exec_namespace = self.get_execution_namespace()
-            
-            # Esegui il codice nel namespace condiviso
-            exec(code, exec_namespace)
-            
-            # Get output
-            output = stdout_capture.getvalue()
-            if output:
-                self.output.append(output)
-                
-        except Exception as e:
-            error = traceback.format_exc()
-            self.output.append(f"<span style='color: red;'>{error}</span>")
-            
-        finally:
-            sys.stdout = old_stdout
-            sys.stderr = old_stderr
+        # Ottieni il namespace per l'esecuzione
+        exec_namespace = self.get_execution_namespace()
+        
+        job = self.executor.create_job(code, exec_namespace, self.source_filename())
+        job.stdout.connect(lambda text: self.append_stream('stdout', text))
+        job.stderr.connect(lambda text: self.append_stream('stderr', text))
+        job.result.connect(self.append_result)
+        job.display.connect(self.append_display)
+        job.error.connect(self.append_error)
+        job.finished.connect(lambda ok: self.on_execution_finished(ok, advance))
+        
+        self.current_job = job
+        self.run_btn.setEnabled(False)
+        self.number_label.setText("[*]: ")
+        self.metrics_label.clear()
+        self.executor.submit(job)
+    
+    def source_filename(self):
+        """Pseudo filename used to compile the cell (shown in tracebacks)."""
+        return cell_filename(self.cell_number, self.filename_prefix)
+    
+    def is_running(self):
+        """Return True while the cell is queued or executing."""
+        return self.current_job is not None
+    
+    def mark_stale(self):
+        """Copy the edited source to the model and mark it as changed."""
+        self.model.source = self.editor.text()
+        self.stale = True
+        self.changed.emit(self)
+    
+    def on_execution_finished(self, ok, advance=True):
+        """Handle the end of the cell execution."""
+        if self.current_job is not None and self.current_job.from_cache:
+            self.append_output_text("(restored from cache)\n", 'gray')
+        if self.current_job is not None and self.current_job.metrics:
+            self.model.metadata.setdefault('qnotebook', {})['metrics'] = self.current_job.metrics
+            self.update_metrics_label()
+        self.current_job = None
+        self.stale = not ok
+        self.run_btn.setEnabled(True)
+        self.number_label.setText(f"[{self.execution_count}]: ")
+        self.output_store.close()
+        if self.refresh_timer.isActive():
+            self.refresh_timer.stop()
+            self.render_outputs()
         
+        self.changed.emit(self)
+        self.execution_finished.emit(self, ok)
         if advance:
             self.executed.emit(self)
     
+    def append_output_text(self, text, color=None):
+        """Append plain text at the end of the output area."""
+        cursor = self.output.textCursor()
+        cursor.movePosition(QTextCursor.End)
+        text_format = QTextCharFormat()
+        if color:
+            text_format.setForeground(QColor(color))
+        cursor.insertText(text, text_format)
+        self.output.setTextCursor(cursor)
+        self.output.ensureCursorVisible()
+    
+    def append_stream(self, name, text):
+        """Append stdout/stderr text to the output area and to the outputs."""
+        if not text:
+            return
+        was_truncated = self.output_store.truncated
+        if self.output_store.write(text):
+            # Oltre il limite: nel widget solo inizio e fine, il resto su file
+            if not was_truncated:
+                self.outputs = [o for o in self.outputs if o.get('output_type') != 'stream']
+                self.full_output_btn.setVisible(True)
+            if not self.refresh_timer.isActive():
+                self.refresh_timer.start()
+            return
+        
+        self.append_output_text(text, '#c0392b' if name == 'stderr' else None)
+        
+        # Unisci i frammenti consecutivi dello stesso stream
+        self.model.append_stream(name, text)
+    
+    def append_result(self, value):
+        """Show the value of the trailing expression."""
+        self.show_result(value)
+        self.model.append_result(value)
+    
+    def append_display(self, output_data):
+        """Show a display_data output, such as a profile table."""
+        self.show_display(output_data)
+        self.model.append_display(output_data)
+    
+    def append_error(self, ename, evalue, error):
+        """Show an exception raised by the cell."""
+        self.show_error(error)
+        self.model.append_error(ename, evalue, error)
+    
+    def show_result(self, value):
+        self.append_output_text(f"Out[{self.execution_count}]: {value}\n", '#1a5fb4')
+    
+    def show_error(self, error):
+        self.append_output_text(error, 'red')
+    
+    def show_display(self, output_data):
+        data = output_data.get('data', {})
+        text = data.get('text/plain', '')
+        if isinstance(text, list):
+            text = ''.join(text)
+        if PROFILE_MIME not in data:
+            self.append_output_text(text if text.endswith('\n') else text + '\n')
+            return
+        # Solo l'intestazione nel testo, i dati nella tabella
+        self.append_output_text(text.split('\n', 1)[0] + '\n', 'gray')
+        self.show_profile(data[PROFILE_MIME], output_data.get('metadata', {}).get(PROFILE_KEY, {}))
+    
+    def show_profile(self, profile, metadata):
+        """Fill the profile table; click a header to sort by that column."""
+        table = self.profile_table
+        table.setSortingEnabled(False)
+        table.clear()
+        columns = profile.get('columns', [])
+        rows = profile.get('rows', [])
+        table.setColumnCount(len(columns))
+        table.setHorizontalHeaderLabels(columns)
+        table.setRowCount(len(rows))
+        for row, values in enumerate(rows):
+            for column, value in enumerate(values):
+                table.setItem(row, column, ProfileItem(value, columns[column]))
+        table.resizeColumnsToContents()
+        table.setSortingEnabled(True)
+        sort = profile.get('sort')
+        if sort in columns:
+            # Righe in ordine di sorgente, funzioni dalla più costosa
+            order = Qt.AscendingOrder if profile.get('kind') == 'lines' else Qt.DescendingOrder
+            table.sortItems(columns.index(sort), order)
+        table.setToolTip(f"Raw profile: {metadata['pstats']}" if metadata.get('pstats') else "")
+        table.setVisible(True)
+    
+    def render_outputs(self):
+        """Redraw the output area from the bounded store and the outputs."""
+        self.output.clear()
+        self.append_output_text(self.output_store.text())
+        for output_data in self.outputs:
+            output_type = output_data.get('output_type')
+            if output_type == 'execute_result':
+                self.show_result(output_data.get('data', {}).get('text/plain', ''))
+            elif output_type == 'display_data':
+                self.show_display(output_data)
+            elif output_type == 'error':
+                self.show_error('\n'.join(output_data.get('traceback', [])) + '\n')
+    
+    def stream_outputs(self):
+        """Outputs to save, with truncated streams replaced by head and tail."""
+        if not self.output_store.truncated:
+            return self.outputs
+        stream = {'output_type': 'stream', 'name': 'stdout', 'text': self.output_store.text()}
+        return [stream] + [o for o in self.outputs if o.get('output_type') != 'stream']
+    
+    def keep_full_output(self, notebook_filename):
+        """Keep the spilled full output next to the notebook saved as ``notebook_filename``."""
+        if self.output_store.keep(notebook_filename):
+            self.sync_model()
+    
+    def open_full_output(self):
+        """Open the spilled full output with the system viewer."""
+        if self.output_store.path:
+            QDesktopServices.openUrl(QUrl.fromLocalFile(self.output_store.path))
+    
     def clear_output(self):
         """Clear the output area."""
+        self.refresh_timer.stop()
+        self.output_store.reset()
+        self.full_output_btn.setVisible(False)
         self.output.clear()
+        self.profile_table.setRowCount(0)
+        self.profile_table.setVisible(False)
         if not self.output.toPlainText():
             self.output.setVisible(False)
+        if self.outputs:
+            self.outputs = []
+            self.changed.emit(self)
     
     def delete_cell(self):
         """Delete this cell."""
@@ -319,62 +480,115 @@ class QNotebookCell(QFrame):
         """Set cell code."""
         self.editor.setText(code)
     
+    def source(self):
+        """Return the cell source text."""
+        return self.editor.text()
+    
+    def output_text(self):
+        """Return the displayed output as plain text."""
+        return self.output.toPlainText()
+    
+    def set_tag(self, tag, enabled=True):
+        """Add or remove a tag of the cell, e.g. ``parameters``."""
+        self.model.set_tag(tag, enabled)
+        self.update_tags_label()
+        self.changed.emit(self)
+    
+    def update_metrics_label(self):
+        """Show the time of the last run; the other metrics are in the tooltip."""
+        metrics = self.model.metadata.get('qnotebook', {}).get('metrics')
+        if metrics and self.cell_type == 'code':
+            self.metrics_label.setText(format_metrics(metrics))
+            self.metrics_label.setToolTip(format_metrics(metrics, details=True))
+        else:
+            self.metrics_label.clear()
+            self.metrics_label.setToolTip("")
+    
+    def update_tags_label(self):
+        tags = self.model.metadata.get('tags', [])
+        self.tags_label.setText(' '.join(f"#{tag}" for tag in tags))
+        self.tags_label.setVisible(bool(tags))
+    
     def change_type(self, cell_type):
         """Change cell type."""
         self.cell_type = cell_type.lower()
         self.update_cell_type_ui()
+        self.changed.emit(self)
+    
+    def sync_model(self):
+        """Write the state held only by the widgets back to the model."""
+        self.model.source = self.editor.text()
+        self.model.outputs = self.stream_outputs()
+        
+        reference = self.output_store.reference()
+        settings = self.model.metadata.get('qnotebook', {})
+        if reference:
+            # Riferimento all'output completo invece dell'intero testo
+            settings['full_output'] = reference
+        else:
+            settings.pop('full_output', None)
+        if settings:
+            self.model.metadata['qnotebook'] = settings
+        else:
+            self.model.metadata.pop('qnotebook', None)
+        return self.model
     
     def to_dict(self):
         """Convert cell to dictionary."""
-        # Salva source come lista di stringhe (formato Jupyter standard)
-        source_text = self.editor.text()
-        source_lines = source_text.split('\n') if source_text else []
-        
-        return {
-            'cell_type': self.cell_type,
-            'source': source_lines,
-            'execution_count': self.execution_count if self.cell_type == 'code' else None,
-            'outputs': self.outputs,
-            'metadata': {}
-        }
+        return self.sync_model().to_dict()
     
     def from_dict(self, data):
         """Load cell from dictionary."""
-        self.cell_type = data.get('cell_type', 'code')
-        
-        # Gestisci source come lista o stringa
-        source = data.get('source', '')
-        if isinstance(source, list):
-            # Jupyter format: lista di stringhe
-            source = ''.join(source)
-        elif source is None:
-            source = ''
-        
-        self.editor.setText(source)
-        
-        # Gestisci execution_count (solo per celle code)
-        if self.cell_type == 'code':
-            exec_count = data.get('execution_count')
-            if exec_count is None:
-                exec_count = data.get('metadata', {}).get('execution_count', 0)
-            self.execution_count = exec_count if exec_count else 0
-        else:
-            self.execution_count = 0
+        loaded = CellModel.from_dict(data)
+        for name in ('cell_type', 'source', 'outputs', 'execution_count', 'metadata'):
+            setattr(self.model, name, getattr(loaded, name))
+        self.show_model()
+    
+    def show_model(self):
+        """Display the source and the outputs stored in the model."""
+        stale = self.stale
+        self.editor.setText(self.model.source)
+        self.stale = stale
         
         # Aggiorna UI in base al tipo
         self.update_cell_type_ui()
+        self.update_tags_label()
+        self.update_metrics_label()
         
         # Carica outputs se presenti
-        self.outputs = data.get('outputs', [])
-        if self.outputs:
+        outputs = self.outputs
+        reference = self.model.metadata.get('qnotebook', {}).get('full_output')
+        self.clear_output()
+        self.outputs = []
+        if outputs:
             # Mostra gli output salvati
             self.output.setVisible(True)
-            for output_data in self.outputs:
+            for output_data in outputs:
                 if output_data.get('output_type') == 'stream':
                     text = output_data.get('text', '')
                     if isinstance(text, list):
                         text = ''.join(text)
-                    self.output.append(text)
+                    if reference:
+                        # Già troncato al salvataggio: niente nuovo file temporaneo
+                        self.output_store.load_truncated(text, reference)
+                        self.append_output_text(text)
+                        continue
+                    self.append_stream(output_data.get('name', 'stdout'), text)
+                    continue
+                
+                self.outputs.append(output_data)
+                if output_data.get('output_type') == 'execute_result':
+                    text = output_data.get('data', {}).get('text/plain', '')
+                    if isinstance(text, list):
+                        text = ''.join(text)
+                    self.show_result(text)
+                elif output_data.get('output_type') == 'display_data':
+                    self.show_display(output_data)
                 elif output_data.get('output_type') == 'error':
-                    error_text = '\n'.join(output_data.get('traceback', []))
-                    self.output.append(f"<span style='color: red;'>{error_text}</span>")
\ No newline at end of file
+                    self.show_error('\n'.join(output_data.get('traceback', [])) + '\n')
+            self.output_store.close()
+            if self.output_store.truncated:
+                self.refresh_timer.stop()
+                self.render_outputs()
+        
+        self.full_output_btn.setVisible(bool(self.output_store.path))
@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Code Cache - LRU cache of compiled cell code
+"""
+
+import ast
+import hashlib
+import itertools
+import linecache
+import threading
+from collections import OrderedDict
+
+
+def compile_source(source, filename='<cell>'):
+    """Compile cell source, splitting off a trailing expression.
+
+    Returns a ``(body, expression)`` pair of code objects; ``expression`` is
+    None when the last statement is not an expression.
+    """
+    tree = ast.parse(source, filename, 'exec')
+    expression = None
+    if tree.body and isinstance(tree.body[-1], ast.Expr):
+        expression = ast.Expression(tree.body.pop().value)
+    body = compile(tree, filename, 'exec')
+    if expression is not None:
+        expression = compile(expression, filename, 'eval')
+    return body, expression
+
+
+# Numero progressivo delle viste notebook: la vista del dock e quella della
+# console non condividono i nomi delle celle in linecache e nella cache
+_notebook_numbers = itertools.count(1)
+
+
+def new_filename_prefix():
+    """Prefix for the pseudo filenames of a new notebook view: ``nb1``, ``nb2``..."""
+    return f"nb{next(_notebook_numbers)}"
+
+
+def cell_filename(number=0, prefix=None):
+    """Pseudo filename of a cell, e.g. ``<nb2 cell 3>``."""
+    parts = [prefix, 'cell', str(number) if number else None]
+    return '<' + ' '.join(part for part in parts if part) + '>'
+
+
+def register_source(source, filename):
+    """Make ``source`` visible to linecache/traceback under ``filename``."""
+    # mtime None: linecache.checkcache() non rimuove la voce
+    linecache.cache[filename] = (len(source), None, source.splitlines(True), filename)
+
+
+class CodeCache:
+    """Code objects of compiled cells, keyed by source hash and filename.
+
+    The least recently used entries are evicted once ``maxsize`` is reached.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, source, filename='<cell>'):
+        """Return the ``(body, expression)`` code objects for ``source``."""
+        register_source(source, filename)
+        key = (hashlib.sha1(source.encode('utf-8')).hexdigest(), filename)
+
+        with self.lock:
+            code = self.entries.get(key)
+            if code is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return code
+
+        code = compile_source(source, filename)
+
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = code
+            while len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return code
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+# Cache condivisa da tutti i notebook del processo
+code_cache = CodeCache()
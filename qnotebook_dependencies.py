@@ -0,0 +1,257 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Dependencies - Static name analysis and cell dependency graph
+"""
+
+import re
+import ast
+import string
+import builtins
+import functools
+
+# Righe magic (``%time f()``, ``files = !ls``): restano l'assegnazione e i nomi
+# letti dagli argomenti
+_MAGIC_LINE = re.compile(r'^([ \t]*)(?:([\w.\[\], ]+?)\s*=\s*)?(?:%(\w+)|!)(.*)$', re.M)
+
+# Line magic il cui argomento, dopo le opzioni, è codice Python
+_CODE_MAGICS = {'time', 'timeit', 'memit', 'prun'}
+
+
+class _NameCollector(ast.NodeVisitor):
+    """Collect the names a statement reads and binds at module level.
+
+    Names bound inside functions, lambdas and comprehensions are local and are
+    ignored; names those bodies read from outside are reported as reads.
+    Mutations through attributes or subscripts (``layer.setName()``,
+    ``d[k] = v``) count as reads of the object, not as definitions.
+    """
+
+    def __init__(self):
+        self.reads = []
+        self.stores = []
+        self.local_scopes = []
+
+    def bind(self, name):
+        if self.local_scopes:
+            self.local_scopes[-1].add(name)
+        else:
+            self.stores.append(name)
+
+    def is_local(self, name):
+        return any(name in scope for scope in self.local_scopes)
+
+    def visit_Name(self, node):
+        if isinstance(node.ctx, ast.Load):
+            if not self.is_local(node.id):
+                self.reads.append(node.id)
+        else:
+            self.bind(node.id)
+
+    def visit_AugAssign(self, node):
+        # x += 1 legge x prima di riassegnarlo
+        if isinstance(node.target, ast.Name) and not self.is_local(node.target.id):
+            self.reads.append(node.target.id)
+        self.generic_visit(node)
+
+    def visit_Import(self, node):
+        for alias in node.names:
+            self.bind(alias.asname or alias.name.split('.')[0])
+
+    def visit_ImportFrom(self, node):
+        for alias in node.names:
+            if alias.name != '*':
+                self.bind(alias.asname or alias.name)
+
+    def visit_Global(self, node):
+        for name in node.names:
+            self.stores.append(name)
+
+    def visit_arg(self, node):
+        self.bind(node.arg)
+
+    def visit_ExceptHandler(self, node):
+        if node.name:
+            self.bind(node.name)
+        self.generic_visit(node)
+
+    def visit_function(self, node):
+        for decorator in node.decorator_list:
+            self.visit(decorator)
+        for default in node.args.defaults + node.args.kw_defaults:
+            if default is not None:
+                self.visit(default)
+        self.bind(node.name)
+        self.local_scopes.append(set())
+        self.visit(node.args)
+        body = node.body if isinstance(node.body, list) else [node.body]
+        # Prima i nomi locali, poi le letture
+        for statement in body:
+            self.collect_locals(statement)
+        for statement in body:
+            self.visit(statement)
+        self.local_scopes.pop()
+
+    visit_FunctionDef = visit_function
+    visit_AsyncFunctionDef = visit_function
+
+    def visit_Lambda(self, node):
+        for default in node.args.defaults + node.args.kw_defaults:
+            if default is not None:
+                self.visit(default)
+        self.local_scopes.append(set())
+        self.visit(node.args)
+        self.visit(node.body)
+        self.local_scopes.pop()
+
+    def visit_ClassDef(self, node):
+        for expression in node.decorator_list + node.bases:
+            self.visit(expression)
+        self.bind(node.name)
+        self.local_scopes.append(set())
+        for statement in node.body:
+            self.visit(statement)
+        self.local_scopes.pop()
+
+    def visit_comprehension_scope(self, node):
+        self.local_scopes.append(set())
+        for generator in node.generators:
+            self.visit(generator.target)
+        for generator in node.generators:
+            self.visit(generator.iter)
+            for condition in generator.ifs:
+                self.visit(condition)
+        for field in ('elt', 'key', 'value'):
+            child = getattr(node, field, None)
+            if child is not None:
+                self.visit(child)
+        self.local_scopes.pop()
+
+    visit_ListComp = visit_comprehension_scope
+    visit_SetComp = visit_comprehension_scope
+    visit_DictComp = visit_comprehension_scope
+    visit_GeneratorExp = visit_comprehension_scope
+
+    def collect_locals(self, statement):
+        """Bind the names assigned anywhere in a function body."""
+        for node in ast.walk(statement):
+            if isinstance(node, ast.Name) and not isinstance(node.ctx, ast.Load):
+                self.local_scopes[-1].add(node.id)
+
+
+def _magic_code(args):
+    """The Python code of line magic ``args``, without the leading options; None if none."""
+    code = args.strip()
+    # -n 10 -r 3 f(x): si scartano parole finché il resto è Python
+    while code:
+        try:
+            ast.parse(code)
+            return code
+        except SyntaxError:
+            code = code.partition(' ')[2].lstrip()
+    return None
+
+
+def _shell_fields(command):
+    """Names read by the ``{field}`` expansions of a ``!`` command."""
+    names = []
+    try:
+        for _, field, _, _ in string.Formatter().parse(command):
+            match = re.match(r'[A-Za-z_]\w*', field or '')
+            if match:
+                names.append(match.group())
+    except ValueError:
+        pass
+    return names
+
+
+def _magic_statement(match):
+    """Python line standing for a magic line in the analysis."""
+    indent, target, name, args = match.groups()
+    if name is None:
+        code = ', '.join(_shell_fields(args)) or None
+    elif name in _CODE_MAGICS:
+        code = _magic_code(args)
+    else:
+        code = None
+    if code is None:
+        return indent + (f"{target} = None" if target else 'pass')
+    if not target:
+        return indent + code
+    try:
+        ast.parse(code, mode='eval')
+        return f"{indent}{target} = ({code})"
+    except SyntaxError:
+        # %time x = f(): l'istruzione, poi il valore (None) nel target
+        return f"{indent}{code}; {target} = None"
+
+
+@functools.lru_cache(maxsize=1024)
+def analyze_source(source):
+    """Return ``(defines, reads)`` frozensets of global names for a cell.
+
+    ``reads`` only contains names used before the cell binds them itself, so
+    they must come from earlier cells. Sources that do not parse define and
+    read nothing.
+    """
+    if source.startswith('%%'):
+        # Cell magic (es. %%prun): conta solo il corpo
+        source = source.partition('\n')[2]
+    try:
+        tree = ast.parse(source)
+    except SyntaxError:
+        try:
+            tree = ast.parse(_MAGIC_LINE.sub(_magic_statement, source))
+        except SyntaxError:
+            return frozenset(), frozenset()
+
+    defined = set()
+    reads = set()
+    for statement in tree.body:
+        collector = _NameCollector()
+        collector.visit(statement)
+        reads.update(name for name in collector.reads if name not in defined)
+        defined.update(collector.stores)
+
+    reads -= set(dir(builtins))
+    return frozenset(defined), frozenset(reads)
+
+
+class DependencyGraph:
+    """Dependency DAG between the code cells of a notebook.
+
+    Cell ``j`` depends on cell ``i < j`` when ``j`` reads a name whose last
+    definition before ``j`` is in ``i``. Nodes are indexes in ``sources``;
+    None marks a non-code cell.
+    """
+
+    def __init__(self, sources):
+        self.sources = sources
+        self.parents = {}
+        self.children = {}
+        self.build()
+
+    def build(self):
+        last_definition = {}
+        for index, source in enumerate(self.sources):
+            if source is None:
+                continue
+            defines, reads = analyze_source(source)
+            parents = {last_definition[name] for name in reads if name in last_definition}
+            self.parents[index] = parents
+            self.children.setdefault(index, set())
+            for parent in parents:
+                self.children[parent].add(index)
+            for name in defines:
+                last_definition[name] = index
+
+    def downstream(self, roots):
+        """Return ``roots`` plus every cell depending on them, in notebook order."""
+        seen = set()
+        stack = [root for root in roots if root in self.children]
+        while stack:
+            index = stack.pop()
+            if index in seen:
+                continue
+            seen.add(index)
+            stack.extend(self.children[index])
+        return sorted(seen)
@@ -21,6 +21,8 @@ from qgis.core import QgsMessageLog, Qgis
 
 # Import il widget notebook
 from .qnotebook_widget import QNotebookWidget
+from .qnotebook_namespace import timed, timing_report
+from .qnotebook_session import QNotebookSession
 
 
 class QNotebookDockWidget(QDockWidget):
@@ -43,8 +45,18 @@ class QNotebookDockWidget(QDockWidget):
         self.console_tabwidget = None
         self.notebook_widget = None
         
+        # Un solo kernel (namespace ed esecuzione) per il dock e la console
+        with timed("session"):
+            self.session = QNotebookSession(iface, self)
+        
         # Inizializza l'interfaccia
-        self.init_notebook_interface()
+        with timed("dock notebook"):
+            self.init_notebook_interface()
+        QgsMessageLog.logMessage(
+            "QNotebook startup timings:\n" + timing_report(),
+            "QNotebook",
+            Qgis.Info
+        )
         
         # Cerca la console Python e aggiungi il notebook
         QTimer.singleShot(500, self.integrate_with_console)
@@ -56,7 +68,7 @@ class QNotebookDockWidget(QDockWidget):
         layout.setContentsMargins(0, 0, 0, 0)
         
         # Crea il widget notebook standalone
-        self.notebook_widget = QNotebookWidget(self.iface, parent=self)
+        self.notebook_widget = QNotebookWidget(self.iface, parent=self, session=self.session)
         layout.addWidget(self.notebook_widget)
         
         # Imposta il layout al widget principale
@@ -115,11 +127,13 @@ class QNotebookDockWidget(QDockWidget):
             
             if self.console_tabwidget:
                 # Crea un nuovo widget notebook per la console
-                console_notebook = QNotebookWidget(
-                    self.iface, 
-                    console=self.console,
-                    parent=self.console_tabwidget
-                )
+                with timed("console notebook"):
+                    console_notebook = QNotebookWidget(
+                        self.iface, 
+                        console=self.console,
+                        parent=self.console_tabwidget,
+                        session=self.session
+                    )
                 
                 # Aggiungi come tab
                 icon_path = os.path.join(os.path.dirname(__file__), 'icon.png')
@@ -0,0 +1,785 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Executor - Background execution engine for notebook cells
+"""
+
+import sys
+import time
+import ctypes
+import inspect
+import functools
+import threading
+import traceback
+
+from qgis.PyQt.QtCore import (
+    Qt, QObject, QThread, QTimer, QCoreApplication, pyqtSignal
+)
+
+from .qnotebook_metrics import ExecutionMetrics
+from .qnotebook_timeline import IOTracer, make_span
+from .qnotebook_sampler import StackSampler
+from .qnotebook_magics import MagicDispatcher, UsageError, has_magics
+from . import qnotebook_magics
+
+
+class ThreadOutputRouter:
+    """Stream che instrada le scritture verso il sink registrato per il thread corrente.
+
+    Sostituisce sys.stdout/sys.stderr una sola volta: i thread senza sink
+    continuano a scrivere sullo stream originale.
+    """
+
+    def __init__(self, original):
+        self.original = original
+        self.sinks = {}
+
+    def register(self, sink):
+        self.sinks[threading.get_ident()] = sink
+
+    def unregister(self):
+        self.sinks.pop(threading.get_ident(), None)
+
+    def write(self, text):
+        sink = self.sinks.get(threading.get_ident())
+        if sink is None:
+            if self.original is None:
+                return len(text)
+            return self.original.write(text)
+        sink(text)
+        return len(text)
+
+    def flush(self):
+        if threading.get_ident() not in self.sinks and self.original is not None:
+            self.original.flush()
+
+    def isatty(self):
+        return False
+
+    def __getattr__(self, name):
+        return getattr(self.original, name)
+
+
+def install_output_routers():
+    """Installa (se necessario) i router su sys.stdout e sys.stderr."""
+    if not isinstance(sys.stdout, ThreadOutputRouter):
+        sys.stdout = ThreadOutputRouter(sys.stdout)
+    if not isinstance(sys.stderr, ThreadOutputRouter):
+        sys.stderr = ThreadOutputRouter(sys.stderr)
+    return sys.stdout, sys.stderr
+
+
+# Job in esecuzione, per identificativo del thread
+_running_jobs = {}
+
+
+def _wrap_processing_function(function):
+    """Wrap processing.run & co. so notebook jobs can cancel them."""
+    try:
+        signature = inspect.signature(function)
+    except (TypeError, ValueError):
+        signature = None
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        job = _running_jobs.get(threading.get_ident())
+        if job is None or signature is None:
+            return function(*args, **kwargs)
+
+        try:
+            bound = signature.bind_partial(*args, **kwargs)
+        except TypeError:
+            return function(*args, **kwargs)
+        feedback = bound.arguments.get('feedback')
+        if feedback is None and 'feedback' in signature.parameters:
+            from qgis.core import QgsProcessingFeedback
+            feedback = QgsProcessingFeedback()
+            bound.arguments['feedback'] = feedback
+
+        if feedback is not None:
+            job.feedbacks.append(feedback)
+            if job.interrupted:
+                feedback.cancel()
+        start = time.time()
+        try:
+            return function(*bound.args, **bound.kwargs)
+        finally:
+            if feedback is not None and feedback in job.feedbacks:
+                job.feedbacks.remove(feedback)
+            if job.spans is not None:
+                algorithm = next(iter(bound.arguments.values()), None)
+                name = f"processing.{function.__name__}"
+                if isinstance(algorithm, str):
+                    name += f"({algorithm})"
+                job.spans.append(make_span(name, 'processing', start, time.time()))
+
+    wrapper._qnotebook_wrapped = True
+    return wrapper
+
+
+def install_processing_hook():
+    """Make processing.run cancellable from the notebook Stop button.
+
+    Only patches the processing module if it has already been imported.
+    """
+    processing = sys.modules.get('processing')
+    if processing is None:
+        return
+    for name in ('run', 'runAndLoadResults'):
+        function = getattr(processing, name, None)
+        if function is not None and not getattr(function, '_qnotebook_wrapped', False):
+            setattr(processing, name, _wrap_processing_function(function))
+
+
+def execute_source(source, namespace, filename='<cell>', display=None):
+    """Execute cell source, magics included, in ``namespace``.
+
+    Returns the repr of the trailing expression, or None. ``display``
+    receives the display_data outputs of magics such as %%prun. Exceptions
+    raised by the user code propagate to the caller.
+    """
+    value = MagicDispatcher(namespace, filename, display).run(source)
+    if value is not None:
+        namespace['_'] = value
+        return repr(value)
+    return None
+
+
+def format_exception(exc):
+    """Format an exception, hiding the executor's own frames."""
+    if isinstance(exc, UsageError):
+        # Errore di una magic: basta il messaggio
+        return f"UsageError: {exc}\n"
+    hidden = (__file__, qnotebook_magics.__file__)
+    tb = exc.__traceback__
+    while tb is not None and tb.tb_frame.f_code.co_filename in hidden:
+        tb = tb.tb_next
+    summary = traceback.TracebackException(type(exc), exc, tb)
+    # Stop sul thread GUI: l'eccezione parte da MainThreadCancellation.trace
+    while summary.stack and summary.stack[-1].filename in hidden:
+        summary.stack.pop()
+    return ''.join(summary.format())
+
+
+def _check_interrupt():
+    """Do nothing: calling a Python function raises a pending async exception."""
+
+
+class MainThreadCancellation:
+    """Cancellation point for cells running on the GUI thread.
+
+    There the event loop is blocked until the cell ends, so ⏹ could not be
+    handled. Every ``interval`` seconds a watchdog thread asks the
+    interpreter to process the pending events between two bytecodes of the
+    cell (Py_AddPendingCall, as for signal handlers): unlike a trace
+    function running all along, this does not slow the cell down. Once the
+    job is interrupted, a trace function is set on the interrupted frames
+    (as debuggers do) and raises KeyboardInterrupt at the next line; code
+    blocked in a C call stops when it returns.
+    """
+
+    def __init__(self, job, interval=0.1):
+        self.job = job
+        self.interval = interval
+        self.stopped = threading.Event()
+        self.queued = threading.Event()
+        self.thread = None
+        self.previous = None
+        self.frames = []
+
+    def start(self):
+        global _cancellation
+        self.previous = sys.gettrace()
+        _cancellation = self
+        self.thread = threading.Thread(target=self.watch, daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        global _cancellation
+        self.stopped.set()
+        self.thread.join()
+        if _cancellation is self:
+            _cancellation = None
+        if self.frames:
+            for frame in self.frames:
+                frame.f_trace = None
+            self.frames = []
+            sys.settrace(self.previous)
+
+    def watch(self):
+        while not self.stopped.wait(self.interval):
+            if not self.queued.is_set():
+                self.queued.set()
+                ctypes.pythonapi.Py_AddPendingCall(_process_events, None)
+
+    def process_events(self, frame):
+        """Called between two bytecodes of ``frame``."""
+        self.queued.clear()
+        if self.stopped.is_set() or self.frames:
+            return
+        # Il clic su ⏹ chiama interrupt() da qui
+        QCoreApplication.processEvents()
+        if not self.job.interrupted:
+            return
+        # Non da qui: l'eccezione uscirebbe dalla callback, non dalla cella
+        while frame is not None:
+            frame.f_trace = self.trace
+            self.frames.append(frame)
+            frame = frame.f_back
+        sys.settrace(self.trace)
+
+    def trace(self, frame, event, arg):
+        sys.settrace(self.previous)
+        for traced in self.frames:
+            traced.f_trace = None
+        raise KeyboardInterrupt
+
+
+# Cancellazione attiva; la callback resta valida anche dopo la fine della cella
+_cancellation = None
+
+
+@ctypes.CFUNCTYPE(ctypes.c_int, ctypes.c_void_p)
+def _process_events(_):
+    cancellation = _cancellation
+    if cancellation is not None:
+        cancellation.process_events(sys._getframe(1))
+    return 0
+
+
+def on_main_thread():
+    app = QCoreApplication.instance()
+    return app is not None and QThread.currentThread() == app.thread()
+
+
+class _MainThreadInvoker(QObject):
+    """Esegue callable sul thread GUI per conto dei thread di esecuzione."""
+
+    invoke = pyqtSignal(object)
+
+    def __init__(self):
+        super().__init__()
+        self.invoke.connect(self.call, Qt.BlockingQueuedConnection)
+
+    def call(self, function):
+        function()
+
+
+_invoker = None
+
+
+def run_on_main_thread(function, *args, **kwargs):
+    """Call ``function`` on the Qt GUI thread and return its result.
+
+    Code running in a cell can use this for anything that touches widgets,
+    the map canvas or ``iface``.
+    """
+    app = QCoreApplication.instance()
+    if _invoker is None or app is None or QThread.currentThread() == app.thread():
+        return function(*args, **kwargs)
+
+    outcome = {}
+    # L'output prodotto sul thread GUI resta nella cella chiamante
+    caller = threading.get_ident()
+    routers = [stream for stream in (sys.stdout, sys.stderr)
+               if isinstance(stream, ThreadOutputRouter) and caller in stream.sinks]
+
+    def call():
+        for router in routers:
+            router.register(router.sinks[caller])
+        try:
+            outcome['value'] = function(*args, **kwargs)
+        except BaseException as e:
+            outcome['error'] = e
+        finally:
+            for router in routers:
+                router.unregister()
+
+    _invoker.invoke.emit(call)
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome.get('value')
+
+
+def main_thread(function):
+    """Decorator: always run ``function`` on the Qt GUI thread."""
+    def wrapper(*args, **kwargs):
+        return run_on_main_thread(function, *args, **kwargs)
+    wrapper.__name__ = getattr(function, '__name__', 'wrapper')
+    wrapper.__doc__ = getattr(function, '__doc__', None)
+    return wrapper
+
+
+class OutputStream:
+    """Buffer dell'output condiviso tra il thread di esecuzione e il thread GUI.
+
+    Il thread di esecuzione accoda il testo con write(); il thread GUI lo
+    preleva a blocchi con take(). Quando il buffer supera ``max_pending``
+    caratteri lo scrittore attende che venga svuotato (back-pressure).
+    """
+
+    def __init__(self, flush_size, max_pending):
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+        self.chunks = []
+        self.size = 0
+        self.blocking = False
+        self.flush_requested = False
+        self.condition = threading.Condition()
+
+    def write(self, name, text):
+        """Queue text; return True when a flush should be requested."""
+        with self.condition:
+            while self.blocking and self.size >= self.max_pending:
+                self.condition.wait(0.1)
+            if self.chunks and self.chunks[-1][0] == name:
+                self.chunks[-1][1].append(text)
+            else:
+                self.chunks.append((name, [text]))
+            self.size += len(text)
+            if self.size >= self.flush_size and not self.flush_requested:
+                self.flush_requested = True
+                return True
+        return False
+
+    def take(self):
+        """Return the buffered ``(name, text)`` chunks and wake the writer."""
+        with self.condition:
+            chunks = self.chunks
+            self.chunks = []
+            self.size = 0
+            self.flush_requested = False
+            self.condition.notify_all()
+        return [(name, ''.join(parts)) for name, parts in chunks]
+
+    def release(self):
+        """Stop applying back-pressure (the reader is going away)."""
+        with self.condition:
+            self.blocking = False
+            self.condition.notify_all()
+
+
+class ExecutionJob(QObject):
+    """A single cell execution request.
+
+    stdout/stderr are collected in an OutputStream and delivered in batches
+    from the GUI thread, every ``FLUSH_INTERVAL`` ms or as soon as
+    ``FLUSH_SIZE`` characters are pending. result, error and finished are
+    emitted on the GUI thread once the remaining output has been flushed.
+    """
+
+    # Intervallo (ms) e dimensioni (caratteri) dei blocchi di output
+    FLUSH_INTERVAL = 50
+    FLUSH_SIZE = 64 * 1024
+    MAX_PENDING = 1024 * 1024
+
+    stdout = pyqtSignal(str)
+    stderr = pyqtSignal(str)
+    result = pyqtSignal(str)
+    # Output ``display_data`` completi (es. la tabella di %%prun)
+    display = pyqtSignal(object)
+    error = pyqtSignal(str, str, str)
+    finished = pyqtSignal(bool)
+
+    # Segnali interni, emessi dal thread di esecuzione
+    flush_requested = pyqtSignal()
+    done = pyqtSignal()
+
+    def __init__(self, code, namespace, filename='<cell>', parent=None):
+        super().__init__(parent)
+        self.code = code
+        self.namespace = namespace
+        self.filename = filename
+        self.thread_ident = None
+        self.interrupt_sent = False
+        self.ok = False
+        self.interrupted = False
+        self.feedbacks = []
+        self.value = None
+        self.exception = None
+        self.displays = []
+        # Tempi e memoria dell'esecuzione (vedi ExecutionMetrics)
+        self.trace_allocations = False
+        self.metrics = None
+        # Span della timeline (Profile Run All); None = non registrati
+        self.spans = None
+        # Campionamento dello stack (secondi tra i campioni; None = spento)
+        self.sample_interval = None
+        self.sampler = None
+        # Protegge thread_ident (interruzioni) e il campionatore
+        self.lock = threading.Lock()
+
+        # Memoizzazione dei risultati (ResultCache), se attiva
+        self.result_cache = None
+        self.cache_reads = None
+        self.from_cache = False
+        self.transcript = []
+        self.transcript_size = 0
+
+        self.output = OutputStream(self.FLUSH_SIZE, self.MAX_PENDING)
+        # Prelievo e consegna di un blocco insieme: l'ordine resta quello di scrittura
+        self.flush_lock = threading.Lock()
+        self.flush_timer = QTimer(self)
+        self.flush_timer.setInterval(self.FLUSH_INTERVAL)
+        self.flush_timer.timeout.connect(self.flush_output)
+        self.flush_requested.connect(self.flush_output)
+        self.done.connect(self.on_done)
+
+    def start_streaming(self):
+        """Deliver output while the job runs on another thread.
+
+        Must be called from the GUI thread before the job starts.
+        """
+        self.output.blocking = True
+        self.flush_timer.start()
+
+    def write_stdout(self, text):
+        self.record('stdout', text)
+        if self.output.write('stdout', text):
+            self.request_flush()
+
+    def write_stderr(self, text):
+        self.record('stderr', text)
+        if self.output.write('stderr', text):
+            self.request_flush()
+
+    def record(self, name, text):
+        """Keep a copy of the output for the result cache."""
+        if self.result_cache is None or self.transcript_size > self.result_cache.MAX_TRANSCRIPT:
+            return
+        self.transcript.append((name, text))
+        self.transcript_size += len(text)
+
+    def request_flush(self):
+        if self.output.blocking:
+            self.flush_requested.emit()
+        else:
+            # Esecuzione sul thread GUI: consegna subito
+            self.flush_output()
+
+    def flush_output(self):
+        """Emit the buffered output as stdout/stderr batches."""
+        with self.flush_lock:
+            for name, text in self.output.take():
+                if name == 'stderr':
+                    self.stderr.emit(text)
+                else:
+                    self.stdout.emit(text)
+
+    def run(self):
+        """Execute the job in the calling thread."""
+        if self.interrupted:
+            self.done.emit()
+            return
+
+        with self.lock:
+            self.thread_ident = threading.get_ident()
+        _running_jobs[self.thread_ident] = self
+        if self.sample_interval:
+            self.start_sampling(self.sample_interval)
+        install_processing_hook()
+        out, err = install_output_routers()
+        out.register(self.write_stdout)
+        err.register(self.write_stderr)
+
+        self.namespace.setdefault('run_on_main_thread', run_on_main_thread)
+        self.namespace.setdefault('main_thread', main_thread)
+
+        tracer = IOTracer(self.spans) if self.spans is not None else None
+        cancellation = MainThreadCancellation(self) if on_main_thread() else None
+        started = time.time()
+        measure = ExecutionMetrics(self.trace_allocations)
+        measure.start()
+        try:
+            if tracer is not None:
+                tracer.start()
+            if cancellation is not None:
+                cancellation.start()
+            # %timeit, !cmd, %run... non vanno in cache
+            entry, key = self.lookup_cache() if not has_magics(self.code) else (None, None)
+            if entry is not None:
+                self.restore(entry)
+            else:
+                self.value = execute_source(self.code, self.namespace, self.filename,
+                                            self.displays.append)
+                if key is not None:
+                    self.save_to_cache(key)
+            self.ok = True
+        except BaseException as e:
+            self.exception = (type(e).__name__, str(e), format_exception(e))
+            self.ok = False
+        finally:
+            # Prima di tutto: nessuna interruzione durante la chiusura
+            while True:
+                try:
+                    if cancellation is not None:
+                        cancellation.stop()
+                    self.release_thread()
+                    break
+                except KeyboardInterrupt:
+                    continue
+            if tracer is not None:
+                tracer.stop()
+            self.metrics = measure.stop()
+            if self.spans is not None:
+                span = make_span(self.filename.strip('<>'), 'cell', started, time.time(),
+                                 code=self.code.strip().partition('\n')[0][:80], ok=self.ok,
+                                 io=tracer.total)
+                if tracer.skipped:
+                    span['args']['io_skipped'] = True
+                self.spans.append(span)
+            report = self.stop_sampling()
+            if report is not None:
+                self.displays.append(report)
+            out.unregister()
+            err.unregister()
+
+        self.done.emit()
+
+    def release_thread(self):
+        """Stop accepting interrupts; one sent but not raised yet is raised here."""
+        _running_jobs.pop(threading.get_ident(), None)
+        with self.lock:
+            self.thread_ident = None
+            sent, self.interrupt_sent = self.interrupt_sent, False
+        if sent:
+            # Non con SetAsyncExc(NULL): l'interprete resterebbe segnalato e, con
+            # un hook di profilo attivo (IOTracer), il thread girerebbe a vuoto
+            _check_interrupt()
+
+    def start_sampling(self, interval):
+        """Sample the stack of the job every ``interval`` seconds.
+
+        Can be called from any thread, also while the job is running; before
+        the start the sampler is only armed.
+        """
+        with self.lock:
+            self.sample_interval = interval
+            if self.sampler is None and self.thread_ident is not None:
+                self.sampler = StackSampler(self.thread_ident, interval)
+                self.sampler.start()
+
+    def stop_sampling(self):
+        """Stop sampling; return the report as a display_data output, or None."""
+        with self.lock:
+            sampler = self.sampler
+            self.sampler = None
+            self.sample_interval = None
+        if sampler is None:
+            return None
+        sampler.stop()
+        return sampler.output()
+
+    def lookup_cache(self):
+        """Return ``(entry, key)`` from the result cache; both may be None."""
+        if self.result_cache is None:
+            return None, None
+        try:
+            self.cache_reads = self.result_cache.read_fingerprints(self.code, self.namespace)
+            key = self.result_cache.key(self.code, self.cache_reads)
+            entry = self.result_cache.load(key) if key is not None else None
+        except Exception:
+            return None, None
+        return entry, key
+
+    def restore(self, entry):
+        """Replay a cached run: variables, output and result."""
+        self.namespace.update(entry['variables'])
+        for name, text in entry['streams']:
+            if name == 'stderr':
+                self.write_stderr(text)
+            else:
+                self.write_stdout(text)
+        self.value = entry['value']
+        self.from_cache = True
+
+    def save_to_cache(self, key):
+        try:
+            self.result_cache.store(key, self.code, self.namespace, self.transcript, self.value,
+                                    self.cache_reads)
+        except Exception:
+            # La cache non deve mai far fallire la cella
+            pass
+
+    def on_done(self):
+        """Flush the remaining output, then report the outcome."""
+        self.flush_timer.stop()
+        self.output.release()
+        self.flush_output()
+        for output_data in self.displays:
+            self.display.emit(output_data)
+        if self.value is not None:
+            self.result.emit(self.value)
+        if self.exception is not None:
+            self.error.emit(*self.exception)
+        self.finished.emit(self.ok)
+
+    def interrupt(self):
+        """Raise KeyboardInterrupt in the thread running the job.
+
+        Pending Processing algorithms started from the cell are cancelled
+        through their QgsProcessingFeedback. Code blocked inside a C call
+        stops as soon as control returns to Python. On the GUI thread the
+        job is only flagged: MainThreadCancellation raises the exception.
+        """
+        self.interrupted = True
+        for feedback in list(self.feedbacks):
+            feedback.cancel()
+
+        # Sotto lock: dopo release_thread() non parte più nessuna eccezione
+        with self.lock:
+            ident = self.thread_ident
+            if ident is None or ident == threading.get_ident():
+                return False
+            count = ctypes.pythonapi.PyThreadState_SetAsyncExc(
+                ctypes.c_ulong(ident), ctypes.py_object(KeyboardInterrupt))
+            if count > 1:
+                # Non dovrebbe succedere: annulla l'eccezione
+                ctypes.pythonapi.PyThreadState_SetAsyncExc(ctypes.c_ulong(ident), None)
+                return False
+            self.interrupt_sent = count == 1
+        return count == 1
+
+
+class ExecutionThread(QThread):
+    """Worker thread running a single ExecutionJob."""
+
+    def __init__(self, job, parent=None):
+        super().__init__(parent)
+        self.job = job
+
+    def run(self):
+        self.job.run()
+
+
+class QNotebookExecutor(QObject):
+    """Coda di esecuzione delle celle di un notebook.
+
+    Le celle vengono eseguite una alla volta, nell'ordine di invio, sul
+    thread GUI o, se ``threaded`` è True, su un thread di lavoro, oppure in
+    un processo separato se ``process_kernel`` è impostato.
+    """
+
+    busy_changed = pyqtSignal(bool)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        global _invoker
+        if _invoker is None:
+            _invoker = _MainThreadInvoker()
+
+        # Thread di lavoro solo su richiesta: iface, QgsProject e i widget
+        # vanno usati dal thread GUI (vedi run_on_main_thread)
+        self.threaded = False
+        # ResultCache per la memoizzazione delle celle (None = disattivata)
+        self.result_cache = None
+        # Misura delle allocazioni Python con tracemalloc
+        self.trace_allocations = False
+        # Timeline in registrazione (Profile Run All); None = disattivata
+        self.timeline = None
+        # Profiler a campionamento: secondi tra i campioni (None = spento)
+        self.sample_interval = None
+        # Kernel esterno (QNotebookProcessKernel); None = esecuzione in-process
+        self.process_kernel = None
+        self.queue = []
+        self.current_job = None
+        self.thread = None
+        # Riferimenti ai thread ancora attivi (evita la distruzione prematura)
+        self.threads = set()
+
+    def create_job(self, code, namespace, filename='<cell>'):
+        """Create a job; connect its signals, then pass it to submit()."""
+        job = ExecutionJob(code, namespace, filename, parent=self)
+        job.result_cache = self.result_cache
+        job.trace_allocations = self.trace_allocations
+        job.sample_interval = self.sample_interval
+        if self.timeline is not None:
+            job.spans = []
+        return job
+
+    def submit(self, job):
+        """Queue a job for execution."""
+        self.queue.append(job)
+        if self.current_job is None:
+            self.busy_changed.emit(True)
+            self.start_next()
+
+    def is_busy(self):
+        return self.current_job is not None
+
+    def interrupt(self):
+        """Interrupt the running job and drop the queued ones."""
+        pending = self.queue
+        self.queue = []
+        for job in pending:
+            job.interrupted = True
+            job.finished.emit(False)
+            job.deleteLater()
+
+        if self.current_job is not None:
+            if self.process_kernel is not None:
+                self.current_job.interrupted = True
+                self.process_kernel.interrupt()
+            else:
+                self.current_job.interrupt()
+        elif pending:
+            self.busy_changed.emit(False)
+
+    def set_sampling(self, interval):
+        """Turn the sampling profiler on (``interval`` seconds) or off (None).
+
+        The running job is attached to or detached from the sampler as well:
+        detaching delivers its report immediately, so a cell that seems stuck
+        can be inspected without stopping it.
+        """
+        self.sample_interval = interval
+        job = self.current_job
+        if job is None:
+            return
+        if self.process_kernel is not None:
+            self.process_kernel.sample(interval)
+        elif interval:
+            job.start_sampling(interval)
+        else:
+            report = job.stop_sampling()
+            if report is not None:
+                job.display.emit(report)
+
+    def start_next(self):
+        """Start the next queued job, if any."""
+        if self.current_job is not None:
+            return
+        if not self.queue:
+            self.busy_changed.emit(False)
+            return
+
+        job = self.queue.pop(0)
+        self.current_job = job
+        job.finished.connect(self.on_job_finished)
+
+        if self.process_kernel is not None:
+            self.process_kernel.execute(job)
+        elif self.threaded:
+            job.start_streaming()
+            thread = ExecutionThread(job)
+            self.threads.add(thread)
+            thread.finished.connect(self.on_thread_finished)
+            self.thread = thread
+            thread.start()
+        else:
+            job.run()
+
+    def on_thread_finished(self):
+        """Release a worker thread once it has really stopped."""
+        self.threads.discard(self.sender())
+
+    def on_job_finished(self, ok):
+        """Handle completion of the current job."""
+        job = self.current_job
+        self.current_job = None
+        self.thread = None
+        if job is not None:
+            if self.timeline is not None and job.spans:
+                self.timeline.extend(job.spans)
+            job.deleteLater()
+        # Evita la ricorsione quando si esegue sul thread GUI
+        QTimer.singleShot(0, self.start_next)
@@ -0,0 +1,178 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Export - Write notebooks as HTML, cell by cell
+"""
+
+import io
+import re
+import html
+import keyword
+import builtins
+import tokenize
+
+from .qnotebook_model import join_text
+
+# Stile fisso: l'evidenziazione usa solo classi, niente stili per token
+HIGHLIGHT_CSS = """
+.hl .k { color: #0000aa; font-weight: bold; }
+.hl .b { color: #00707a; }
+.hl .s { color: #a31515; }
+.hl .n { color: #098658; }
+.hl .c { color: #808080; font-style: italic; }
+.hl .d { color: #aa5500; }
+.hl .f { color: #795e26; }
+"""
+
+PAGE_CSS = """
+body { font-family: Arial, sans-serif; margin: 20px; }
+.cell { margin: 20px 0; border: 1px solid #ddd; padding: 10px; }
+.code { background: #f5f5f5; padding: 10px; font-family: monospace; }
+.prompt { color: #888; font-family: monospace; }
+.output { background: white; padding: 10px; border-top: 1px solid #ddd; }
+.stderr, .error { background: #fff0f0; }
+pre { white-space: pre-wrap; margin: 0; }
+img { max-width: 100%; }
+"""
+
+IMAGE_TYPES = ('image/png', 'image/jpeg', 'image/gif')
+
+_ANSI = re.compile(r'\x1b\[[0-9;]*[A-Za-z]')
+_BUILTINS = frozenset(dir(builtins))
+
+
+def highlight_python(source):
+    """Return ``source`` as escaped HTML with token classes from HIGHLIGHT_CSS."""
+    line_starts = [0]
+    for line in source.splitlines(True):
+        line_starts.append(line_starts[-1] + len(line))
+
+    def offset(position):
+        row, column = position
+        return line_starts[min(row - 1, len(line_starts) - 1)] + column
+
+    parts = []
+    done = 0
+    previous = None
+    try:
+        for token in tokenize.generate_tokens(io.StringIO(source).readline):
+            css_class = None
+            if token.type == tokenize.STRING:
+                css_class = 's'
+            elif token.type == tokenize.NUMBER:
+                css_class = 'n'
+            elif token.type == tokenize.COMMENT:
+                css_class = 'c'
+            elif token.type == tokenize.NAME:
+                if keyword.iskeyword(token.string):
+                    css_class = 'k'
+                elif previous is not None and previous.string in ('def', 'class'):
+                    css_class = 'f'
+                elif token.string in _BUILTINS:
+                    css_class = 'b'
+            elif token.type == tokenize.OP and token.string == '@':
+                css_class = 'd'
+            if token.type not in (tokenize.NL, tokenize.NEWLINE, tokenize.INDENT,
+                                  tokenize.DEDENT, tokenize.ENDMARKER):
+                previous = token
+            if css_class is None:
+                continue
+            start, end = offset(token.start), offset(token.end)
+            parts.append(html.escape(source[done:start]))
+            parts.append(f'<span class="{css_class}">{html.escape(source[start:end])}</span>')
+            done = end
+    except (tokenize.TokenError, IndentationError, SyntaxError):
+        # Codice incompleto: il resto senza evidenziazione
+        pass
+    parts.append(html.escape(source[done:]))
+    return ''.join(parts)
+
+
+def markdown_to_html(text):
+    """Render markdown with the ``markdown`` package, or a small escaped subset."""
+    try:
+        import markdown
+    except ImportError:
+        pass
+    else:
+        return markdown.markdown(text, extensions=['fenced_code', 'tables'])
+
+    lines = []
+    for line in html.escape(text, quote=False).splitlines():
+        line = re.sub(r'\*\*(.+?)\*\*', r'<strong>\1</strong>', line)
+        line = re.sub(r'\*(.+?)\*', r'<em>\1</em>', line)
+        line = re.sub(r'`([^`]+)`', r'<code>\1</code>', line)
+        header = re.match(r'(#{1,6}) (.*)', line)
+        if header:
+            level = len(header.group(1))
+            lines.append(f'<h{level}>{header.group(2)}</h{level}>')
+        elif line.lstrip().startswith(('- ', '* ')):
+            lines.append(f'<li>{line.lstrip()[2:]}</li>')
+        else:
+            lines.append(line + '<br>')
+    return '\n'.join(lines)
+
+
+def write_output(f, output_data):
+    """Write one nbformat output as HTML."""
+    output_type = output_data.get('output_type')
+    if output_type == 'stream':
+        name = html.escape(output_data.get('name', 'stdout'))
+        f.write(f'<div class="output {name}"><pre>')
+        f.write(html.escape(join_text(output_data.get('text', ''))))
+        f.write('</pre></div>\n')
+    elif output_type == 'error':
+        traceback = _ANSI.sub('', '\n'.join(output_data.get('traceback', [])))
+        f.write('<div class="output error"><pre>')
+        f.write(html.escape(traceback))
+        f.write('</pre></div>\n')
+    elif output_type in ('execute_result', 'display_data'):
+        data = output_data.get('data', {})
+        f.write('<div class="output">')
+        for mime_type in IMAGE_TYPES:
+            if mime_type in data:
+                # Immagini incorporate: la pagina non dipende da altri file
+                f.write(f'<img src="data:{mime_type};base64,')
+                f.write(join_text(data[mime_type]).replace('\n', ''))
+                f.write('">')
+                break
+        else:
+            if 'image/svg+xml' in data:
+                f.write(join_text(data['image/svg+xml']))
+            elif 'text/html' in data:
+                f.write(join_text(data['text/html']))
+            else:
+                f.write('<pre>')
+                f.write(html.escape(join_text(data.get('text/plain', ''))))
+                f.write('</pre>')
+        f.write('</div>\n')
+
+
+def write_html(f, notebook, title="QGIS Notebook Export"):
+    """Write ``notebook`` (a NotebookModel) as a standalone HTML page to ``f``.
+
+    Every cell is written as soon as it is rendered, so the page is never
+    held in memory as a whole.
+    """
+    title = html.escape(title)
+    f.write('<!DOCTYPE html>\n<html>\n<head>\n<meta charset="utf-8">\n')
+    f.write(f'<title>{title}</title>\n<style>{PAGE_CSS}{HIGHLIGHT_CSS}</style>\n')
+    f.write(f'</head>\n<body>\n<h1>{title}</h1>\n')
+    for cell in notebook.cells:
+        f.write('<div class="cell">\n')
+        if cell.cell_type == 'markdown':
+            f.write(markdown_to_html(cell.source))
+        elif cell.cell_type == 'raw':
+            f.write(f'<pre>{html.escape(cell.source)}</pre>')
+        else:
+            f.write(f'<div class="prompt">In [{cell.execution_count or " "}]:</div>\n')
+            f.write(f'<div class="code hl"><pre>{highlight_python(cell.source)}</pre></div>\n')
+            for output_data in cell.read_outputs():
+                write_output(f, output_data)
+        f.write('</div>\n')
+    f.write('</body>\n</html>\n')
+
+
+def export_html(notebook, filename, title="QGIS Notebook Export"):
+    """Export ``notebook`` to the HTML file ``filename``."""
+    with open(filename, 'w', encoding='utf-8') as f:
+        write_html(f, notebook, title)
@@ -0,0 +1,301 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Process Kernel - Run notebook code in a separate Python/QGIS process
+"""
+
+import os
+import sys
+import json
+
+from qgis.PyQt.QtCore import (
+    QObject, QProcess, QProcessEnvironment, QSettings, pyqtSignal
+)
+from qgis.core import QgsApplication, QgsMessageLog, Qgis
+
+
+def find_python_executable():
+    """Find the Python interpreter used to start kernel processes.
+
+    Inside QGIS ``sys.executable`` is often the QGIS binary itself, so look
+    for the interpreter next to it. The ``QNotebook/kernel_python`` setting
+    overrides the detection.
+    """
+    configured = QSettings().value('QNotebook/kernel_python', '')
+    if configured:
+        return configured
+
+    executable = sys.executable or ''
+    if 'python' in os.path.basename(executable).lower():
+        return executable
+
+    if os.name == 'nt':
+        names = ['python3.exe', 'python.exe']
+        folders = [sys.exec_prefix, os.path.join(sys.exec_prefix, 'bin'),
+                   os.path.dirname(executable)]
+    else:
+        version = f'python{sys.version_info.major}.{sys.version_info.minor}'
+        names = [version, 'python3']
+        folders = [os.path.join(sys.exec_prefix, 'bin'), os.path.dirname(executable)]
+
+    for folder in folders:
+        for name in names:
+            candidate = os.path.join(folder, name)
+            if os.path.isfile(candidate):
+                return candidate
+    return 'python3'
+
+
+class KernelProcess(QObject):
+    """A single worker process speaking the kernel protocol."""
+
+    message = pyqtSignal(dict)
+    ready = pyqtSignal()
+    died = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.buffer = b''
+        self.is_ready = False
+        self.stopping = False
+
+        self.process = QProcess(self)
+        self.process.readyReadStandardOutput.connect(self.read_events)
+        self.process.readyReadStandardError.connect(self.read_stderr)
+        self.process.finished.connect(self.on_finished)
+        self.process.errorOccurred.connect(self.on_error)
+
+    def start(self):
+        """Launch the worker module with the plugin's parent folder on sys.path."""
+        plugin_dir = os.path.dirname(os.path.abspath(__file__))
+        package = __package__ or os.path.basename(plugin_dir)
+
+        environment = QProcessEnvironment.systemEnvironment()
+        python_path = [os.path.dirname(plugin_dir)] + [p for p in sys.path if p]
+        environment.insert('PYTHONPATH', os.pathsep.join(python_path))
+        environment.insert('PYTHONIOENCODING', 'utf-8')
+        environment.insert('QT_QPA_PLATFORM', 'offscreen')
+        prefix = QgsApplication.prefixPath()
+        if prefix:
+            environment.insert('QGIS_PREFIX_PATH', prefix)
+
+        self.process.setProcessEnvironment(environment)
+        self.process.setWorkingDirectory(os.path.dirname(plugin_dir))
+        self.process.start(find_python_executable(),
+                           ['-u', '-m', f'{package}.qnotebook_kernel_worker'])
+
+    def send(self, op, **fields):
+        fields['op'] = op
+        line = json.dumps(fields, separators=(',', ':')) + '\n'
+        self.process.write(line.encode('utf-8'))
+
+    def read_events(self):
+        self.buffer += bytes(self.process.readAllStandardOutput())
+        *lines, self.buffer = self.buffer.split(b'\n')
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                message = json.loads(line.decode('utf-8'))
+            except ValueError:
+                continue
+            if message.get('ev') == 'ready':
+                self.is_ready = True
+                self.ready.emit()
+            else:
+                self.message.emit(message)
+
+    def read_stderr(self):
+        # Output C (GDAL, Qt) e messaggi del worker fuori da una cella
+        text = bytes(self.process.readAllStandardError()).decode('utf-8', 'replace')
+        if text.strip():
+            self.message.emit({'ev': 'out', 'id': None, 'name': 'stderr', 'text': text})
+
+    def on_finished(self, exit_code, exit_status):
+        self.is_ready = False
+        if not self.stopping:
+            if exit_status == QProcess.CrashExit:
+                self.died.emit("Kernel process crashed")
+            else:
+                self.died.emit(f"Kernel process exited with code {exit_code}")
+
+    def on_error(self, error):
+        if error == QProcess.FailedToStart:
+            self.died.emit(f"Could not start kernel process: {self.process.errorString()}")
+
+    def stop(self):
+        """Terminate the process, killing it if it does not exit promptly."""
+        self.stopping = True
+        if self.process.state() != QProcess.NotRunning:
+            self.send('shutdown')
+            self.process.closeWriteChannel()
+            if not self.process.waitForFinished(1000):
+                self.process.kill()
+                self.process.waitForFinished(1000)
+        self.deleteLater()
+
+
+class KernelProcessPool(QObject):
+    """Keeps warm worker processes so a kernel (re)start is immediate."""
+
+    def __init__(self, size=1, parent=None):
+        super().__init__(parent)
+        self.size = size
+        self.spares = []
+
+    def fill(self):
+        while len(self.spares) < self.size:
+            process = KernelProcess(self)
+            process.died.connect(lambda reason, p=process: self.discard(p))
+            process.start()
+            self.spares.append(process)
+
+    def discard(self, process):
+        if process in self.spares:
+            self.spares.remove(process)
+
+    def acquire(self):
+        """Return a started process, preferring one that is already ready."""
+        ready = [p for p in self.spares if p.is_ready]
+        process = ready[0] if ready else (self.spares[0] if self.spares else None)
+        if process is None:
+            process = KernelProcess(self)
+            process.start()
+        else:
+            self.spares.remove(process)
+            process.died.disconnect()
+        self.fill()
+        return process
+
+    def clear(self):
+        for process in self.spares:
+            process.stop()
+        self.spares = []
+
+
+class QNotebookProcessKernel(QObject):
+    """Esegue il codice delle celle in un processo Python/QGIS separato.
+
+    Un crash nel codice utente (o in un driver GDAL) termina solo il
+    processo del kernel; restart() avvia un processo nuovo e libera la memoria.
+    """
+
+    state_changed = pyqtSignal(str)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        pool_size = int(QSettings().value('QNotebook/kernel_pool_size', 1))
+        self.pool = KernelProcessPool(pool_size, parent=self)
+        self.process = None
+        self.jobs = {}
+        self.waiting = []
+        self.next_id = 0
+        self.state = 'stopped'
+
+    def set_state(self, state):
+        self.state = state
+        self.state_changed.emit(state)
+
+    def start(self):
+        """Attach to a worker process from the pool."""
+        self.process = self.pool.acquire()
+        self.process.setParent(self)
+        self.process.message.connect(self.on_event)
+        self.process.died.connect(self.on_died)
+        if self.process.is_ready:
+            self.on_ready()
+        else:
+            self.set_state('starting')
+            self.process.ready.connect(self.on_ready)
+
+    def on_ready(self):
+        self.set_state('ready')
+        waiting = self.waiting
+        self.waiting = []
+        for job_id, job in waiting:
+            self.send_job(job_id, job)
+
+    def execute(self, job):
+        """Send an ExecutionJob to the kernel process."""
+        if self.process is None:
+            self.start()
+        self.next_id += 1
+        job_id = self.next_id
+        self.jobs[job_id] = job
+        if self.process.is_ready:
+            self.send_job(job_id, job)
+        else:
+            self.waiting.append((job_id, job))
+
+    def send_job(self, job_id, job):
+        self.process.send('exec', id=job_id, code=job.code, file=job.filename,
+                          trace=job.trace_allocations, timeline=job.spans is not None,
+                          sample=job.sample_interval)
+
+    def on_event(self, message):
+        event = message.get('ev')
+        job = self.jobs.get(message.get('id'))
+        if job is None:
+            if event == 'out' and message.get('text'):
+                QgsMessageLog.logMessage(message['text'], "QNotebook", Qgis.Info)
+            return
+
+        if event == 'out':
+            if message.get('name') == 'stderr':
+                job.stderr.emit(message.get('text', ''))
+            else:
+                job.stdout.emit(message.get('text', ''))
+        elif event == 'res':
+            job.result.emit(message.get('value', ''))
+        elif event == 'display':
+            job.display.emit(message.get('output') or {})
+        elif event == 'err':
+            job.error.emit(message.get('ename', ''), message.get('evalue', ''),
+                           message.get('tb', ''))
+        elif event == 'done':
+            del self.jobs[message['id']]
+            job.ok = bool(message.get('ok'))
+            job.metrics = message.get('metrics')
+            if job.spans is not None:
+                job.spans = message.get('spans') or []
+            job.finished.emit(job.ok)
+
+    def on_died(self, reason):
+        """Handle an unexpected exit of the kernel process."""
+        self.process = None
+        self.set_state('dead')
+        self.fail_jobs(reason)
+
+    def fail_jobs(self, reason):
+        """Fail every job the process still owed an answer for."""
+        jobs = list(self.jobs.values())
+        self.jobs = {}
+        self.waiting = []
+        for job in jobs:
+            job.error.emit('KernelDied', reason, reason + '\n')
+            job.ok = False
+            job.finished.emit(False)
+
+    def interrupt(self):
+        if self.process is not None:
+            self.process.send('interrupt')
+
+    def sample(self, interval):
+        """Attach the sampling profiler to the running cell (None detaches it)."""
+        if self.process is not None:
+            self.process.send('sample', interval=interval)
+
+    def restart(self):
+        """Kill the kernel process and attach to a fresh one."""
+        self.shutdown(keep_pool=True)
+        self.start()
+
+    def shutdown(self, keep_pool=False):
+        if self.process is not None:
+            process = self.process
+            self.process = None
+            process.died.disconnect(self.on_died)
+            process.stop()
+        self.fail_jobs("Kernel stopped")
+        if not keep_pool:
+            self.pool.clear()
+        self.set_state('stopped')
@@ -0,0 +1,198 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Kernel Worker - Headless process executing notebook code
+
+Started by QNotebookProcessKernel with ``python -m <plugin>.qnotebook_kernel_worker``.
+Messages are exchanged as one compact JSON object per line: requests arrive
+on stdin, events are written to the original stdout. Anything user code or C
+libraries print to the process stdout is redirected to stderr so it cannot
+corrupt the protocol.
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+
+
+class ProtocolWriter:
+    """Thread-safe writer of protocol events."""
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.lock = threading.Lock()
+
+    def send(self, event, **fields):
+        fields['ev'] = event
+        line = json.dumps(fields, separators=(',', ':')) + '\n'
+        with self.lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+
+def open_protocol_stream():
+    """Keep a private copy of stdout for the protocol and send fd 1 to stderr."""
+    sys.stdout.flush()
+    protocol_fd = os.dup(1)
+    os.dup2(2, 1)
+    sys.stdout = sys.stderr
+    return os.fdopen(protocol_fd, 'w', encoding='utf-8', newline='\n')
+
+
+def start_qgis():
+    """Start a headless QgsApplication, if QGIS is available."""
+    try:
+        from qgis.core import QgsApplication
+    except ImportError:
+        return None
+
+    prefix = os.environ.get('QGIS_PREFIX_PATH')
+    if prefix:
+        QgsApplication.setPrefixPath(prefix, True)
+    app = QgsApplication([], False)
+    app.initQgis()
+
+    try:
+        from processing.core.Processing import Processing
+        Processing.initialize()
+    except Exception:
+        pass
+    return app
+
+
+def create_namespace(plugin_module):
+    """Namespace di default del kernel: lo stesso delle celle in QGIS, senza iface."""
+    try:
+        return plugin_module('qnotebook_namespace').create_namespace()
+    except ImportError:
+        # Python senza QGIS: solo il minimo
+        return {'__name__': '__main__', '__builtins__': __builtins__, 'iface': None, 'canvas': None}
+
+
+def sample_running_job(job, job_id, interval, writer):
+    """Start or stop sampling ``job``; a stopped sampler reports at once."""
+    if interval:
+        job.start_sampling(interval)
+        return
+    report = job.stop_sampling()
+    if report is not None:
+        # Il thread principale è occupato dalla cella: si scrive direttamente
+        writer.send('display', id=job_id, output=report)
+
+
+def serve(requests, writer, executor_module, namespace):
+    """Read requests from ``requests`` and execute them one at a time."""
+    from qgis.PyQt.QtCore import Qt
+
+    pending = []
+    condition = threading.Condition()
+    state = {'job': None, 'id': None}
+
+    def reader():
+        for line in requests:
+            try:
+                message = json.loads(line)
+            except ValueError:
+                continue
+            op = message.get('op')
+            with condition:
+                if op == 'interrupt':
+                    pending.clear()
+                    if state['job'] is not None:
+                        state['job'].interrupt()
+                    continue
+                if op == 'sample':
+                    # Aggancia/sgancia il campionatore alla cella in esecuzione
+                    if state['job'] is not None:
+                        sample_running_job(state['job'], state['id'], message.get('interval'), writer)
+                    continue
+                pending.append(message)
+                condition.notify()
+        with condition:
+            pending.append({'op': 'shutdown'})
+            condition.notify()
+
+    def pump():
+        # Consegna l'output della cella in esecuzione a blocchi temporizzati
+        interval = executor_module.ExecutionJob.FLUSH_INTERVAL / 1000.0
+        while True:
+            time.sleep(interval)
+            job = state['job']
+            if job is not None:
+                job.flush_output()
+
+    threading.Thread(target=reader, name='qnotebook-kernel-reader', daemon=True).start()
+    threading.Thread(target=pump, name='qnotebook-kernel-output', daemon=True).start()
+    writer.send('ready', pid=os.getpid())
+
+    while True:
+        with condition:
+            while not pending:
+                condition.wait()
+            message = pending.pop(0)
+
+        op = message.get('op')
+        if op == 'shutdown':
+            break
+        if op != 'exec':
+            continue
+
+        job_id = message.get('id')
+        job = executor_module.ExecutionJob(
+            message.get('code', ''), namespace, message.get('file', '<cell>'))
+        job.trace_allocations = bool(message.get('trace'))
+        job.sample_interval = message.get('sample') or None
+        if message.get('timeline'):
+            job.spans = []
+        # Anche il pump emette: il thread principale non ha un event loop,
+        # quindi niente connessioni in coda
+        job.stdout.connect(lambda text: writer.send('out', id=job_id, name='stdout', text=text),
+                           Qt.DirectConnection)
+        job.stderr.connect(lambda text: writer.send('out', id=job_id, name='stderr', text=text),
+                           Qt.DirectConnection)
+        job.result.connect(lambda value: writer.send('res', id=job_id, value=value))
+        job.display.connect(lambda output_data: writer.send('display', id=job_id, output=output_data))
+        job.error.connect(lambda ename, evalue, tb: writer.send(
+            'err', id=job_id, ename=ename, evalue=evalue, tb=tb))
+
+        job.output.blocking = True
+        with condition:
+            state['job'] = job
+            state['id'] = job_id
+        try:
+            job.run()
+        except KeyboardInterrupt:
+            # Interruzione arrivata dopo la fine del codice utente
+            pass
+        finally:
+            with condition:
+                state['job'] = None
+                state['id'] = None
+        # Ultimo blocco: se il pump ne sta consegnando uno, il lock lo attende
+        job.flush_output()
+        writer.send('done', id=job_id, ok=job.ok, metrics=job.metrics, spans=job.spans)
+
+
+def main():
+    protocol = open_protocol_stream()
+    writer = ProtocolWriter(protocol)
+    app = start_qgis()
+
+    from importlib import import_module
+    package = __spec__.parent if __spec__ is not None else ''
+
+    def plugin_module(name):
+        return import_module(f'{package}.{name}' if package else name)
+
+    executor_module = plugin_module('qnotebook_executor')
+    requests = open(sys.stdin.fileno(), 'r', encoding='utf-8', closefd=False)
+    try:
+        serve(requests, writer, executor_module, create_namespace(plugin_module))
+    finally:
+        if app is not None:
+            app.exitQgis()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,41 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Loader - Read notebook files on a worker thread
+"""
+
+from qgis.PyQt.QtCore import QThread, pyqtSignal
+
+from .qnotebook_attachments import attach_store
+from .qnotebook_model import NotebookModel
+
+
+class NotebookLoader(QThread):
+    """Read an .ipynb file into a NotebookModel without blocking the GUI.
+
+    ``progress`` reports the percentage of the file read; the model is
+    delivered with ``loaded``, or the error message with ``failed``.
+    """
+
+    progress = pyqtSignal(int)
+    loaded = pyqtSignal(object)
+    failed = pyqtSignal(str)
+
+    def __init__(self, filename, parent=None):
+        super().__init__(parent)
+        self.filename = filename
+        self.percent = -1
+
+    def run(self):
+        try:
+            notebook = attach_store(NotebookModel.load(self.filename, self.report_progress),
+                                    self.filename)
+        except (OSError, ValueError) as e:
+            self.failed.emit(str(e))
+            return
+        self.loaded.emit(notebook)
+
+    def report_progress(self, done, total):
+        percent = done * 100 // total if total else 0
+        if percent != self.percent:
+            self.percent = percent
+            self.progress.emit(percent)
@@ -0,0 +1,457 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Magics - IPython-style line and cell magics
+
+Before compilation, line magics (``%time f()``, ``x = %timeit -o f()``) and
+shell commands (``!ls``, ``files = !ls``) are rewritten into calls to the
+MagicDispatcher of the running job, one line for one line, so tracebacks
+keep the cell line numbers. A cell starting with ``%%name`` is handed whole
+to the cell magic.
+"""
+
+import io
+import os
+import re
+import sys
+import time
+import shlex
+import timeit
+import builtins
+import functools
+import threading
+import contextlib
+import subprocess
+import statistics
+
+from .qnotebook_codecache import code_cache, register_source
+from .qnotebook_metrics import ExecutionMetrics, format_size
+from .qnotebook_profiler import split_cell_magic, create_profiler
+
+# Funzione chiamata dal codice trasformato. Sta tra i builtins (come get_ipython
+# in IPython), non nel namespace: dir() e l'elenco delle variabili restano puliti
+MAGIC_NAME = '__qnotebook_magic__'
+
+# Profondità massima di %run annidati
+MAX_RUN_DEPTH = 10
+
+_MAGIC_LINE = re.compile(
+    r'^(?P<indent>[ \t]*)(?:(?P<target>[\w.\[\], ]+?)\s*=\s*)?'
+    r'(?:%(?P<name>\w+)|(?P<shell>!))(?P<args>.*)$', re.M)
+
+
+class UsageError(Exception):
+    """Unknown magic or wrong magic arguments."""
+
+
+def has_magics(source):
+    """Return True if ``source`` uses a cell magic, line magics or ``!`` commands."""
+    return source.startswith('%%') or transform_source(source) != source
+
+
+@functools.lru_cache(maxsize=256)
+def transform_source(source):
+    """Rewrite the line magics of ``source`` into plain Python.
+
+    Sources that already compile are returned unchanged: a line starting
+    with ``%`` may be the continuation of a ``"..." % values`` expression.
+    """
+    if _MAGIC_LINE.search(source) is None:
+        return source
+    try:
+        compile(source, '<magics>', 'exec', dont_inherit=True)
+        return source
+    except SyntaxError:
+        pass
+
+    def replace(match):
+        target = match.group('target')
+        if match.group('shell'):
+            name = 'sx' if target else 'system'
+        else:
+            name = match.group('name')
+        call = f"{MAGIC_NAME}({name!r}, {match.group('args').strip()!r})"
+        return match.group('indent') + (f"{target} = {call}" if target else call)
+
+    return _MAGIC_LINE.sub(replace, source)
+
+
+def parse_options(args, spec):
+    """Split leading ``-x [value]`` options off ``args``.
+
+    ``spec`` lists the option letters as getopt does (``'n:r:qo'``). Return
+    ``(options, rest)``; parsing stops at the first unknown token.
+    """
+    options = {}
+    rest = args.strip()
+    while len(rest) > 1 and rest[0] == '-' and rest[1] in spec.replace(':', ''):
+        flag = rest[1]
+        rest = rest[2:].lstrip()
+        if spec[spec.index(flag) + 1:spec.index(flag) + 2] == ':':
+            value, _, rest = rest.partition(' ')
+            options[flag] = value
+            rest = rest.lstrip()
+        else:
+            options[flag] = True
+    return options, rest
+
+
+def format_time(seconds):
+    """Duration with three significant digits, from seconds down to ns."""
+    for unit, scale in (('s', 1), ('ms', 1e3), ('µs', 1e6)):
+        if seconds >= 1 / scale:
+            return f"{seconds * scale:.3g} {unit}"
+    return f"{seconds * 1e9:.3g} ns"
+
+
+@contextlib.contextmanager
+def capture_stream(name):
+    """Collect what the current thread writes to ``sys.<name>``."""
+    buffer = io.StringIO()
+    stream = getattr(sys, name)
+    # ThreadOutputRouter dell'executor: si sostituisce solo il sink del thread
+    sinks = getattr(stream, 'sinks', None)
+    if sinks is None:
+        redirect = contextlib.redirect_stdout if name == 'stdout' else contextlib.redirect_stderr
+        with redirect(buffer):
+            yield buffer
+        return
+
+    ident = threading.get_ident()
+    previous = sinks.get(ident)
+    sinks[ident] = buffer.write
+    try:
+        yield buffer
+    finally:
+        if previous is None:
+            sinks.pop(ident, None)
+        else:
+            sinks[ident] = previous
+
+
+class CapturedOutput:
+    """Output of a ``%%capture`` cell."""
+
+    def __init__(self, stdout='', stderr='', outputs=None):
+        self.stdout = stdout
+        self.stderr = stderr
+        # Output display_data (es. tabelle di %%prun)
+        self.outputs = outputs or []
+
+    def show(self):
+        """Print the captured text again."""
+        sys.stdout.write(self.stdout)
+        sys.stderr.write(self.stderr)
+
+    def __str__(self):
+        return self.stdout
+
+    def __repr__(self):
+        return f"<CapturedOutput: {len(self.stdout)} characters, {len(self.stderr)} on stderr>"
+
+
+class TimeitResult:
+    """Timings of ``%timeit -o``: seconds per loop of each run."""
+
+    def __init__(self, loops, timings):
+        self.loops = loops
+        self.repeat = len(timings)
+        self.timings = timings
+        self.best = min(timings)
+        self.worst = max(timings)
+        self.average = statistics.fmean(timings)
+        self.stdev = statistics.stdev(timings) if len(timings) > 1 else 0.0
+
+    def __str__(self):
+        runs = 'run' if self.repeat == 1 else 'runs'
+        loops = 'loop' if self.loops == 1 else 'loops'
+        return (f"{format_time(self.average)} ± {format_time(self.stdev)} per loop "
+                f"(mean ± std. dev. of {self.repeat} {runs}, {self.loops} {loops} each)")
+
+    def __repr__(self):
+        return f"<TimeitResult: {self}>"
+
+
+def _dispatch(name, args):
+    """Call the line magic ``name`` for the code of the calling frame."""
+    namespace = sys._getframe(1).f_globals
+    dispatchers = getattr(_running, 'dispatchers', None)
+    if dispatchers and dispatchers[-1].namespace is namespace:
+        return dispatchers[-1](name, args)
+    # Funzione definita in una cella e chiamata fuori da una cella
+    return MagicDispatcher(namespace)(name, args)
+
+
+# Dispatcher delle celle in esecuzione, per thread
+_running = threading.local()
+
+setattr(builtins, MAGIC_NAME, _dispatch)
+
+
+class MagicDispatcher:
+    """Run cell source with magics in ``namespace``.
+
+    Line magics are the ``line_<name>(args)`` methods, cell magics the
+    ``cell_<name>(args, body)`` ones. ``display`` receives the
+    ``display_data`` outputs produced (e.g. by ``%%prun``).
+    """
+
+    def __init__(self, namespace, filename='<cell>', display=None):
+        self.namespace = namespace
+        self.filename = filename
+        self.display = display or (lambda output_data: None)
+        self.depth = 0
+
+    def __call__(self, name, args):
+        """Entry point of the transformed line magics."""
+        method = getattr(self, 'line_' + name, None)
+        if method is None:
+            raise UsageError(f"Line magic function `%{name}` not found.")
+        return method(args)
+
+    def run(self, source, filename=None):
+        """Execute a cell; return the value of its trailing expression, or None."""
+        previous = self.filename
+        self.filename = filename or self.filename
+        dispatchers = _running.__dict__.setdefault('dispatchers', [])
+        dispatchers.append(self)
+        try:
+            name, args, body = split_cell_magic(source)
+            if name is None:
+                return self.run_code(source)
+            method = getattr(self, 'cell_' + name, None)
+            if method is None:
+                raise UsageError(f"Cell magic `%%{name}` not found.")
+            return method(args, body)
+        finally:
+            dispatchers.pop()
+            self.filename = previous
+
+    def compile(self, source, filename=None):
+        """Return the ``(body, expression)`` code objects of ``source`` with its magics."""
+        filename = filename or self.filename
+        transformed = transform_source(source)
+        code = code_cache.get(transformed, filename)
+        if transformed != source:
+            # Nei traceback le righe originali
+            register_source(source, filename)
+        return code
+
+    def run_code(self, source, filename=None):
+        """Execute ``source`` (without cell magic) and return its trailing expression."""
+        body, expression = self.compile(source, filename)
+        exec(body, self.namespace)
+        if expression is not None:
+            return eval(expression, self.namespace)
+        return None
+
+    def statement_filename(self, name):
+        """Filename of the code passed to a line magic, e.g. ``<cell 3> %time``."""
+        return f"{self.filename} %{name}"
+
+    def line_lsmagic(self, args):
+        """List the available magics."""
+        line = sorted('%' + name[5:] for name in dir(self) if name.startswith('line_'))
+        cell = sorted('%%' + name[5:] for name in dir(self) if name.startswith('cell_'))
+        print("Line magics: " + '  '.join(line))
+        print("Cell magics: " + '  '.join(cell))
+
+    # --- %time ---
+
+    def timed(self, function):
+        cpu = time.thread_time()
+        wall = time.perf_counter()
+        value = function()
+        print(f"CPU time: {format_time(time.thread_time() - cpu)}, "
+              f"Wall time: {format_time(time.perf_counter() - wall)}")
+        return value
+
+    def line_time(self, args):
+        return self.timed(lambda: self.run_code(args, self.statement_filename('time')))
+
+    def cell_time(self, args, body):
+        return self.timed(lambda: self.run_code(body))
+
+    # --- %timeit ---
+
+    def timeit(self, args, stmt, setup='pass'):
+        """Time ``stmt`` like IPython's %timeit; ``-n`` loops, ``-r`` runs, ``-q``, ``-o``."""
+        options, rest = parse_options(args, 'n:r:qo')
+        if stmt is None:
+            stmt = rest
+        elif rest:
+            setup = rest
+        try:
+            loops = int(options.get('n', 0))
+            repeat = int(options.get('r', 7))
+        except ValueError:
+            raise UsageError("%timeit: -n and -r need a number")
+        timer = timeit.Timer(transform_source(stmt), transform_source(setup),
+                             timer=time.perf_counter, globals=self.namespace)
+        if loops <= 0:
+            # 1, 2, 5, 10, 20... cicli finché una misura dura almeno 0.2 s
+            loops, _ = timer.autorange()
+        result = TimeitResult(loops, [total / loops for total in timer.repeat(max(repeat, 1), loops)])
+        if not options.get('q'):
+            if result.worst > 4 * result.best and result.worst > 1e-6:
+                print(f"The slowest run took {result.worst / result.best:.2f} times longer than "
+                      f"the fastest. This could mean that an intermediate result is being cached.")
+            print(result)
+        return result if options.get('o') else None
+
+    def line_timeit(self, args):
+        return self.timeit(args, None)
+
+    def cell_timeit(self, args, body):
+        # Dopo le opzioni, la prima riga è il setup (non misurato)
+        return self.timeit(args, body)
+
+    # --- %memit ---
+
+    def measured(self, function):
+        measure = ExecutionMetrics(trace_allocations=True)
+        measure.start()
+        value = function()
+        metrics = measure.stop()
+        line = (f"Python allocations: peak {format_size(metrics['alloc_peak'])}, "
+                f"retained {format_size(metrics['alloc_delta'])}")
+        if 'peak_rss_delta' in metrics:
+            line += f"; peak memory growth: {format_size(metrics['peak_rss_delta'])}"
+        print(line)
+        return value
+
+    def line_memit(self, args):
+        return self.measured(lambda: self.run_code(args, self.statement_filename('memit')))
+
+    def cell_memit(self, args, body):
+        return self.measured(lambda: self.run_code(body))
+
+    # --- %%capture ---
+
+    def cell_capture(self, args, body):
+        """Run the cell keeping its output; ``%%capture name`` stores it in ``name``."""
+        options, name = parse_options(args.replace('--no-stdout', '-O').replace('--no-stderr', '-E'),
+                                      'OE')
+        outputs = []
+        display = self.display
+        self.display = outputs.append
+        try:
+            with capture_stream('stdout') as stdout, capture_stream('stderr') as stderr:
+                self.run_code(body)
+        finally:
+            self.display = display
+        if options.get('O'):
+            sys.stdout.write(stdout.getvalue())
+        if options.get('E'):
+            sys.stderr.write(stderr.getvalue())
+        if name:
+            self.namespace[name.strip()] = CapturedOutput(stdout.getvalue(), stderr.getvalue(), outputs)
+        return None
+
+    # --- %%prun / %%lprun ---
+
+    def profile(self, name, args, body):
+        profiler = create_profiler(name, args, body, self.filename)
+        # Compila prima: la compilazione non fa parte del profilo
+        self.compile(body)
+        try:
+            return profiler.run(self.run_code, body)
+        finally:
+            self.display(profiler.output())
+
+    def cell_prun(self, args, body):
+        return self.profile('prun', args, body)
+
+    def cell_lprun(self, args, body):
+        return self.profile('lprun', args, body)
+
+    def line_prun(self, args):
+        options, stmt = parse_options(args, 's:l:')
+        return self.profile('prun', ' '.join(f"-{flag} {value}" for flag, value in options.items()),
+                            stmt)
+
+    # --- %run ---
+
+    def line_run(self, args):
+        """Run a notebook (its code cells, in order) or a Python script in the namespace."""
+        try:
+            argv = shlex.split(args)
+        except ValueError as e:
+            raise UsageError(f"%run: {e}")
+        if not argv:
+            raise UsageError("%run: missing file name")
+        path = os.path.expanduser(argv[0])
+        if not os.path.exists(path):
+            raise UsageError(f"%run: file not found: {path}")
+        if self.depth >= MAX_RUN_DEPTH:
+            raise UsageError("%run: too many nested runs")
+
+        self.depth += 1
+        previous_argv = sys.argv
+        sys.argv = [path] + argv[1:]
+        try:
+            if path.endswith('.ipynb'):
+                self.run_notebook(path)
+            else:
+                with open(path, encoding='utf-8') as f:
+                    source = f.read()
+                previous_file = self.namespace.get('__file__')
+                self.namespace['__file__'] = os.path.abspath(path)
+                try:
+                    self.run_code(source, os.path.abspath(path))
+                finally:
+                    if previous_file is None:
+                        self.namespace.pop('__file__', None)
+                    else:
+                        self.namespace['__file__'] = previous_file
+        finally:
+            sys.argv = previous_argv
+            self.depth -= 1
+
+    def run_notebook(self, path):
+        from .qnotebook_model import NotebookModel
+
+        notebook = NotebookModel.load(path)
+        name = os.path.basename(path)
+        for index, cell in enumerate(notebook.cells):
+            if cell.cell_type == 'code' and cell.source.strip():
+                self.run(cell.source, f"<{name} cell {index + 1}>")
+
+    # --- !command ---
+
+    def expand(self, command):
+        """Replace ``{name}`` fields with values from the namespace."""
+        try:
+            return command.format_map(self.namespace)
+        except (KeyError, ValueError, IndexError, AttributeError):
+            # Graffe che non sono campi, es. awk '{print $1}'
+            return command
+
+    def shell(self, command):
+        """Run a shell command, streaming its output; return the output lines."""
+        lines = []
+        process = subprocess.Popen(self.expand(command), shell=True, stdout=subprocess.PIPE,
+                                   stderr=subprocess.STDOUT, stdin=subprocess.DEVNULL,
+                                   text=True, errors='replace')
+        try:
+            for line in process.stdout:
+                lines.append(line)
+                sys.stdout.write(line)
+            process.wait()
+        finally:
+            if process.poll() is None:
+                # Cella interrotta
+                process.kill()
+                process.wait()
+            process.stdout.close()
+        self.namespace['_exit_code'] = process.returncode
+        return lines
+
+    def line_system(self, args):
+        """Run a shell command; its exit code goes to ``_exit_code``."""
+        self.shell(args)
+
+    def line_sx(self, args):
+        """Run a shell command and return its output lines."""
+        with capture_stream('stdout'):
+            lines = self.shell(args)
+        return [line.rstrip('\n') for line in lines]
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Metrics - Time and memory used by a cell run
+"""
+
+import sys
+import time
+import tracemalloc
+
+try:
+    import resource
+except ImportError:
+    # Windows
+    resource = None
+
+
+def peak_rss():
+    """Peak resident memory of the process in bytes, or None if unknown."""
+    if resource is not None:
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux riporta KB, macOS byte
+        return peak if sys.platform == 'darwin' else peak * 1024
+    if sys.platform == 'win32':
+        import ctypes
+        from ctypes import wintypes
+
+        class ProcessMemoryCounters(ctypes.Structure):
+            _fields_ = [('cb', wintypes.DWORD), ('PageFaultCount', wintypes.DWORD),
+                        ('PeakWorkingSetSize', ctypes.c_size_t),
+                        ('WorkingSetSize', ctypes.c_size_t),
+                        ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+                        ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+                        ('PagefileUsage', ctypes.c_size_t),
+                        ('PeakPagefileUsage', ctypes.c_size_t)]
+
+        counters = ProcessMemoryCounters()
+        counters.cb = ctypes.sizeof(counters)
+        try:
+            process = ctypes.windll.kernel32.GetCurrentProcess()
+            if ctypes.windll.psapi.GetProcessMemoryInfo(process, ctypes.byref(counters), counters.cb):
+                return counters.PeakWorkingSetSize
+        except (AttributeError, OSError):
+            pass
+    return None
+
+
+class ExecutionMetrics:
+    """Measure one cell run, between start() and stop() on the executing thread.
+
+    Records the wall time, the CPU time of the thread, how much the peak
+    resident memory of the process grew and, with ``trace_allocations``,
+    the memory allocated by Python code (tracemalloc slows allocations
+    down, so it is only active while the cell runs).
+    """
+
+    def __init__(self, trace_allocations=False):
+        self.trace_allocations = trace_allocations
+        self.started_tracing = False
+
+    def start(self):
+        self.rss = peak_rss()
+        if self.trace_allocations:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+                self.started_tracing = True
+            tracemalloc.reset_peak()
+            self.traced = tracemalloc.get_traced_memory()[0]
+        self.cpu = time.thread_time()
+        self.wall = time.perf_counter()
+
+    def stop(self):
+        """Return the metrics as a JSON-serializable dictionary."""
+        metrics = {
+            'wall': round(time.perf_counter() - self.wall, 6),
+            'cpu': round(time.thread_time() - self.cpu, 6),
+        }
+        rss = peak_rss()
+        if rss is not None and self.rss is not None:
+            metrics['peak_rss_delta'] = rss - self.rss
+        if self.trace_allocations:
+            current, peak = tracemalloc.get_traced_memory()
+            metrics['alloc_delta'] = current - self.traced
+            metrics['alloc_peak'] = peak - self.traced
+            if self.started_tracing:
+                tracemalloc.stop()
+                self.started_tracing = False
+        return metrics
+
+
+def format_size(size):
+    """Signed human-readable byte count."""
+    sign = '-' if size < 0 else '+'
+    size = abs(size)
+    for unit in ('B', 'KB', 'MB'):
+        if size < 1024:
+            return f"{sign}{size:.0f} {unit}"
+        size /= 1024
+    return f"{sign}{size:.1f} GB"
+
+
+def format_duration(seconds):
+    if seconds < 1:
+        return f"{seconds * 1000:.0f} ms"
+    if seconds < 60:
+        return f"{seconds:.2f} s"
+    return f"{int(seconds // 60)}:{seconds % 60:04.1f}"
+
+
+def format_metrics(metrics, details=False):
+    """Short summary of ``metrics`` (the wall time), or all of them with ``details``."""
+    if not details:
+        return format_duration(metrics.get('wall', 0))
+    lines = [f"Wall time: {format_duration(metrics.get('wall', 0))}",
+             f"CPU time: {format_duration(metrics.get('cpu', 0))}"]
+    if 'peak_rss_delta' in metrics:
+        lines.append(f"Peak memory growth: {format_size(metrics['peak_rss_delta'])}")
+    if 'alloc_delta' in metrics:
+        lines.append(f"Python allocations: {format_size(metrics['alloc_delta'])} "
+                     f"(peak {format_size(metrics['alloc_peak'])})")
+    return '\n'.join(lines)
@@ -0,0 +1,641 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Model - Notebook and cell data, independent of Qt widgets
+"""
+
+import os
+import re
+import ast
+import sys
+import copy
+import json
+import uuid
+import tempfile
+import itertools
+
+# Identificativi univoci delle celle nel processo
+_cell_ids = itertools.count(1)
+
+# Tag delle celle parametri (stessa convenzione di papermill)
+PARAMETERS_TAG = 'parameters'
+INJECTED_PARAMETERS_TAG = 'injected-parameters'
+
+
+def join_text(text):
+    """Return nbformat multi-line text (string or list of lines) as a string."""
+    if isinstance(text, list):
+        return ''.join(text)
+    return text or ''
+
+
+def parameters_source(parameters):
+    """Source of a cell assigning ``parameters`` (name -> literal value)."""
+    lines = ['# Parameters']
+    for name, value in parameters.items():
+        if not name.isidentifier():
+            raise ValueError(f"Invalid parameter name: {name!r}")
+        lines.append(f"{name} = {value!r}")
+    return '\n'.join(lines) + '\n'
+
+
+def parse_parameters(source):
+    """Read ``name = literal`` assignments (e.g. a parameters cell) into a dict.
+
+    Raises ValueError for anything else than assignments of Python literals.
+    """
+    try:
+        tree = ast.parse(source)
+    except SyntaxError as e:
+        raise ValueError(f"Invalid parameters: {e.msg} (line {e.lineno})")
+    parameters = {}
+    for statement in tree.body:
+        if (not isinstance(statement, ast.Assign) or len(statement.targets) != 1
+                or not isinstance(statement.targets[0], ast.Name)):
+            raise ValueError(f"Line {statement.lineno}: only 'name = value' assignments are allowed")
+        try:
+            parameters[statement.targets[0].id] = ast.literal_eval(statement.value)
+        except ValueError:
+            raise ValueError(f"Line {statement.lineno}: the value must be a literal")
+    return parameters
+
+
+def default_notebook_metadata():
+    return {
+        "kernelspec": {
+            "display_name": "QGIS Python",
+            "language": "python",
+            "name": "qgis_python"
+        },
+        "language_info": {
+            "codemirror_mode": {
+                "name": "ipython",
+                "version": 3
+            },
+            "file_extension": ".py",
+            "mimetype": "text/x-python",
+            "name": "python",
+            "nbconvert_exporter": "python",
+            "pygments_lexer": "ipython3",
+            "version": sys.version.split()[0]
+        }
+    }
+
+
+class CellModel:
+    """Data of a single notebook cell.
+
+    ``outputs`` holds nbformat output dictionaries. Cells read by
+    read_notebook() keep the outputs as raw JSON until they are first
+    accessed; references to outputs saved in an ``attachments`` store are
+    resolved at that point. ``stale`` is True while the source has changed since the last
+    successful run. ``nb_id`` is the nbformat cell ``id`` (from nbformat 4.5),
+    unlike ``cell_id`` which only identifies the cell in this process.
+    """
+
+    __slots__ = ('cell_id', 'nb_id', 'cell_type', 'source', '_outputs', '_raw_outputs',
+                 'execution_count', 'metadata', 'stale', 'attachments')
+
+    def __init__(self, cell_type='code', source='', outputs=None,
+                 execution_count=0, metadata=None):
+        self.cell_id = next(_cell_ids)
+        self.nb_id = None
+        self.cell_type = cell_type
+        self.source = source
+        self.outputs = outputs if outputs is not None else []
+        self.execution_count = execution_count
+        self.metadata = metadata if metadata is not None else {}
+        self.stale = True
+        self.attachments = None
+
+    @property
+    def outputs(self):
+        if self._raw_outputs is not None:
+            # Decodifica differita degli output letti dal file
+            self._outputs = json.loads(self._raw_outputs)
+            self._raw_outputs = None
+            if self.attachments is not None:
+                self._outputs = self.attachments.resolve(self._outputs)
+        return self._outputs
+
+    @outputs.setter
+    def outputs(self, value):
+        self._outputs = value
+        self._raw_outputs = None
+
+    def set_raw_outputs(self, raw):
+        """Store the outputs as JSON bytes, decoded on first access."""
+        self._outputs = None
+        self._raw_outputs = raw
+
+    def read_outputs(self):
+        """Return the outputs; raw ones are decoded without keeping the copy."""
+        if self._raw_outputs is None:
+            return self._outputs
+        outputs = json.loads(self._raw_outputs)
+        if self.attachments is not None:
+            outputs = self.attachments.resolve(outputs)
+        return outputs
+
+    def outputs_loaded(self):
+        return self._raw_outputs is None
+
+    def outputs_mention(self, text):
+        """Return True if the outputs may contain ``text``, without decoding them."""
+        if self._raw_outputs is not None:
+            return text.encode('utf-8') in self._raw_outputs
+        return bool(self._outputs)
+
+    def has_outputs(self):
+        """Return True if the cell has outputs, without decoding them."""
+        if self._raw_outputs is not None:
+            return _EMPTY_ARRAY.match(self._raw_outputs) is None
+        return bool(self._outputs)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Build a cell from an nbformat cell dictionary."""
+        cell_type = data.get('cell_type', 'code')
+        execution_count = 0
+        if cell_type == 'code':
+            execution_count = data.get('execution_count')
+            if execution_count is None:
+                execution_count = data.get('metadata', {}).get('execution_count', 0)
+        cell = cls(
+            cell_type=cell_type,
+            source=join_text(data.get('source', '')),
+            outputs=list(data.get('outputs') or []),
+            execution_count=execution_count or 0,
+            metadata=dict(data.get('metadata') or {}),
+        )
+        cell.nb_id = data.get('id')
+        return cell
+
+    def to_dict(self, with_outputs=True):
+        """Return the cell as an nbformat dictionary."""
+        data = {
+            'cell_type': self.cell_type,
+            'source': self.source.splitlines(True) if self.source else [],
+            'metadata': self.metadata,
+        }
+        if self.nb_id:
+            data['id'] = self.nb_id
+        if self.cell_type == 'code':
+            data['execution_count'] = self.execution_count or None
+            if with_outputs:
+                data['outputs'] = self.outputs
+        return data
+
+    def output_text(self):
+        """Plain text of the stream, result and error outputs."""
+        parts = []
+        for output_data in self.outputs:
+            output_type = output_data.get('output_type')
+            if output_type == 'stream':
+                parts.append(join_text(output_data.get('text', '')))
+            elif output_type == 'execute_result':
+                parts.append(join_text(output_data.get('data', {}).get('text/plain', '')))
+            elif output_type == 'error':
+                parts.append('\n'.join(output_data.get('traceback', [])))
+        return ''.join(parts)
+
+    def has_tag(self, tag):
+        return tag in self.metadata.get('tags', [])
+
+    def set_tag(self, tag, enabled=True):
+        """Add or remove a tag in the cell metadata."""
+        tags = [t for t in self.metadata.get('tags', []) if t != tag]
+        if enabled:
+            tags.append(tag)
+        if tags:
+            self.metadata['tags'] = tags
+        else:
+            self.metadata.pop('tags', None)
+
+    def clear_outputs(self):
+        self.outputs = []
+        self.metadata.pop('qnotebook', None)
+
+    def append_stream(self, name, text):
+        """Add stdout/stderr text, merged with a preceding output of the same stream."""
+        outputs = self.outputs
+        if outputs and outputs[-1].get('output_type') == 'stream' and outputs[-1].get('name') == name:
+            outputs[-1]['text'] += text
+        else:
+            outputs.append({'output_type': 'stream', 'name': name, 'text': text})
+
+    def append_result(self, value):
+        """Add the repr of the trailing expression."""
+        self.outputs.append({
+            'output_type': 'execute_result',
+            'execution_count': self.execution_count,
+            'data': {'text/plain': value},
+            'metadata': {}
+        })
+
+    def append_display(self, output_data):
+        """Add a complete ``display_data`` output."""
+        self.outputs.append(output_data)
+
+    def append_error(self, ename, evalue, error):
+        """Add an exception raised by the cell, with its formatted traceback."""
+        self.outputs.append({
+            'output_type': 'error',
+            'ename': ename,
+            'evalue': evalue,
+            'traceback': error.rstrip('\n').split('\n')
+        })
+
+
+class NotebookModel:
+    """An ordered list of CellModel plus the notebook metadata."""
+
+    __slots__ = ('cells', 'metadata', 'nbformat', 'nbformat_minor', 'revision', 'attachments')
+
+    def __init__(self, cells=None, metadata=None):
+        self.cells = cells if cells is not None else []
+        self.metadata = metadata if metadata is not None else default_notebook_metadata()
+        self.nbformat = 4
+        self.nbformat_minor = 2
+        # Incrementato a ogni modifica (per capire se va salvato)
+        self.revision = 0
+        # Archivio degli output salvati a parte, se il file ne usa uno
+        self.attachments = None
+
+    def touch(self):
+        """Record that the notebook changed."""
+        self.revision += 1
+
+    @classmethod
+    def from_dict(cls, data):
+        notebook = cls(
+            cells=[CellModel.from_dict(cell) for cell in data.get('cells', [])],
+            metadata=data.get('metadata') or None,
+        )
+        notebook.nbformat_minor = data.get('nbformat_minor', 2)
+        return notebook
+
+    @classmethod
+    def load(cls, filename, progress=None):
+        """Read a notebook from an .ipynb file (see read_notebook)."""
+        with open(filename, 'rb') as f:
+            return read_notebook(f, progress)
+
+    def ensure_cell_ids(self):
+        """Give every cell a unique ``id``, required by nbformat 4.5 and later."""
+        if (self.nbformat, self.nbformat_minor) < (4, 5):
+            return
+        seen = set()
+        for cell in self.cells:
+            # Celle nuove o copiate: id mancante o duplicato
+            if not cell.nb_id or cell.nb_id in seen:
+                cell.nb_id = uuid.uuid4().hex[:8]
+            seen.add(cell.nb_id)
+
+    def to_dict(self):
+        self.ensure_cell_ids()
+        return {
+            "cells": [cell.to_dict() for cell in self.cells],
+            "metadata": self.metadata,
+            "nbformat": self.nbformat,
+            "nbformat_minor": self.nbformat_minor
+        }
+
+    def snapshot(self):
+        """Return a copy of the notebook data for write_snapshot().
+
+        The copy can be serialized on another thread while the cells keep
+        changing. Outputs not decoded yet are passed on as raw JSON.
+        """
+        self.ensure_cell_ids()
+        cells = []
+        for cell in self.cells:
+            data = cell.to_dict(with_outputs=False)
+            data['metadata'] = copy.deepcopy(data['metadata'])
+            outputs = None
+            if cell.cell_type == 'code':
+                if cell.outputs_loaded():
+                    outputs = [dict(output_data) for output_data in cell.outputs]
+                else:
+                    outputs = cell._raw_outputs
+            cells.append((data, outputs))
+        return {
+            'cells': cells,
+            'metadata': copy.deepcopy(self.metadata),
+            'nbformat': self.nbformat,
+            'nbformat_minor': self.nbformat_minor,
+        }
+
+    def save(self, filename, attachments=None):
+        """Write the notebook to an .ipynb file, atomically (see write_snapshot)."""
+        snapshot = self.snapshot()
+        atomic_write(filename, lambda f: write_snapshot(f, snapshot, attachments))
+
+    def parameters_index(self):
+        """Index of the cell tagged as parameters, or None."""
+        for index, cell in enumerate(self.cells):
+            if cell.has_tag(PARAMETERS_TAG):
+                return index
+        return None
+
+    def injected_parameters_index(self):
+        for index, cell in enumerate(self.cells):
+            if cell.has_tag(INJECTED_PARAMETERS_TAG):
+                return index
+        return None
+
+    def inject_parameters(self, parameters):
+        """Set ``parameters`` in a new cell after the parameters cell.
+
+        Without a parameters cell the new cell goes first. A cell injected
+        earlier is replaced. Return the index of the new cell.
+        """
+        index = self.injected_parameters_index()
+        if index is not None:
+            del self.cells[index]
+        index = self.parameters_index()
+        position = 0 if index is None else index + 1
+        cell = CellModel('code', parameters_source(parameters))
+        cell.set_tag(INJECTED_PARAMETERS_TAG)
+        self.cells.insert(position, cell)
+        self.touch()
+        return position
+
+    def code_cells(self):
+        return [cell for cell in self.cells if cell.cell_type == 'code']
+
+    def find(self, text, case_sensitive=False):
+        """Return the indexes of the cells whose source contains ``text``."""
+        if not case_sensitive:
+            text = text.lower()
+        matches = []
+        for index, cell in enumerate(self.cells):
+            source = cell.source if case_sensitive else cell.source.lower()
+            if text in source:
+                matches.append(index)
+        return matches
+
+
+def _dumps(value, indent=''):
+    """Encode ``value`` as nbformat-style JSON, nested by ``indent``."""
+    text = json.dumps(value, indent=1, ensure_ascii=False)
+    # I ritorni a capo nelle stringhe JSON sono sempre escaped
+    return text.replace('\n', '\n' + indent).encode('utf-8')
+
+
+def write_snapshot(f, snapshot, attachments=None):
+    """Write a NotebookModel.snapshot() to the binary file ``f``.
+
+    With an AttachmentStore, large outputs are moved to the store and
+    only references to them are written.
+    """
+    f.write(b'{\n "cells": [')
+    for index, (data, outputs) in enumerate(snapshot['cells']):
+        f.write(b',\n  ' if index else b'\n  ')
+        if outputs is None:
+            f.write(_dumps(data, '  '))
+            continue
+        if attachments is not None:
+            outputs = attachments.externalize(outputs)
+        # Gli output vanno in fondo alla cella; quelli grezzi sono copiati così come sono
+        f.write(_dumps(data, '  ')[:-1].rstrip())
+        f.write(b',\n   "outputs": ')
+        f.write(outputs if isinstance(outputs, bytes) else _dumps(outputs, '   '))
+        f.write(b'\n  }')
+    f.write(b'\n ],\n "metadata": ')
+    f.write(_dumps(snapshot['metadata'], ' '))
+    f.write(b',\n "nbformat": %d,\n "nbformat_minor": %d\n}\n'
+            % (snapshot['nbformat'], snapshot['nbformat_minor']))
+
+
+def atomic_write(filename, write):
+    """Call ``write(f)`` on a temporary file, then move it over ``filename``.
+
+    A crash during the write leaves the previous file intact.
+    """
+    directory = os.path.dirname(os.path.abspath(filename))
+    handle, temp_path = tempfile.mkstemp(dir=directory, prefix='.qnotebook-', suffix='.tmp')
+    try:
+        with os.fdopen(handle, 'wb') as f:
+            write(f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, filename)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+_EMPTY_ARRAY = re.compile(rb'\s*\[\s*\]\s*$')
+_NOT_SPACE = re.compile(rb'[^ \t\r\n]')
+_NESTED_SPECIAL = re.compile(rb'["\[\]{}]')
+_SCALAR_END = re.compile(rb'[,}\] \t\r\n]')
+
+
+class _JSONScanner:
+    """Split JSON read from a binary file into raw values, chunk by chunk.
+
+    Only the structure is scanned (strings, brackets); values are returned
+    as bytes for json.loads. Memory use is bounded by the largest single
+    value, not by the file size.
+    """
+
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = bytearray()
+        self.pos = 0
+        # Posizione nel file dell'inizio del buffer
+        self.offset = 0
+        self.eof = False
+
+    def fill(self):
+        """Read one more chunk; return False at end of file."""
+        if self.eof:
+            return False
+        data = self.f.read(self.CHUNK_SIZE)
+        if not data:
+            self.eof = True
+            return False
+        self.buffer.extend(data)
+        return True
+
+    def compact(self):
+        """Drop the bytes already consumed."""
+        if self.pos > self.CHUNK_SIZE:
+            del self.buffer[:self.pos]
+            self.offset += self.pos
+            self.pos = 0
+
+    def tell(self):
+        return self.offset + self.pos
+
+    def error(self, message):
+        return ValueError(f"Invalid notebook: {message} at byte {self.tell()}")
+
+    def search(self, pattern, start):
+        """Search ``pattern`` from ``start``, reading more data as needed."""
+        while True:
+            match = pattern.search(self.buffer, start)
+            if match is not None:
+                return match.start()
+            start = len(self.buffer)
+            if not self.fill():
+                return None
+
+    def find(self, char, start):
+        """Like bytearray.find, reading more data as needed; -1 at end of file."""
+        while True:
+            index = self.buffer.find(char, start)
+            if index >= 0:
+                return index
+            start = len(self.buffer)
+            if not self.fill():
+                return -1
+
+    def peek(self):
+        """Return the next non-blank character (as bytes) without consuming it."""
+        index = self.search(_NOT_SPACE, self.pos)
+        if index is None:
+            raise self.error("unexpected end of file")
+        self.pos = index
+        return self.buffer[index:index + 1]
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise self.error(f"expected {char.decode()}")
+        self.pos += 1
+
+    def string_end(self, start):
+        """Index after the string starting at ``start`` (on its quote)."""
+        # find() invece di regex: le stringhe base64 possono essere enormi
+        index = start + 1
+        while True:
+            quote = self.find(b'"', index)
+            if quote < 0:
+                raise self.error("unterminated string")
+            # Le virgolette chiudono la stringa se precedute da un numero pari di \\
+            backslashes = 0
+            while self.buffer[quote - 1 - backslashes] == 0x5C:
+                backslashes += 1
+            if backslashes % 2 == 0:
+                return quote + 1
+            index = quote + 1
+
+    def value_end(self, start):
+        """Index after the JSON value starting at ``start``."""
+        first = self.buffer[start]
+        if first == 0x22:
+            return self.string_end(start)
+        if first not in b'[{':
+            end = self.search(_SCALAR_END, start)
+            return len(self.buffer) if end is None else end
+
+        depth = 0
+        index = start
+        while True:
+            index = self.search(_NESTED_SPECIAL, index)
+            if index is None:
+                raise self.error("unterminated array or object")
+            char = self.buffer[index]
+            if char == 0x22:
+                index = self.string_end(index)
+                continue
+            if char in b'[{':
+                depth += 1
+            else:
+                depth -= 1
+                if depth == 0:
+                    return index + 1
+            index += 1
+
+    def raw_value(self):
+        """Consume the next value and return it as bytes."""
+        self.peek()
+        start = self.pos
+        self.pos = self.value_end(start)
+        return bytes(self.buffer[start:self.pos])
+
+    def value(self):
+        return json.loads(self.raw_value())
+
+    def members(self):
+        """Iterate over the keys of the object at the current position.
+
+        The caller must consume each member value before the next key.
+        """
+        self.expect(b'{')
+        if self.peek() == b'}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(b':')
+            yield key
+            separator = self.peek()
+            self.pos += 1
+            if separator == b'}':
+                return
+            if separator != b',':
+                raise self.error("expected , or }")
+
+    def items(self):
+        """Iterate over the elements of the array at the current position.
+
+        The caller must consume each element before the next iteration.
+        """
+        self.expect(b'[')
+        if self.peek() == b']':
+            self.pos += 1
+            return
+        while True:
+            yield
+            separator = self.peek()
+            self.pos += 1
+            if separator == b']':
+                return
+            if separator != b',':
+                raise self.error("expected , or ]")
+
+
+def read_notebook(f, progress=None):
+    """Read a notebook from the binary file ``f``, one cell at a time.
+
+    Cell outputs are kept as raw JSON and decoded when first used, so large
+    embedded images do not become Python objects until a cell is shown.
+    ``progress(done, total)`` is called with byte counts after each cell.
+    """
+    try:
+        total = os.fstat(f.fileno()).st_size
+    except (AttributeError, OSError, ValueError):
+        total = 0
+
+    scanner = _JSONScanner(f)
+    notebook = NotebookModel()
+    for key in scanner.members():
+        if key != 'cells':
+            value = scanner.value()
+            if key == 'metadata' and value:
+                notebook.metadata = value
+            elif key in ('nbformat', 'nbformat_minor'):
+                setattr(notebook, key, value)
+            continue
+
+        for _ in scanner.items():
+            data = {}
+            raw_outputs = None
+            for cell_key in scanner.members():
+                if cell_key == 'outputs':
+                    raw_outputs = scanner.raw_value()
+                else:
+                    data[cell_key] = scanner.value()
+            cell = CellModel.from_dict(data)
+            if raw_outputs is not None:
+                cell.set_raw_outputs(raw_outputs)
+            notebook.cells.append(cell)
+
+            scanner.compact()
+            if progress is not None:
+                progress(scanner.tell(), total)
+    return notebook
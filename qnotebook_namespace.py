@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Namespace - Default namespace of the notebook cells
+"""
+
+import time
+import types
+import importlib
+import importlib.util
+import contextlib
+import collections
+
+from qgis.core import QgsMessageLog, Qgis
+
+# Moduli importati solo al primo uso: nome nel namespace -> modulo
+LAZY_MODULES = {
+    'processing': 'processing',
+    'np': 'numpy',
+    'pd': 'pandas',
+    'plt': 'matplotlib.pyplot',
+    'statistics': 'statistics',
+}
+
+# Durate (secondi) dei passi di avvio e delle importazioni differite; solo le
+# ultime MAX_TIMINGS, perché ogni riavvio del kernel ne aggiunge altre
+MAX_TIMINGS = 100
+startup_timings = collections.deque(maxlen=MAX_TIMINGS)
+
+
+@contextlib.contextmanager
+def timed(step):
+    """Record how long the ``with`` block takes under ``step``."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        startup_timings.append((step, time.perf_counter() - start))
+
+
+def timing_report():
+    """Return the recorded timings as text, one step per line."""
+    return '\n'.join(f"{step}: {seconds * 1000:.1f} ms" for step, seconds in startup_timings)
+
+
+class LazyModule(types.ModuleType):
+    """Stand-in for a module that is imported on first attribute access.
+
+    Once imported, the real module replaces the proxy in the namespace it
+    was created for, so later cells get the module itself.
+    """
+
+    def __init__(self, module_name, namespace=None, key=None):
+        super().__init__(module_name)
+        self.__dict__['_lazy_target'] = (namespace, key)
+
+    def _load(self):
+        module = self.__dict__.get('_lazy_module')
+        if module is None:
+            start = time.perf_counter()
+            with timed(f"import {self.__name__}"):
+                module = importlib.import_module(self.__name__)
+            self.__dict__['_lazy_module'] = module
+            QgsMessageLog.logMessage(f"QNotebook: imported {self.__name__} on first use "
+                                     f"({(time.perf_counter() - start) * 1000:.0f} ms)",
+                                     "QNotebook", Qgis.Info)
+            if self.__name__ == 'processing':
+                # Importato durante la cella: l'esecutore l'ha già cercato invano
+                from .qnotebook_executor import install_processing_hook
+                install_processing_hook()
+
+            namespace, key = self.__dict__['_lazy_target']
+            if namespace is not None and namespace.get(key) is self:
+                namespace[key] = module
+        return module
+
+    def __getattr__(self, name):
+        return getattr(self._load(), name)
+
+    def __dir__(self):
+        return dir(self._load())
+
+    def __repr__(self):
+        if '_lazy_module' in self.__dict__:
+            return repr(self.__dict__['_lazy_module'])
+        return f"<lazy module '{self.__name__}' (not imported yet)>"
+
+
+def is_available(module_name):
+    """Return True if ``module_name`` can be imported, without importing it."""
+    try:
+        return importlib.util.find_spec(module_name.split('.')[0]) is not None
+    except (ImportError, ValueError):
+        return False
+
+
+def create_namespace(iface=None):
+    """Crea un namespace di default con le variabili QGIS.
+
+    Le classi QGIS sono già caricate dall'applicazione; numpy, pandas,
+    matplotlib e processing vengono importati solo quando una cella li usa.
+    """
+    with timed("namespace"):
+        from qgis.core import (
+            Qgis, QgsProject, QgsVectorLayer, QgsRasterLayer,
+            QgsFeature, QgsGeometry, QgsPointXY, QgsField,
+            QgsVectorFileWriter, QgsCoordinateTransformContext,
+            QgsMapSettings, QgsSymbol, QgsSimpleMarkerSymbolLayer,
+            QgsGraduatedSymbolRenderer, QgsRendererRange,
+            QgsClassificationRange, QgsStyle, QgsColorRamp,
+            QgsGradientColorRamp, QgsApplication, QgsProcessingFeedback,
+            QgsCoordinateReferenceSystem, QgsRectangle, QgsExpression,
+            QgsExpressionContext, QgsExpressionContextUtils
+        )
+        from qgis.PyQt.QtCore import QVariant
+        from qgis.PyQt.QtGui import QColor
+
+        # Prova a ottenere iface
+        try:
+            from qgis.utils import iface as qgis_iface
+            if qgis_iface is not None:
+                iface = qgis_iface
+        except ImportError:
+            pass
+
+        namespace = {
+            '__name__': '__main__',
+            '__builtins__': __builtins__,
+            'iface': iface,
+            'Qgis': Qgis,
+            'QgsProject': QgsProject,
+            'QgsVectorLayer': QgsVectorLayer,
+            'QgsRasterLayer': QgsRasterLayer,
+            'QgsFeature': QgsFeature,
+            'QgsGeometry': QgsGeometry,
+            'QgsPointXY': QgsPointXY,
+            'QgsField': QgsField,
+            'QVariant': QVariant,
+            'QgsVectorFileWriter': QgsVectorFileWriter,
+            'QgsCoordinateTransformContext': QgsCoordinateTransformContext,
+            'QgsMapSettings': QgsMapSettings,
+            'QgsSymbol': QgsSymbol,
+            'QgsSimpleMarkerSymbolLayer': QgsSimpleMarkerSymbolLayer,
+            'QgsGraduatedSymbolRenderer': QgsGraduatedSymbolRenderer,
+            'QgsRendererRange': QgsRendererRange,
+            'QgsClassificationRange': QgsClassificationRange,
+            'QgsStyle': QgsStyle,
+            'QgsColorRamp': QgsColorRamp,
+            'QgsGradientColorRamp': QgsGradientColorRamp,
+            'QgsApplication': QgsApplication,
+            'QgsProcessingFeedback': QgsProcessingFeedback,
+            'QgsCoordinateReferenceSystem': QgsCoordinateReferenceSystem,
+            'QgsRectangle': QgsRectangle,
+            'QgsExpression': QgsExpression,
+            'QgsExpressionContext': QgsExpressionContext,
+            'QgsExpressionContextUtils': QgsExpressionContextUtils,
+            'QColor': QColor,
+            'canvas': iface.mapCanvas() if iface else None,
+            'project': QgsProject.instance(),
+        }
+
+        # Moduli comuni, se installati, importati al primo uso
+        for key, module_name in LAZY_MODULES.items():
+            if is_available(module_name):
+                namespace[key] = LazyModule(module_name, namespace, key)
+
+    return namespace
@@ -0,0 +1,195 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Output - Bounded storage for cell stream output
+"""
+
+import os
+import shutil
+import hashlib
+import tempfile
+
+from qgis.PyQt.QtCore import QSettings
+
+
+def output_limit():
+    """Maximum number of characters kept in memory per cell."""
+    kb = int(QSettings().value('QNotebook/output_limit_kb', 200))
+    return max(kb, 1) * 1024
+
+
+class CellOutputStore:
+    """Stream output of a cell with a bounded in-memory footprint.
+
+    Text is kept in memory until it exceeds ``limit`` characters. From then
+    on only the first and last ``limit / 2`` characters are kept, and the full
+    stream is spilled to a temporary file that can be opened on demand.
+    """
+
+    def __init__(self, limit=None):
+        self.limit = limit if limit is not None else output_limit()
+        self.path = None
+        self.owned = False
+        self.reset()
+
+    def reset(self):
+        """Forget the current output and remove the spill file we created."""
+        if self.path and self.owned:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        self.parts = []
+        self.head = ''
+        self.tail = ''
+        self.size = 0
+        self.truncated = False
+        self.path = None
+        self.owned = False
+        self.spill = None
+        # Testo troncato letto da un notebook salvato, mostrato così com'è
+        self.saved_text = None
+
+    def write(self, text):
+        """Add text; return True if the store is (now) truncated."""
+        if not text:
+            return self.truncated
+        self.size += len(text)
+
+        if not self.truncated:
+            self.parts.append(text)
+            if self.size > self.limit:
+                self.start_spill()
+            return self.truncated
+
+        if self.spill is not None:
+            self.spill.write(text)
+            self.spill.flush()
+        half = self.limit // 2
+        self.tail = (self.tail + text)[-half:]
+        return True
+
+    def start_spill(self):
+        """Move the full text to a temporary file, keeping head and tail."""
+        text = ''.join(self.parts)
+        self.parts = []
+        half = self.limit // 2
+        self.head = text[:half]
+        self.tail = text[-half:]
+
+        handle, self.path = tempfile.mkstemp(prefix='qnotebook_output_', suffix='.txt')
+        self.spill = os.fdopen(handle, 'w', encoding='utf-8')
+        self.spill.write(text)
+        self.spill.flush()
+        self.owned = True
+        self.truncated = True
+
+    def load_truncated(self, text, reference):
+        """Restore a truncated output saved by sync_model, without spilling it again.
+
+        ``text`` is the saved head + marker + tail; ``reference`` the saved
+        ``{'path', 'size'}`` of the full output, whose file may be gone.
+        """
+        self.reset()
+        self.truncated = True
+        self.saved_text = text
+        self.size = reference.get('size', len(text))
+        path = reference.get('path')
+        if path and os.path.exists(path):
+            self.path = path
+
+    def keep(self, notebook_filename):
+        """Keep the full output file next to the notebook saved as ``notebook_filename``.
+
+        Not while the cell is still writing it; return True if the path changed.
+        """
+        if not self.path or self.spill is not None:
+            return False
+        path = keep_output_file(self.path, notebook_filename, self.owned)
+        if path is None or path == self.path:
+            return False
+        # Il file ora appartiene al notebook salvato
+        self.path = path
+        self.owned = False
+        return True
+
+    def close(self):
+        """Close the spill file; the text stays available on disk."""
+        if self.spill is not None:
+            self.spill.close()
+            self.spill = None
+
+    def omitted(self):
+        return self.size - len(self.head) - len(self.tail)
+
+    def marker(self):
+        # Senza il percorso: il testo viene salvato nel notebook
+        return f"\n… {self.omitted():,} characters not shown — see Full output …\n"
+
+    def text(self):
+        """Text to display: everything, or head + marker + tail."""
+        if not self.truncated:
+            return ''.join(self.parts)
+        if self.saved_text is not None:
+            return self.saved_text
+        return self.head + self.marker() + self.tail
+
+    def reference(self):
+        """Metadata describing the spilled output, for saved notebooks."""
+        if not self.path or self.spill is not None:
+            # Cella ancora in esecuzione: il file è nella cartella temporanea
+            return None
+        return {'path': self.path, 'size': self.size}
+
+
+def file_digest(path):
+    """SHA-256 of the content of ``path``."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def full_output_path(notebook_filename, digest):
+    """Where a full output is kept: ``<notebook>.output-<hash>.txt``.
+
+    Named by content, not by cell number: numbers change when cells are
+    inserted or deleted, the content of a file does not.
+    """
+    root, _ = os.path.splitext(notebook_filename)
+    return f"{root}.output-{digest[:16]}.txt"
+
+
+def keep_output_file(path, notebook_filename, owned):
+    """Put the full output file ``path`` next to ``notebook_filename``; return its new path.
+
+    A temporary file we ``owned`` is moved, the file of another notebook
+    (e.g. before "Save As") is copied. An existing target has the same
+    content and is reused. None if ``path`` is missing or cannot be copied.
+    """
+    try:
+        target = full_output_path(notebook_filename, file_digest(path))
+        if os.path.abspath(target) == os.path.abspath(path):
+            return path
+        if os.path.exists(target):
+            if owned:
+                os.remove(path)
+        elif owned:
+            shutil.move(path, target)
+        else:
+            shutil.copyfile(path, target)
+    except OSError:
+        return None
+    return target
+
+
+def keep_reference(reference, notebook_filename):
+    """Keep the file of a saved ``full_output`` reference next to the notebook; update it."""
+    path = (reference or {}).get('path')
+    if not path or not os.path.exists(path):
+        return False
+    target = keep_output_file(path, notebook_filename, False)
+    if target is None or target == path:
+        return False
+    reference['path'] = target
+    return True
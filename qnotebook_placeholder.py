@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Cell Placeholder - Lightweight stand-in for off-screen cells
+"""
+
+from qgis.PyQt.QtWidgets import QFrame
+from qgis.PyQt.QtCore import Qt, pyqtSignal
+from qgis.PyQt.QtGui import QFont, QColor, QPainter
+
+
+class QNotebookCellPlaceholder(QFrame):
+    """Read-only rendering of a cell that has no editor widgets yet.
+
+    Shows a CellModel and exposes the parts of the cell interface the
+    notebook uses without real widgets. The notebook swaps it for a QNotebookCell when it scrolls near
+    the viewport or when it has to run.
+    """
+
+    activated = pyqtSignal(object)
+
+    # Righe di sorgente mostrate nell'anteprima
+    PREVIEW_LINES = 12
+    LINE_HEIGHT = 16
+
+    def __init__(self, model, parent=None):
+        super().__init__(parent)
+        self.model = model
+        self.cell_number = 0
+        self.setup_ui()
+
+    @property
+    def cell_id(self):
+        return self.model.cell_id
+
+    @property
+    def cell_type(self):
+        return self.model.cell_type
+
+    @property
+    def stale(self):
+        return self.model.stale
+
+    @property
+    def execution_count(self):
+        return self.model.execution_count or 0
+
+    @execution_count.setter
+    def execution_count(self, value):
+        self.model.execution_count = value
+        self.update_number_label()
+
+    def source(self):
+        return self.model.source
+
+    def setup_ui(self):
+        # Nessun widget figlio: il contenuto è disegnato in paintEvent,
+        # così migliaia di segnaposto restano economici da creare e disporre
+        self.setFrameStyle(QFrame.Box)
+        self.preview_font = QFont('monospace')
+        self.preview_font.setStyleHint(QFont.TypeWriter)
+
+        lines = self.source().split('\n')
+        self.preview = '\n'.join(lines[:self.PREVIEW_LINES])
+        if len(lines) > self.PREVIEW_LINES:
+            self.preview += f"\n… {len(lines) - self.PREVIEW_LINES} more lines"
+
+        # Gli output non ancora decodificati non vengono letti qui
+        has_outputs = self.model.has_outputs()
+        if not has_outputs:
+            self.outputs_text = ""
+        elif self.model.outputs_loaded():
+            self.outputs_text = f"{len(self.model.outputs)} output(s)"
+        else:
+            self.outputs_text = "Saved outputs"
+
+        # Altezza simile a quella della cella reale, per uno scroll stabile
+        shown = min(len(lines), self.PREVIEW_LINES + 1)
+        height = max(60, shown * self.LINE_HEIGHT) + 50
+        if has_outputs:
+            height += 80
+        self.setFixedHeight(height)
+
+    def number_text(self):
+        if self.cell_type == 'code':
+            count = self.execution_count
+            return f"[{count if count else ''}]: "
+        return ""
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        painter = QPainter(self)
+        rect = self.contentsRect().adjusted(9, 9, -9, -9)
+        painter.drawText(rect.adjusted(0, 0, -(rect.width() - 50), 0),
+                         Qt.AlignTop | Qt.AlignLeft, self.number_text())
+
+        content = rect.adjusted(56, 0, 0, 0)
+        painter.setFont(self.preview_font)
+        painter.drawText(content, Qt.AlignTop | Qt.AlignLeft, self.preview)
+        if self.outputs_text:
+            painter.setFont(self.font())
+            painter.setPen(QColor('gray'))
+            painter.drawText(content, Qt.AlignBottom | Qt.AlignLeft, self.outputs_text)
+        painter.end()
+
+    def update_number_label(self):
+        self.update()
+
+    def mousePressEvent(self, event):
+        self.activated.emit(self)
+        super().mousePressEvent(event)
+
+    def is_running(self):
+        return False
+
+    def run_cell(self, advance=True):
+        raise RuntimeError("Placeholder cells must be materialized before running")
+
+    def set_selected(self, selected):
+        self.setStyleSheet("QFrame { border: 2px solid #4CAF50; }" if selected else "")
+
+    def clear_output(self):
+        self.model.clear_outputs()
+        self.outputs_text = ""
+        self.update()
+
+    def set_tag(self, tag, enabled=True):
+        self.model.set_tag(tag, enabled)
+
+    def output_text(self):
+        """Plain text of the saved outputs."""
+        return self.model.output_text()
+
+    def sync_model(self):
+        return self.model
+
+    def to_dict(self):
+        return self.model.to_dict()
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Profiler - Run a cell under cProfile or a line tracer
+
+A cell starting with ``%%prun`` runs under cProfile, one starting with
+``%%lprun`` under a tracer timing each line of the cell (and of the
+functions it defines). The result is a ``display_data`` output holding the
+table (PROFILE_MIME) and its text version.
+"""
+
+import os
+import sys
+import time
+import shlex
+import hashlib
+import shutil
+import pstats
+import cProfile
+import tempfile
+import collections
+
+# Tipo MIME della tabella del profilo negli output
+PROFILE_MIME = 'application/vnd.qnotebook.profile+json'
+PROFILE_KEY = 'qnotebook_profile'
+
+# Le funzioni del plugin (executor, cache del codice) non compaiono nel profilo
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Righe salvate nella tabella e mostrate nel testo
+MAX_ROWS = 200
+TEXT_ROWS = 25
+
+# Chiavi di ordinamento di %%prun -s (come pstats) e colonna corrispondente
+SORT_KEYS = {
+    'tottime': 'tottime', 'time': 'tottime', 'cumulative': 'cumtime', 'cumtime': 'cumtime',
+    'ncalls': 'ncalls', 'calls': 'ncalls',
+}
+
+
+def split_cell_magic(source):
+    """Split ``%%name args`` off the first line of a cell.
+
+    Return ``(name, args, body)``; ``name`` is None for plain code. The
+    magic line is left empty in ``body`` so line numbers are unchanged.
+    """
+    first, newline, rest = source.partition('\n')
+    if not first.startswith('%%'):
+        return None, '', source
+    name, _, args = first[2:].strip().partition(' ')
+    return name, args.strip(), newline + rest
+
+
+def create_profiler(name, args, source, filename):
+    """Profiler for the cell magic ``name``, or None if it is not a profiling magic."""
+    if name == 'prun':
+        return FunctionProfiler(args)
+    if name == 'lprun':
+        return LineProfiler(filename, source)
+    return None
+
+
+def format_value(value, column):
+    if isinstance(value, float):
+        return f"{value:.1f}" if column == '%' else f"{value:.4f}"
+    return str(value)
+
+
+def table_text(columns, rows, limit=TEXT_ROWS):
+    """Fixed-width text version of a profile table."""
+    cells = [[format_value(value, column) for value, column in zip(row, columns)]
+             for row in rows[:limit]]
+    widths = [max([len(column)] + [len(row[i]) for row in cells]) for i, column in enumerate(columns)]
+    lines = ['  '.join(column.rjust(width) for column, width in zip(columns[:-1], widths))
+             + '  ' + columns[-1]]
+    for row in cells:
+        lines.append('  '.join(value.rjust(width) for value, width in zip(row[:-1], widths))
+                     + '  ' + row[-1])
+    if len(rows) > limit:
+        lines.append(f"... {len(rows) - limit} more")
+    return '\n'.join(lines) + '\n'
+
+
+class FunctionProfiler:
+    """cProfile of a cell, with the ``-s key`` and ``-l rows`` options of %%prun."""
+
+    kind = 'functions'
+    columns = ['ncalls', 'tottime', 'percall', 'cumtime', 'function']
+
+    def __init__(self, args=''):
+        self.sort = 'tottime'
+        self.limit = MAX_ROWS
+        options = shlex.split(args)
+        for option, value in zip(options, options[1:]):
+            if option == '-s' and value in SORT_KEYS:
+                self.sort = value
+            elif option == '-l' and value.isdigit():
+                self.limit = min(int(value), MAX_ROWS)
+        self.profile = cProfile.Profile()
+        self.hidden = set()
+        self.seconds = 0.0
+
+    def run(self, function, *args):
+        """Call ``function(*args)`` under the profiler and return its result."""
+        # Il chiamante e il profiler stesso non compaiono nella tabella
+        code = getattr(function, '__code__', None)
+        if code is not None:
+            self.hidden = {(code.co_filename, code.co_firstlineno, code.co_name)}
+        start = time.perf_counter()
+        self.profile.enable()
+        try:
+            return function(*args)
+        finally:
+            self.profile.disable()
+            self.seconds = time.perf_counter() - start
+
+    def rows(self):
+        stats = pstats.Stats(self.profile)
+        rows = []
+        for (filename, line, name), (primitive, calls, total, cumulative, _) in stats.stats.items():
+            if ((filename, line, name) in self.hidden or '_lsprof.Profiler' in name
+                    or os.path.dirname(filename) == PLUGIN_DIR):
+                continue
+            if filename == '~':
+                # Funzioni built-in
+                function = name
+            else:
+                function = f"{os.path.basename(filename)}:{line}({name})"
+            ncalls = str(calls) if calls == primitive else f"{calls}/{primitive}"
+            rows.append([ncalls, total, total / calls if calls else 0.0, cumulative, function])
+        column = self.columns.index(SORT_KEYS[self.sort])
+        rows.sort(key=lambda row: sort_value(row[column]), reverse=True)
+        return rows[:self.limit]
+
+    def save(self):
+        """Dump the raw stats to a temporary .pstats file; return its path."""
+        handle, path = tempfile.mkstemp(prefix='qnotebook-', suffix='.pstats')
+        os.close(handle)
+        self.profile.dump_stats(path)
+        return path
+
+    def output(self):
+        rows = self.rows()
+        metadata = {}
+        try:
+            metadata['pstats'] = self.save()
+        except OSError:
+            pass
+        return {
+            'output_type': 'display_data',
+            'data': {
+                'text/plain': f"Profile ({self.seconds:.3f} s, sorted by {self.sort}):\n"
+                              + table_text(self.columns, rows),
+                PROFILE_MIME: {'kind': self.kind, 'columns': self.columns, 'rows': rows,
+                               'sort': SORT_KEYS[self.sort], 'seconds': self.seconds},
+            },
+            'metadata': {PROFILE_KEY: metadata},
+        }
+
+
+class LineProfiler:
+    """Hits and time of each line run from the cell ``filename``.
+
+    The time of a line includes the functions it calls. Only frames of the
+    cell code are traced, so library code runs at nearly full speed.
+    """
+
+    kind = 'lines'
+    columns = ['line', 'hits', 'time', 'per hit', '%', 'source']
+
+    def __init__(self, filename, source):
+        self.filename = filename
+        self.source = source
+        self.hits = collections.Counter()
+        self.times = collections.defaultdict(float)
+        self.last = {}
+        self.seconds = 0.0
+
+    def trace(self, frame, event, arg):
+        if frame.f_code.co_filename != self.filename:
+            return None
+        return self.trace_line
+
+    def trace_line(self, frame, event, arg):
+        now = time.perf_counter()
+        previous = self.last.get(frame)
+        if previous is not None:
+            self.times[previous[0]] += now - previous[1]
+        if event == 'line':
+            self.hits[frame.f_lineno] += 1
+            self.last[frame] = (frame.f_lineno, now)
+        elif event == 'return':
+            self.last.pop(frame, None)
+        else:
+            self.last[frame] = (previous[0], now) if previous else (frame.f_lineno, now)
+        return self.trace_line
+
+    def run(self, function, *args):
+        """Call ``function(*args)`` with the tracer and return its result."""
+        previous_trace = sys.gettrace()
+        start = time.perf_counter()
+        sys.settrace(self.trace)
+        try:
+            return function(*args)
+        finally:
+            sys.settrace(previous_trace)
+            self.seconds = time.perf_counter() - start
+
+    def rows(self):
+        lines = self.source.split('\n')
+        total = sum(self.times.values()) or 1.0
+        rows = []
+        for line in sorted(self.hits):
+            seconds = self.times.get(line, 0.0)
+            text = lines[line - 1].rstrip() if 0 < line <= len(lines) else ''
+            rows.append([line, self.hits[line], seconds, seconds / self.hits[line],
+                         round(seconds * 100 / total, 1), text])
+        return rows[:MAX_ROWS]
+
+    def output(self):
+        rows = self.rows()
+        slowest = sorted(rows, key=lambda row: row[2], reverse=True)
+        return {
+            'output_type': 'display_data',
+            'data': {
+                'text/plain': f"Line profile ({self.seconds:.3f} s, slowest lines first):\n"
+                              + table_text(self.columns, slowest),
+                PROFILE_MIME: {'kind': self.kind, 'columns': self.columns, 'rows': rows,
+                               'sort': 'line', 'seconds': self.seconds},
+            },
+            'metadata': {PROFILE_KEY: {}},
+        }
+
+
+def profile_path(notebook_filename, digest, kind='pstats'):
+    """Where a profile file is kept: ``<notebook>.profile-<hash>.<kind>``.
+
+    Named by content, not by cell number, so that cells inserted or deleted
+    between two saves do not overwrite each other's profiles.
+    """
+    root, _ = os.path.splitext(notebook_filename)
+    return f"{root}.profile-{digest[:16]}.{kind}"
+
+
+def is_temporary_profile(path):
+    """True for a profile file written by this session in the temporary folder."""
+    return (os.path.dirname(os.path.abspath(path)) == os.path.abspath(tempfile.gettempdir())
+            and os.path.basename(path).startswith('qnotebook-'))
+
+
+def keep_profile(output_data, notebook_filename):
+    """Keep the profile files of an output (.pstats, .collapsed) next to the notebook.
+
+    Temporary files are moved, the files of another notebook (e.g. before
+    "Save As") are copied; an existing file with the same name has the same
+    content and is reused. Updates the paths in the output metadata; return
+    the new paths.
+    """
+    metadata = output_data.get('metadata', {}).get(PROFILE_KEY, {})
+    kept = []
+    for kind in ('pstats', 'collapsed'):
+        path = metadata.get(kind)
+        if not path or not os.path.exists(path):
+            continue
+        try:
+            digest = hashlib.sha256()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 * 1024), b''):
+                    digest.update(block)
+            target = profile_path(notebook_filename, digest.hexdigest(), kind)
+            if os.path.abspath(target) == os.path.abspath(path):
+                continue
+            owned = is_temporary_profile(path)
+            if os.path.exists(target):
+                if owned:
+                    os.remove(path)
+            elif owned:
+                shutil.move(path, target)
+            else:
+                shutil.copyfile(path, target)
+        except OSError:
+            continue
+        metadata[kind] = target
+        kept.append(target)
+    return kept
+
+
+def sort_value(value):
+    """Key ordering a table cell by value; ``ncalls`` like ``12/3`` by the first number."""
+    if isinstance(value, str) and value.replace('/', '').isdigit():
+        return int(value.split('/')[0])
+    return value
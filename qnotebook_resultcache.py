@@ -0,0 +1,242 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Result Cache - Persistent memoization of cell results
+"""
+
+import os
+import types
+import pickle
+import hashlib
+import tempfile
+import importlib
+import threading
+
+from qgis.PyQt.QtCore import QSettings
+
+from .qnotebook_dependencies import analyze_source
+
+
+def default_cache_directory():
+    try:
+        from qgis.core import QgsApplication
+        base = QgsApplication.qgisSettingsDirPath()
+    except ImportError:
+        base = ''
+    if not base:
+        base = os.path.join(os.path.expanduser('~'), '.qnotebook')
+    return os.path.join(base, 'qnotebook', 'result_cache')
+
+
+def code_digest(code, names):
+    """Hash of ``code`` and of the code nested in it; add the global names it uses to ``names``."""
+    digest = hashlib.sha256(code.co_code)
+    names.update(code.co_names)
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType):
+            # repr() di un code object contiene il suo indirizzo
+            digest.update(code_digest(const, names).encode('utf-8'))
+        else:
+            digest.update(repr(const).encode('utf-8'))
+    return digest.hexdigest()
+
+
+def function_fingerprint(function, seen):
+    """Fingerprint of a function: code, defaults, closure and the globals it uses."""
+    if id(function) in seen:
+        # Funzione ricorsiva: già inclusa più in alto
+        return 'function:' + function.__qualname__
+    seen = seen | {id(function)}
+
+    names = set()
+    parts = [function.__qualname__, code_digest(function.__code__, names)]
+    values = [('default', value) for value in function.__defaults__ or ()]
+    values += sorted((function.__kwdefaults__ or {}).items())
+    for cell in function.__closure__ or ():
+        try:
+            values.append(('closure', cell.cell_contents))
+        except ValueError:
+            values.append(('closure', None))
+    values += [(name, function.__globals__[name]) for name in sorted(names)
+               if name in function.__globals__]
+    for label, value in values:
+        value_fingerprint = fingerprint(value, seen)
+        if value_fingerprint is None:
+            return None
+        parts.append(f'{label}={value_fingerprint}')
+    return 'function:' + hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+
+def fingerprint(value, seen=frozenset()):
+    """Return a string identifying ``value``, or None if it cannot be hashed.
+
+    Modules are identified by name. Functions by code, default values,
+    closure and the globals they use, so that changing a variable used by a
+    function invalidates the cells calling it. Map layers are identified by
+    id, source and subset string (edits not yet saved are not detected). Any
+    other value is identified by the hash of its pickle.
+    """
+    if isinstance(value, types.ModuleType):
+        return 'module:' + value.__name__
+
+    if isinstance(value, types.FunctionType):
+        return function_fingerprint(value, seen)
+
+    if all(hasattr(value, name) for name in ('id', 'source', 'dataProvider')):
+        try:
+            subset = value.subsetString() if hasattr(value, 'subsetString') else ''
+            return f'layer:{value.id()}:{value.source()}:{subset}'
+        except Exception:
+            return None
+
+    try:
+        data = pickle.dumps(value, protocol=4)
+    except Exception:
+        return None
+    return 'pickle:' + hashlib.sha256(data).hexdigest()
+
+
+class ResultCache:
+    """On-disk cache of cell outputs and of the variables they define.
+
+    A cell result is reused when the cell source and the fingerprints of
+    every variable it reads match a previous run. The oldest entries are
+    removed once the cache exceeds ``max_bytes``.
+    """
+
+    # Oltre questa dimensione l'output non viene memorizzato
+    MAX_TRANSCRIPT = 1024 * 1024
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or default_cache_directory()
+        if max_bytes is None:
+            max_bytes = int(QSettings().value('QNotebook/result_cache_mb', 500)) * 1024 * 1024
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def read_fingerprints(self, source, namespace):
+        """Fingerprints of the variables ``source`` reads in ``namespace``, or None."""
+        _, reads = analyze_source(source)
+        fingerprints = {}
+        for name in reads:
+            if name not in namespace:
+                fingerprints[name] = 'missing'
+                continue
+            fingerprints[name] = fingerprint(namespace[name])
+            if fingerprints[name] is None:
+                return None
+        return fingerprints
+
+    def key(self, source, reads):
+        """Cache key for running ``source`` with the ``reads`` from read_fingerprints, or None."""
+        if reads is None:
+            return None
+        parts = [hashlib.sha256(source.encode('utf-8')).hexdigest()]
+        parts += [f'{name}={reads[name]}' for name in sorted(reads)]
+        return hashlib.sha256('\n'.join(parts).encode('utf-8')).hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.pickle')
+
+    def load(self, key):
+        """Return the cached entry for ``key`` or None.
+
+        The entry is a dict with ``streams`` (list of ``(name, text)``),
+        ``value`` (repr of the trailing expression) and ``variables``.
+        """
+        path = self.path(key)
+        try:
+            with open(path, 'rb') as f:
+                entry = pickle.load(f)
+        except (OSError, EOFError, pickle.PickleError, AttributeError, ImportError):
+            return None
+
+        variables = {}
+        for name, (kind, data) in entry.get('variables', {}).items():
+            try:
+                variables[name] = importlib.import_module(data) if kind == 'module' else pickle.loads(data)
+            except Exception:
+                return None
+        entry['variables'] = variables
+
+        # Aggiorna la data di accesso (per l'eliminazione LRU)
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def store(self, key, source, namespace, streams, value, reads):
+        """Save a successful run; return False if it cannot be cached.
+
+        ``reads`` are the read_fingerprints taken before the run. Variables
+        the cell changed in place (``values.append(5)``) are saved with the
+        ones it defines, so that a cache hit leaves them as the run did.
+        """
+        if sum(len(text) for _, text in streams) > self.MAX_TRANSCRIPT:
+            return False
+
+        defines, _ = analyze_source(source)
+        names = set(defines)
+        for name, before in reads.items():
+            if name in namespace and fingerprint(namespace[name]) != before:
+                names.add(name)
+
+        variables = {}
+        for name in names:
+            if name not in namespace:
+                continue
+            variable = namespace[name]
+            if isinstance(variable, types.ModuleType):
+                variables[name] = ('module', variable.__name__)
+                continue
+            try:
+                variables[name] = ('pickle', pickle.dumps(variable, protocol=4))
+            except Exception:
+                return False
+
+        entry = {'streams': streams, 'value': value, 'variables': variables}
+        handle, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(handle, 'wb') as f:
+                pickle.dump(entry, f, protocol=4)
+            os.replace(temp_path, self.path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            return False
+
+        self.evict()
+        return True
+
+    def evict(self):
+        """Remove the least recently used entries above ``max_bytes``."""
+        with self.lock:
+            entries = []
+            for name in os.listdir(self.directory):
+                if not name.endswith('.pickle'):
+                    continue
+                path = os.path.join(self.directory, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, path))
+
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                    total -= size
+                except OSError:
+                    pass
+
+    def clear(self):
+        for name in os.listdir(self.directory):
+            if name.endswith('.pickle'):
+                try:
+                    os.remove(os.path.join(self.directory, name))
+                except OSError:
+                    pass
@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Runner - Execute notebooks without the notebook widgets
+"""
+
+import time
+
+from .qnotebook_executor import ExecutionJob
+from .qnotebook_namespace import create_namespace
+
+
+class NotebookRunner:
+    """Run the code cells of a NotebookModel from top to bottom.
+
+    Cells are executed like QNotebookCell.execute_code does, through an
+    ExecutionJob in a shared namespace, but synchronously on the calling
+    thread. Outputs and execution counts are written to the cell models.
+    Unless ``allow_errors`` is set, the run stops at the first failing cell.
+    """
+
+    def __init__(self, notebook, namespace=None, allow_errors=False, report=None,
+                 trace_allocations=False, timeline=None, sample_interval=None):
+        self.notebook = notebook
+        self.namespace = namespace if namespace is not None else create_namespace()
+        self.allow_errors = allow_errors
+        # Chiamata dopo ogni cella con il suo risultato
+        self.report = report
+        self.trace_allocations = trace_allocations
+        # Timeline che riceve gli span delle celle (vedi qnotebook_timeline)
+        self.timeline = timeline
+        # Secondi tra i campioni del profiler a campionamento (None = spento)
+        self.sample_interval = sample_interval
+        self.execution_count = 0
+        self.results = []
+
+    def run(self):
+        """Run the notebook; return True if every executed cell succeeded."""
+        ok = True
+        for index, cell in enumerate(self.notebook.cells):
+            if cell.cell_type != 'code' or not cell.source.strip():
+                continue
+            result = self.run_cell(index, cell)
+            if not result['ok']:
+                ok = False
+                if not self.allow_errors:
+                    break
+        return ok
+
+    def run_cell(self, index, cell):
+        """Execute one cell model and return its result dictionary."""
+        self.execution_count += 1
+        cell.clear_outputs()
+        cell.execution_count = self.execution_count
+
+        job = ExecutionJob(cell.source, self.namespace, f"<cell {index + 1}>")
+        job.trace_allocations = self.trace_allocations
+        job.sample_interval = self.sample_interval
+        if self.timeline is not None:
+            job.spans = []
+        job.stdout.connect(lambda text: cell.append_stream('stdout', text))
+        job.stderr.connect(lambda text: cell.append_stream('stderr', text))
+        job.result.connect(lambda value: cell.append_result(value))
+        job.display.connect(lambda output_data: cell.append_display(output_data))
+        job.error.connect(lambda ename, evalue, tb: cell.append_error(ename, evalue, tb))
+
+        start = time.perf_counter()
+        job.run()
+        seconds = time.perf_counter() - start
+        if self.timeline is not None:
+            self.timeline.extend(job.spans)
+        job.deleteLater()
+
+        cell.stale = not job.ok
+        if job.metrics:
+            cell.metadata.setdefault('qnotebook', {})['metrics'] = job.metrics
+        self.notebook.touch()
+        result = {
+            'index': index,
+            'execution_count': self.execution_count,
+            'seconds': seconds,
+            'ok': job.ok,
+            'error': job.exception[0] if job.exception else None,
+            'metrics': job.metrics,
+        }
+        self.results.append(result)
+        if self.report is not None:
+            self.report(result)
+        return result
@@ -0,0 +1,140 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Sampler - Low-overhead sampling profiler for running cells
+
+A background thread reads the stack of the thread running a cell with
+``sys._current_frames()`` every ``interval`` seconds. The cell itself is
+not instrumented, so it runs at full speed; the cost is one stack walk per
+sample. Stacks are aggregated in the collapsed format of flamegraph.pl and
+speedscope (``root;caller;function count``).
+"""
+
+import os
+import sys
+import time
+import tempfile
+import threading
+import collections
+
+from .qnotebook_profiler import PROFILE_KEY
+
+# Tipo MIME del rapporto negli output
+STACKS_MIME = 'application/vnd.qnotebook.stacks+json'
+
+DEFAULT_INTERVAL = 0.01
+# Stack e funzioni mostrati nel testo del rapporto
+TEXT_ROWS = 15
+
+# I frame alla base dello stack fino a quelli del plugin (executor, magics)
+# non interessano
+PLUGIN_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def frame_label(code, lineno=None):
+    """``function (file.py:line)``; the definition line unless ``lineno`` is given."""
+    line = code.co_firstlineno if lineno is None else lineno
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{line})"
+
+
+class StackSampler(threading.Thread):
+    """Sample the stack of thread ``ident`` until stop() is called."""
+
+    def __init__(self, ident, interval=DEFAULT_INTERVAL):
+        super().__init__(name='qnotebook-sampler', daemon=True)
+        self.target_ident = ident
+        self.interval = max(interval, 0.001)
+        self.stacks = collections.Counter()
+        self.samples = 0
+        # Ultimo stack, con le righe correnti: dove si trova la cella ora
+        self.last_stack = []
+        self.started_at = time.perf_counter()
+        self.seconds = 0.0
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            frame = sys._current_frames().get(self.target_ident)
+            if frame is None or self.stopping.is_set():
+                continue
+            self.sample(frame)
+            del frame
+
+    def sample(self, frame):
+        codes = []
+        lines = []
+        while frame is not None:
+            codes.append(frame.f_code)
+            lines.append(frame.f_lineno)
+            frame = frame.f_back
+        codes.reverse()
+        lines.reverse()
+        start = 0
+        plugin = [os.path.dirname(code.co_filename) == PLUGIN_DIR for code in codes]
+        if True in plugin:
+            start = plugin.index(True)
+            while start < len(codes) and plugin[start]:
+                start += 1
+            if start == len(codes):
+                # Solo codice del plugin (prima o dopo la cella): non conta
+                return
+        self.stacks[';'.join(frame_label(code) for code in codes[start:])] += 1
+        self.last_stack = [frame_label(code, line) for code, line in zip(codes[start:], lines[start:])]
+        self.samples += 1
+
+    def stop(self):
+        self.stopping.set()
+        self.join()
+        self.seconds = time.perf_counter() - self.started_at
+
+    def collapsed(self):
+        """The stacks in collapsed format, most frequent first."""
+        return ''.join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def functions(self):
+        """``(function, self samples, total samples)`` rows, by self samples."""
+        own = collections.Counter()
+        total = collections.Counter()
+        for stack, count in self.stacks.items():
+            frames = stack.split(';')
+            own[frames[-1]] += count
+            for name in set(frames):
+                total[name] += count
+        return [(name, own[name], total[name]) for name, _ in own.most_common()]
+
+    def report(self):
+        """Text summary: the hottest functions and the last stack."""
+        lines = [f"Sampled {self.samples} stacks every {self.interval * 1000:g} ms "
+                 f"over {self.seconds:.2f} s"]
+        if self.samples:
+            lines.append(f"{'self %':>7} {'total %':>7}  function")
+            for name, own, total in self.functions()[:TEXT_ROWS]:
+                lines.append(f"{own * 100 / self.samples:7.1f} {total * 100 / self.samples:7.1f}  {name}")
+        if self.last_stack:
+            lines.append("Last stack (most recent call last):")
+            lines.extend('  ' + label for label in self.last_stack)
+        return '\n'.join(lines) + '\n'
+
+    def save(self):
+        """Write the collapsed stacks to a temporary file; return its path."""
+        handle, path = tempfile.mkstemp(prefix='qnotebook-', suffix='.collapsed')
+        with os.fdopen(handle, 'w', encoding='utf-8') as f:
+            f.write(self.collapsed())
+        return path
+
+    def output(self):
+        """The report as a ``display_data`` output."""
+        metadata = {}
+        if self.samples:
+            try:
+                metadata['collapsed'] = self.save()
+            except OSError:
+                pass
+        return {
+            'output_type': 'display_data',
+            'data': {
+                'text/plain': self.report(),
+                STACKS_MIME: {'interval': self.interval, 'samples': self.samples,
+                              'seconds': self.seconds, 'stacks': dict(self.stacks)},
+            },
+            'metadata': {PROFILE_KEY: metadata},
+        }
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Session - Kernel state shared by the notebook views
+"""
+
+from qgis.PyQt.QtCore import QObject, QSettings, pyqtSignal
+
+from .qnotebook_executor import QNotebookExecutor
+from .qnotebook_kernel_process import QNotebookProcessKernel
+from .qnotebook_namespace import create_namespace
+from .qnotebook_resultcache import ResultCache
+
+
+class QNotebookSession(QObject):
+    """Namespace, executor and execution options of a kernel.
+
+    Several notebook views (the dock and the Python console tab) attach to
+    one session: they share variables, run cells through the same queue
+    and see the same busy state and options.
+    """
+
+    # Notifica le viste: namespace ricreato, opzioni cambiate, stato del processo
+    restarted = pyqtSignal()
+    options_changed = pyqtSignal()
+    process_kernel_state = pyqtSignal(str)
+    busy_changed = pyqtSignal(bool)
+
+    def __init__(self, iface=None, parent=None):
+        super().__init__(parent)
+        self.iface = iface
+        self.console_shell = None
+        # Variabili della console prima del collegamento, ripristinate dal restart
+        self.console_locals = {}
+        self.execution_count = 0
+        self.namespace = create_namespace(iface)
+
+        self.executor = QNotebookExecutor(self)
+        self.executor.threaded = QSettings().value('QNotebook/background_thread', False, type=bool)
+        self.executor.busy_changed.connect(self.busy_changed)
+
+    def attach_console(self, shell):
+        """Share the Python console namespace with the notebooks.
+
+        Variables already defined in the notebooks are copied to the console
+        namespace unless the console defines the same name.
+        """
+        if shell is None or not hasattr(shell, 'locals') or shell is self.console_shell:
+            return
+        self.console_locals = dict(shell.locals)
+        for name, value in self.namespace.items():
+            shell.locals.setdefault(name, value)
+        self.namespace = shell.locals
+        self.console_shell = shell
+
+    def next_execution_count(self):
+        """Number of the next cell run, counted across every attached view."""
+        self.execution_count += 1
+        return self.execution_count
+
+    def is_busy(self):
+        return self.executor.is_busy()
+
+    def interrupt(self):
+        self.executor.interrupt()
+
+    @property
+    def threaded(self):
+        return self.executor.threaded
+
+    def set_threaded(self, threaded):
+        """Switch between background-thread and GUI-thread execution."""
+        self.executor.threaded = threaded
+        self.options_changed.emit()
+
+    @property
+    def result_cache(self):
+        return self.executor.result_cache
+
+    def set_result_cache(self, enabled):
+        """Enable or disable the persistent result cache (OSError if unavailable)."""
+        self.executor.result_cache = ResultCache() if enabled else None
+        self.options_changed.emit()
+
+    @property
+    def trace_allocations(self):
+        return self.executor.trace_allocations
+
+    def set_trace_allocations(self, enabled):
+        """Measure the Python allocations of each cell run with tracemalloc."""
+        self.executor.trace_allocations = enabled
+        self.options_changed.emit()
+
+    @property
+    def sampling(self):
+        return bool(self.executor.sample_interval)
+
+    def set_sampling(self, enabled):
+        """Sample the stack of running cells; also attaches to the cell running now."""
+        interval = int(QSettings().value('QNotebook/sampling_interval_ms', 10)) / 1000.0
+        self.executor.set_sampling(interval if enabled else None)
+        self.options_changed.emit()
+
+    @property
+    def process_kernel(self):
+        return self.executor.process_kernel
+
+    def set_process_kernel(self, enabled):
+        """Run cells in a separate kernel process or inside QGIS."""
+        if enabled and self.executor.process_kernel is None:
+            kernel = QNotebookProcessKernel(self)
+            kernel.state_changed.connect(self.process_kernel_state)
+            self.executor.process_kernel = kernel
+            kernel.start()
+        elif not enabled and self.executor.process_kernel is not None:
+            kernel = self.executor.process_kernel
+            self.executor.process_kernel = None
+            kernel.shutdown()
+            kernel.deleteLater()
+        self.options_changed.emit()
+
+    def restart(self):
+        """Drop every variable and restart the kernel process, if any.
+
+        The notebooks get a fresh namespace. An attached Python console is
+        rebound to it, so the two still share their variables; the console
+        gets back the ones it had before it was attached.
+        """
+        self.executor.interrupt()
+        if self.executor.process_kernel is not None:
+            self.executor.process_kernel.restart()
+
+        self.namespace = create_namespace(self.iface)
+        if self.console_shell is not None:
+            self.namespace.update(self.console_locals)
+            self.console_shell.locals = self.namespace
+        self.execution_count = 0
+        self.restarted.emit()
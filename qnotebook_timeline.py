@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Timeline - Spans of a profiled run and Chrome trace export
+
+A span is a JSON-serializable dictionary ``{'name', 'cat', 'ts', 'dur',
+'args'}`` with ``ts`` in seconds since the epoch (comparable between the
+GUI and the kernel process) and ``dur`` in seconds. Categories are
+``cell``, ``processing`` (processing.run and friends) and ``io`` (calls
+into GDAL/OGR and the QGIS data providers).
+"""
+
+import sys
+import json
+import time
+
+# Classi e metodi QGIS che leggono o scrivono dati
+IO_CLASSES = {
+    'QgsDataProvider', 'QgsVectorDataProvider', 'QgsRasterDataProvider',
+    'QgsVectorFileWriter', 'QgsRasterFileWriter', 'QgsFeatureIterator',
+}
+IO_METHODS = {
+    'getFeatures', 'getFeature', 'nextFeature', 'addFeature', 'addFeatures',
+    'commitChanges', 'block', 'identify', 'sample', 'writeAsVectorFormat',
+    'writeAsVectorFormatV2', 'writeAsVectorFormatV3',
+}
+
+# Chiamate I/O consecutive più vicine di così (s) diventano un solo span
+MERGE_GAP = 0.001
+# Span I/O per cella oltre i quali si conta solo il tempo totale
+MAX_IO_SPANS = 10000
+
+
+def make_span(name, category, start, end, **args):
+    return {'name': name, 'cat': category, 'ts': start, 'dur': max(end - start, 0.0), 'args': args}
+
+
+def io_call_name(function):
+    """Name of a builtin reading or writing data (GDAL/OGR, QGIS providers), or None."""
+    name = getattr(function, '__name__', '')
+    module = getattr(function, '__module__', None) or ''
+    if module.startswith('osgeo'):
+        return f"{module}.{name}"
+    owner = getattr(function, '__self__', None)
+    owner_type = owner if isinstance(owner, type) else type(owner)
+    if (getattr(owner_type, '__module__', '') or '').startswith('qgis.'):
+        if owner_type.__name__ in IO_CLASSES or name in IO_METHODS:
+            return f"{owner_type.__name__}.{name}"
+    return None
+
+
+class IOTracer:
+    """Record the calls into GDAL/OGR and the QGIS data providers as ``io`` spans.
+
+    Uses ``sys.setprofile`` on the calling thread, so only C functions
+    called from Python are seen: iterating a QgsFeatureIterator with
+    ``for`` is not, ``nextFeature()`` is. Runs of calls to the same
+    function are merged into one span carrying the call count.
+
+    Only one profile hook can be active on a thread: if another profiler
+    is already running, or cProfile (``%%prun``) replaces the hook during
+    the cell, ``skipped`` is set and the recorded I/O is incomplete.
+    """
+
+    def __init__(self, spans):
+        self.spans = spans
+        self.cache = {}
+        self.active = None
+        self.active_name = None
+        self.begin = 0.0
+        self.last = None
+        self.count = 0
+        self.total = 0.0
+        self.previous = None
+        self.skipped = False
+
+    def start(self):
+        self.previous = sys.getprofile()
+        if self.previous is not None:
+            # Un altro profiler è attivo: non sostituirlo
+            self.skipped = True
+            return
+        sys.setprofile(self.profile)
+
+    def stop(self):
+        if self.skipped:
+            return
+        # cProfile.enable() prende il posto dell'hook e disable() lo rimuove
+        self.skipped = sys.getprofile() != self.profile
+        sys.setprofile(self.previous)
+
+    def classify(self, function):
+        owner = getattr(function, '__self__', None)
+        key = (type(owner), getattr(function, '__module__', None), getattr(function, '__name__', None))
+        name = self.cache.get(key, False)
+        if name is False:
+            name = self.cache[key] = io_call_name(function)
+        return name
+
+    def profile(self, frame, event, arg):
+        if event == 'c_call':
+            if self.active is None:
+                name = self.classify(arg)
+                if name is not None:
+                    self.active = arg
+                    self.active_name = name
+                    self.begin = time.time()
+        elif event in ('c_return', 'c_exception') and arg is self.active:
+            self.active = None
+            self.record(self.active_name, self.begin, time.time())
+
+    def record(self, name, start, end):
+        self.total += end - start
+        last = self.last
+        if last is not None and last['name'] == name and start - (last['ts'] + last['dur']) < MERGE_GAP:
+            last['dur'] = end - last['ts']
+            last['args']['calls'] += 1
+            last['args']['busy'] += end - start
+            return
+        if self.count >= MAX_IO_SPANS:
+            self.last = None
+            return
+        self.last = make_span(name, 'io', start, end, calls=1, busy=end - start)
+        self.spans.append(self.last)
+        self.count += 1
+
+
+def merged_duration(spans):
+    """Time covered by ``spans``, counting overlapping (nested) spans once."""
+    total = 0.0
+    end = None
+    for span in sorted(spans, key=lambda span: span['ts']):
+        span_end = span['ts'] + span['dur']
+        if end is None or span['ts'] >= end:
+            total += span['dur']
+            end = span_end
+        elif span_end > end:
+            total += span_end - end
+            end = span_end
+    return total
+
+
+class Timeline:
+    """Spans recorded while running a notebook."""
+
+    def __init__(self):
+        self.spans = []
+
+    def extend(self, spans):
+        self.spans.extend(spans)
+
+    def start(self):
+        return min((span['ts'] for span in self.spans), default=0.0)
+
+    def end(self):
+        return max((span['ts'] + span['dur'] for span in self.spans), default=0.0)
+
+    def duration(self):
+        return self.end() - self.start()
+
+    def totals(self):
+        """Time spent in each category."""
+        categories = {}
+        for span in self.spans:
+            categories.setdefault(span['cat'], []).append(span)
+        return {category: merged_duration(spans) for category, spans in categories.items()}
+
+    def layout(self):
+        """Return ``(span, depth)`` pairs; a span is one level below those containing it."""
+        rows = []
+        stack = []
+        for span in sorted(self.spans, key=lambda span: (span['ts'], -span['dur'])):
+            while stack and span['ts'] >= stack[-1]['ts'] + stack[-1]['dur']:
+                stack.pop()
+            rows.append((span, len(stack)))
+            stack.append(span)
+        return rows
+
+    def to_chrome_trace(self):
+        """The spans as a Chrome trace (chrome://tracing, Perfetto, speedscope)."""
+        start = self.start()
+        events = [{'name': 'thread_name', 'ph': 'M', 'pid': 1, 'tid': 1,
+                   'args': {'name': 'QNotebook'}}]
+        for span in sorted(self.spans, key=lambda span: span['ts']):
+            events.append({
+                'name': span['name'], 'cat': span['cat'], 'ph': 'X', 'pid': 1, 'tid': 1,
+                'ts': round((span['ts'] - start) * 1e6, 3), 'dur': round(span['dur'] * 1e6, 3),
+                'args': span.get('args', {}),
+            })
+        return {'traceEvents': events, 'displayTimeUnit': 'ms',
+                'otherData': {'start': start}}
+
+    def save(self, filename):
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump(self.to_chrome_trace(), f)
@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Timeline Panel - Timeline/flame view of a profiled run
+"""
+
+import re
+import html
+
+from qgis.PyQt.QtWidgets import (
+    QWidget, QVBoxLayout, QHBoxLayout, QLabel, QPushButton, QScrollArea,
+    QToolTip, QFileDialog, QMessageBox
+)
+from qgis.PyQt.QtCore import Qt, QEvent, QRectF, pyqtSignal
+from qgis.PyQt.QtGui import QPainter, QColor, QPen
+
+from .qnotebook_metrics import format_duration
+
+CATEGORY_COLORS = {
+    'cell': '#5c8dd6',
+    'processing': '#e08a3c',
+    'io': '#4f9d69',
+}
+CATEGORY_NAMES = {
+    'cell': 'Cells',
+    'processing': 'Processing',
+    'io': 'GDAL/OGR I/O',
+}
+
+
+class TimelineCanvas(QWidget):
+    """Spans drawn left to right in time, nested spans one row below (flame layout).
+
+    Ctrl+wheel zooms in and out.
+    """
+
+    ROW_HEIGHT = 20
+
+    span_clicked = pyqtSignal(dict)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.rows = []
+        self.start = 0.0
+        self.duration = 0.0
+        self.zoom = 1.0
+        self.setMouseTracking(True)
+
+    def set_timeline(self, timeline):
+        self.rows = timeline.layout()
+        self.start = timeline.start()
+        self.duration = timeline.duration() or 1e-6
+        depth = max((depth for _, depth in self.rows), default=0)
+        self.setMinimumHeight((depth + 1) * self.ROW_HEIGHT + 2)
+        self.update()
+
+    def span_rect(self, span, depth):
+        scale = self.width() / self.duration
+        return QRectF((span['ts'] - self.start) * scale, depth * self.ROW_HEIGHT,
+                      max(span['dur'] * scale, 1.0), self.ROW_HEIGHT - 2)
+
+    def span_at(self, position):
+        # Dal basso: gli span annidati sono disegnati sopra i contenitori
+        for span, depth in reversed(self.rows):
+            if self.span_rect(span, depth).contains(position):
+                return span
+        return None
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        visible = QRectF(event.rect())
+        metrics = painter.fontMetrics()
+        for span, depth in self.rows:
+            rect = self.span_rect(span, depth)
+            if not rect.intersects(visible):
+                continue
+            color = QColor(CATEGORY_COLORS.get(span['cat'], '#999999'))
+            if span['cat'] == 'cell' and not span.get('args', {}).get('ok', True):
+                color = QColor('#c0392b')
+            painter.fillRect(rect, color)
+            if rect.width() > 30:
+                painter.setPen(QPen(Qt.white))
+                text = metrics.elidedText(span['name'], Qt.ElideRight, int(rect.width()) - 6)
+                painter.drawText(rect.adjusted(3, 0, -3, 0), Qt.AlignVCenter | Qt.AlignLeft, text)
+        painter.end()
+
+    def event(self, event):
+        if event.type() == QEvent.ToolTip:
+            span = self.span_at(event.pos())
+            if span is None:
+                QToolTip.hideText()
+            else:
+                QToolTip.showText(event.globalPos(), self.describe(span), self)
+            return True
+        return super().event(event)
+
+    def describe(self, span):
+        lines = [f"<b>{html.escape(span['name'])}</b>", format_duration(span['dur'])]
+        args = span.get('args', {})
+        if args.get('code'):
+            lines.append(f"<code>{html.escape(args['code'])}</code>")
+        if args.get('io'):
+            lines.append(f"GDAL/OGR I/O: {format_duration(args['io'])}")
+        if args.get('io_skipped'):
+            lines.append("I/O incomplete: another profiler (e.g. %%prun) was active")
+        if args.get('calls', 0) > 1:
+            lines.append(f"{args['calls']} calls, busy {format_duration(args['busy'])}")
+        return '<br>'.join(lines)
+
+    def mousePressEvent(self, event):
+        span = self.span_at(event.pos())
+        if span is not None:
+            self.span_clicked.emit(span)
+
+    def wheelEvent(self, event):
+        if not event.modifiers() & Qt.ControlModifier:
+            event.ignore()
+            return
+        factor = 1.25 if event.angleDelta().y() > 0 else 0.8
+        self.zoom = min(max(self.zoom * factor, 1.0), 1000.0)
+        viewport = self.parentWidget()
+        self.setMinimumWidth(int(viewport.width() * self.zoom) if viewport else 0)
+        event.accept()
+
+
+class QNotebookTimelinePanel(QWidget):
+    """Timeline of a "Profile Run All", with the Chrome trace export."""
+
+    # Numero della cella cliccata nella timeline
+    cell_clicked = pyqtSignal(int)
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.timeline = None
+
+        layout = QVBoxLayout()
+        layout.setContentsMargins(5, 2, 5, 2)
+        header = QHBoxLayout()
+        self.summary_label = QLabel()
+        header.addWidget(self.summary_label)
+        header.addStretch()
+        export_btn = QPushButton("Export Chrome Trace…")
+        export_btn.setToolTip("Save the timeline for chrome://tracing, Perfetto or speedscope")
+        export_btn.clicked.connect(self.export_trace)
+        header.addWidget(export_btn)
+        close_btn = QPushButton("✕")
+        close_btn.setFlat(True)
+        close_btn.clicked.connect(self.hide)
+        header.addWidget(close_btn)
+        layout.addLayout(header)
+
+        self.canvas = TimelineCanvas()
+        self.canvas.span_clicked.connect(self.on_span_clicked)
+        scroll_area = QScrollArea()
+        scroll_area.setWidgetResizable(True)
+        scroll_area.setWidget(self.canvas)
+        scroll_area.setMaximumHeight(180)
+        layout.addWidget(scroll_area)
+        self.setLayout(layout)
+
+    def set_timeline(self, timeline):
+        self.timeline = timeline
+        self.canvas.set_timeline(timeline)
+        self.summary_label.setText(self.summary())
+
+    def summary(self):
+        duration = self.timeline.duration()
+        cells = len([span for span in self.timeline.spans if span['cat'] == 'cell'])
+        parts = [f"{cells} cells in {format_duration(duration)}"]
+        for category, seconds in sorted(self.timeline.totals().items()):
+            if category != 'cell':
+                share = f" ({seconds * 100 / duration:.0f}%)" if duration else ''
+                parts.append(f"{CATEGORY_NAMES.get(category, category)} "
+                             f"{format_duration(seconds)}{share}")
+        return ' · '.join(parts)
+
+    def on_span_clicked(self, span):
+        match = re.search(r'\bcell (\d+)$', span['name'])
+        if span['cat'] == 'cell' and match:
+            self.cell_clicked.emit(int(match.group(1)))
+
+    def export_trace(self):
+        if self.timeline is None:
+            return
+        filename, _ = QFileDialog.getSaveFileName(
+            self, "Export Chrome Trace", "notebook-trace.json", "Chrome trace (*.json)")
+        if not filename:
+            return
+        try:
+            self.timeline.save(filename)
+        except OSError as e:
+            QMessageBox.critical(self, "Export Chrome Trace", f"Cannot write the trace:\n{e}")
@@ -4,8 +4,6 @@ QNotebook Widget - Main notebook interface
 """
 
 import os
-import sys
-import json
 import datetime
 from pathlib import Path
 
@@ -13,7 +11,7 @@ from qgis.PyQt.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QToolBar,
     QScrollArea, QLabel, QPushButton, QFileDialog,
     QMenu, QToolButton, QComboBox, QAction,
-    QMessageBox, QShortcut, QApplication
+    QMessageBox, QShortcut, QProgressBar, QInputDialog
 )
 from qgis.PyQt.QtCore import (
     Qt, QSize, QTimer, pyqtSignal,
@@ -28,6 +26,21 @@ from qgis.gui import QgsMessageBar
 
 # Import cell class
 from .qnotebook_cell import QNotebookCell
+from .qnotebook_placeholder import QNotebookCellPlaceholder
+from .qnotebook_model import (
+    CellModel, NotebookModel, PARAMETERS_TAG, INJECTED_PARAMETERS_TAG,
+    parameters_source, parse_parameters
+)
+from .qnotebook_session import QNotebookSession
+from .qnotebook_loader import NotebookLoader
+from .qnotebook_autosave import QNotebookAutosave, apply_journal
+from .qnotebook_export import export_html
+from .qnotebook_profiler import PROFILE_KEY, keep_profile
+from .qnotebook_output import keep_reference
+from .qnotebook_codecache import new_filename_prefix
+from .qnotebook_timeline import Timeline
+from .qnotebook_timeline_panel import QNotebookTimelinePanel
+from .qnotebook_dependencies import DependencyGraph
 
 # Templates
 from .templates import NOTEBOOK_TEMPLATES
@@ -35,111 +48,56 @@ from .templates import NOTEBOOK_TEMPLATES
 class QNotebookWidget(QWidget):
     """Main notebook widget for QGIS."""
     
-    def __init__(self, iface, console=None, parent=None):
+    # Oltre questo numero di celle solo quelle vicine alla vista hanno un editor
+    VIRTUALIZE_THRESHOLD = 50
+    # Margine (pixel) sopra e sotto la vista entro cui le celle sono reali
+    VIEWPORT_MARGIN = 800
+    # Oltre questo numero di celle il caricamento mostra l'avanzamento
+    LOAD_PROGRESS_THRESHOLD = 200
+    
+    def __init__(self, iface, console=None, parent=None, session=None):
         super().__init__(parent)
         self.iface = iface
         self.console = console
+        # Dati del notebook; self.cells contiene le viste, nello stesso ordine
+        self.notebook = NotebookModel()
         self.cells = []
         self.current_cell = None
-        self.execution_count = 0
+        # Nomi di file delle celle (traceback, linecache) propri di questa vista
+        self.filename_prefix = new_filename_prefix()
+        # Lettura in corso di un file .ipynb
+        self.loader = None
+        # Salvataggio automatico in background (e diario delle modifiche)
+        self.autosave = QNotebookAutosave(self)
+        self.autosave.saved.connect(self.on_notebook_saved)
+        self.autosave.failed.connect(self.on_notebook_save_failed)
+        self.manual_save = False
+        # Celle in attesa di esecuzione (Run All / modalità reattiva)
+        self.pending_run = []
+        self.waiting_cell_id = None
+        # Modalità reattiva: riesegue solo le celle a valle di una modifica
+        self.reactive = False
+        # Timeline in registrazione durante "Profile Run All"
+        self.profile_timeline = None
         
-        # Inizializza il namespace condiviso con le variabili QGIS
-        self.shared_namespace = self.initialize_shared_namespace()
+        # Kernel (namespace ed esecutore), condiviso con le altre viste se fornito
+        self.session = session if session is not None else QNotebookSession(iface, self)
+        self.session.attach_console(self.get_console_shell())
+        self.executor = self.session.executor
+        self.session.busy_changed.connect(self.set_kernel_busy)
+        self.session.busy_changed.connect(self.on_kernel_busy_changed)
+        self.session.options_changed.connect(self.update_kernel_actions)
+        self.session.process_kernel_state.connect(self.on_process_kernel_state)
+        self.session.restarted.connect(self.on_kernel_restarted)
         
         self.setup_ui()
         self.setup_shortcuts()
         self.load_stylesheet()
     
-    def initialize_shared_namespace(self):
-        """Inizializza il namespace condiviso con tutte le variabili QGIS necessarie."""
-        from qgis.core import (
-            Qgis, QgsProject, QgsVectorLayer, QgsRasterLayer,
-            QgsFeature, QgsGeometry, QgsPointXY, QgsField,
-            QgsVectorFileWriter, QgsCoordinateTransformContext,
-            QgsMapSettings, QgsSymbol, QgsSimpleMarkerSymbolLayer,
-            QgsGraduatedSymbolRenderer, QgsRendererRange,
-            QgsClassificationRange, QgsStyle, QgsColorRamp,
-            QgsGradientColorRamp, QgsApplication, QgsProcessingFeedback,
-            QgsCoordinateReferenceSystem, QgsRectangle, QgsExpression,
-            QgsExpressionContext, QgsExpressionContextUtils
-        )
-        from qgis.PyQt.QtCore import QVariant
-        from qgis.PyQt.QtGui import QColor
-        
-        # Prova a ottenere iface
-        try:
-            from qgis.utils import iface
-        except:
-            iface = self.iface
-        
-        namespace = {
-            '__name__': '__main__',
-            '__builtins__': __builtins__,
-            'iface': iface,
-            'Qgis': Qgis,
-            'QgsProject': QgsProject,
-            'QgsVectorLayer': QgsVectorLayer,
-            'QgsRasterLayer': QgsRasterLayer,
-            'QgsFeature': QgsFeature,
-            'QgsGeometry': QgsGeometry,
-            'QgsPointXY': QgsPointXY,
-            'QgsField': QgsField,
-            'QVariant': QVariant,
-            'QgsVectorFileWriter': QgsVectorFileWriter,
-            'QgsCoordinateTransformContext': QgsCoordinateTransformContext,
-            'QgsMapSettings': QgsMapSettings,
-            'QgsSymbol': QgsSymbol,
-            'QgsSimpleMarkerSymbolLayer': QgsSimpleMarkerSymbolLayer,
-            'QgsGraduatedSymbolRenderer': QgsGraduatedSymbolRenderer,
-            'QgsRendererRange': QgsRendererRange,
-            'QgsClassificationRange': QgsClassificationRange,
-            'QgsStyle': QgsStyle,
-            'QgsColorRamp': QgsColorRamp,
-            'QgsGradientColorRamp': QgsGradientColorRamp,
-            'QgsApplication': QgsApplication,
-            'QgsProcessingFeedback': QgsProcessingFeedback,
-            'QgsCoordinateReferenceSystem': QgsCoordinateReferenceSystem,
-            'QgsRectangle': QgsRectangle,
-            'QgsExpression': QgsExpression,
-            'QgsExpressionContext': QgsExpressionContext,
-            'QgsExpressionContextUtils': QgsExpressionContextUtils,
-            'QColor': QColor,
-            'canvas': iface.mapCanvas() if iface else None,
-            'project': QgsProject.instance(),
-        }
-        
-        # Aggiungi moduli comuni se disponibili
-        try:
-            import processing
-            namespace['processing'] = processing
-        except:
-            pass
-        
-        try:
-            import numpy as np
-            namespace['np'] = np
-        except:
-            pass
-        
-        try:
-            import pandas as pd
-            namespace['pd'] = pd
-        except:
-            pass
-        
-        try:
-            import matplotlib.pyplot as plt
-            namespace['plt'] = plt
-        except:
-            pass
-        
-        try:
-            import statistics
-            namespace['statistics'] = statistics
-        except:
-            pass
-        
-        return namespace
+    @property
+    def shared_namespace(self):
+        """Namespace of the session the notebook is attached to."""
+        return self.session.namespace
     
     def setup_ui(self):
         """Setup the user interface."""
@@ -154,11 +112,21 @@ class QNotebookWidget(QWidget):
         # Notebook area
         self.create_notebook_area(main_layout)
         
+        # Timeline dell'ultimo "Profile Run All"
+        self.timeline_panel = QNotebookTimelinePanel()
+        self.timeline_panel.cell_clicked.connect(self.show_cell_number)
+        self.timeline_panel.setVisible(False)
+        main_layout.addWidget(self.timeline_panel)
+        
         # Status bar
         self.create_status_bar(main_layout)
         
+        self.update_kernel_actions()
+        
         # Add first cell
         self.add_cell()
+        # La cella vuota iniziale non è una modifica da salvare
+        self.autosave.mark_clean()
     
     def create_toolbar(self, layout):
         """Create main toolbar."""
@@ -177,9 +145,38 @@ class QNotebookWidget(QWidget):
         self.toolbar.addAction("➕", self.add_cell).setToolTip("Add Cell (B)")
         self.toolbar.addAction("▶", self.run_current_cell).setToolTip("Run (Shift+Enter)")
         self.toolbar.addAction("⏩", self.run_all_cells).setToolTip("Run All")
+        self.toolbar.addAction("⏱", self.profile_run_all).setToolTip(
+            "Profile Run All: timeline of cells, Processing algorithms and GDAL/OGR I/O")
         self.toolbar.addAction("⏹", self.interrupt_execution).setToolTip("Stop")
+        
+        self.reactive_action = self.toolbar.addAction("🔗", self.toggle_reactive)
+        self.reactive_action.setCheckable(True)
+        self.reactive_action.setToolTip("Reactive mode: re-run only changed cells and their dependents")
+        
+        self.cache_action = self.toolbar.addAction("🗄", self.toggle_result_cache)
+        self.cache_action.setCheckable(True)
+        self.cache_action.setToolTip("Reuse cached results of cells whose code and inputs did not change")
         self.toolbar.addAction("🔄", self.restart_kernel).setToolTip("Restart")
         
+        self.threaded_action = self.toolbar.addAction("🧵", self.toggle_threaded_execution)
+        self.threaded_action.setCheckable(True)
+        self.threaded_action.setToolTip("Run cells in a background thread")
+        
+        self.process_kernel_action = self.toolbar.addAction("🖥", self.toggle_process_kernel)
+        self.process_kernel_action.setCheckable(True)
+        self.process_kernel_action.setToolTip("Run cells in a separate kernel process")
+        
+        self.trace_action = self.toolbar.addAction("📏", self.toggle_trace_allocations)
+        self.trace_action.setCheckable(True)
+        self.trace_action.setToolTip("Measure the Python memory allocations of each cell (slower)")
+        
+        self.sampling_action = self.toolbar.addAction("🔬", self.toggle_sampling)
+        self.sampling_action.setCheckable(True)
+        self.sampling_action.setToolTip(
+            "Sample the stack of running cells (low overhead); turn it off on a running cell "
+            "to see where it is. On the main thread a cell stuck in a long C call is only "
+            "reached when the call returns")
+        
         self.toolbar.addSeparator()
         
         # Cell type
@@ -193,6 +190,21 @@ class QNotebookWidget(QWidget):
         # Clear
         self.toolbar.addAction("🧹", self.clear_all_outputs).setToolTip("Clear All Outputs")
         
+        # Parametri
+        parameters_btn = QToolButton()
+        parameters_btn.setText("⚙")
+        parameters_btn.setToolTip("Notebook parameters")
+        parameters_btn.setPopupMode(QToolButton.InstantPopup)
+        parameters_menu = QMenu(parameters_btn)
+        self.parameters_cell_action = parameters_menu.addAction("Parameters Cell")
+        self.parameters_cell_action.setCheckable(True)
+        self.parameters_cell_action.setToolTip("Mark the current cell as the parameters cell")
+        self.parameters_cell_action.toggled.connect(self.toggle_parameters_cell)
+        parameters_menu.addAction("Run with Parameters…", self.run_with_parameters)
+        parameters_menu.aboutToShow.connect(self.update_parameters_menu)
+        parameters_btn.setMenu(parameters_menu)
+        self.toolbar.addWidget(parameters_btn)
+        
         self.toolbar.addSeparator()
         
         # Templates
@@ -232,6 +244,13 @@ class QNotebookWidget(QWidget):
         
         self.scroll_area.setWidget(self.cells_container)
         layout.addWidget(self.scroll_area)
+        
+        # Virtualizzazione: aggiorna le celle reali quando la vista cambia
+        self.virtualize_timer = QTimer(self)
+        self.virtualize_timer.setSingleShot(True)
+        self.virtualize_timer.setInterval(30)
+        self.virtualize_timer.timeout.connect(self.update_virtualization)
+        self.scroll_area.verticalScrollBar().valueChanged.connect(lambda value: self.virtualize_timer.start())
     
     def create_status_bar(self, layout):
         """Create status bar."""
@@ -256,8 +275,19 @@ class QNotebookWidget(QWidget):
         # Cell count
         self.cell_count_label = QLabel("Cells: 1")
         
+        # Avanzamento delle operazioni lunghe (caricamento)
+        self.progress_label = QLabel()
+        self.progress_label.setVisible(False)
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMaximumWidth(150)
+        self.progress_bar.setMaximumHeight(16)
+        self.progress_bar.setTextVisible(False)
+        self.progress_bar.setVisible(False)
+        
         status_layout.addWidget(self.kernel_status)
         status_layout.addStretch()
+        status_layout.addWidget(self.progress_label)
+        status_layout.addWidget(self.progress_bar)
         status_layout.addWidget(self.cell_count_label)
         
         status_widget.setLayout(status_layout)
@@ -303,37 +333,136 @@ class QNotebookWidget(QWidget):
     
     def add_cell(self, cell_type='code', position=None):
         """Add a new cell to the notebook."""
+        self.autosave.flush_journal()
+        model = CellModel(cell_type)
+        cell = self.create_cell(model)
+        
+        # Add to layout
+        if position is None:
+            self.notebook.cells.append(model)
+            self.cells.append(cell)
+            self.cells_layout.addWidget(cell)
+        else:
+            self.notebook.cells.insert(position, model)
+            self.cells.insert(position, cell)
+            self.cells_layout.insertWidget(position, cell)
+        
+        index = len(self.cells) - 1 if position is None else position
+        self.notebook.touch()
+        self.autosave.cell_inserted(index, model)
+        
+        # Update UI
+        self.update_cell_count()
+        cell.set_selected(True)
+        
+        return cell
+    
+    def create_cell(self, model):
+        """Create a cell widget for ``model`` connected to the notebook, without adding it."""
         # Get console shell
         shell = self.get_console_shell()
         
         # Create cell con namespace condiviso
         cell = QNotebookCell(
             shell=shell,
-            cell_type=cell_type,
             iface=self.iface,
             parent=self,
-            shared_namespace=self.shared_namespace  # Passa il namespace condiviso già inizializzato
+            session=self.session,
+            model=model
         )
+        cell.filename_prefix = self.filename_prefix
         
         # Connect signals
         cell.executed.connect(self.on_cell_executed)
+        cell.execution_finished.connect(self.on_cell_execution_finished)
         cell.deleted.connect(self.on_cell_deleted)
         cell.selected.connect(self.on_cell_selected)
+        cell.changed.connect(self.on_cell_changed)
         
-        # Add to layout
-        if position is None:
-            self.cells.append(cell)
-            self.cells_layout.addWidget(cell)
-        else:
-            self.cells.insert(position, cell)
-            self.cells_layout.insertWidget(position, cell)
-        
-        # Update UI
-        self.update_cell_count()
-        cell.set_selected(True)
+        return cell
+    
+    def create_placeholder(self, model):
+        """Create a lightweight placeholder for a cell model."""
+        placeholder = QNotebookCellPlaceholder(model)
+        placeholder.activated.connect(self.on_placeholder_activated)
+        return placeholder
+    
+    def is_virtualized(self):
+        return len(self.cells) >= self.VIRTUALIZE_THRESHOLD
+    
+    def ensure_cell(self, index):
+        """Return the real cell at ``index``, materializing a placeholder."""
+        cell = self.cells[index]
+        if isinstance(cell, QNotebookCellPlaceholder):
+            cell = self.materialize(index)
+        return cell
+    
+    def materialize(self, index):
+        """Replace the placeholder at ``index`` with a real cell."""
+        placeholder = self.cells[index]
+        cell = self.create_cell(placeholder.model)
+        cell.cell_number = placeholder.cell_number
         
+        self.cells[index] = cell
+        self.cells_layout.replaceWidget(placeholder, cell)
+        placeholder.deleteLater()
         return cell
     
+    def dematerialize(self, index):
+        """Replace the idle cell at ``index`` with a placeholder."""
+        cell = self.cells[index]
+        placeholder = self.create_placeholder(cell.sync_model())
+        placeholder.cell_number = cell.cell_number
+        
+        self.cells[index] = placeholder
+        self.cells_layout.replaceWidget(cell, placeholder)
+        cell.deleteLater()
+        return placeholder
+    
+    def update_virtualization(self):
+        """Give real editors to cells near the viewport, placeholders to the rest."""
+        if not any(isinstance(cell, QNotebookCellPlaceholder) for cell in self.cells) \
+                and not self.is_virtualized():
+            return
+        
+        scroll_bar = self.scroll_area.verticalScrollBar()
+        top = scroll_bar.value() - self.VIEWPORT_MARGIN
+        bottom = scroll_bar.value() + self.scroll_area.viewport().height() + self.VIEWPORT_MARGIN
+        
+        # Posizioni calcolate dalle altezze: il layout può non essere ancora aggiornato
+        y = self.cells_layout.contentsMargins().top()
+        spacing = self.cells_layout.spacing()
+        for index, cell in enumerate(self.cells):
+            height = self.estimated_height(cell)
+            near = y + height >= top and y <= bottom
+            if near and isinstance(cell, QNotebookCellPlaceholder):
+                cell = self.materialize(index)
+                height = self.estimated_height(cell)
+            elif not near and self.is_virtualized() and self.can_dematerialize(cell):
+                self.dematerialize(index)
+            y += height + spacing
+    
+    def estimated_height(self, cell):
+        if cell.minimumHeight() == cell.maximumHeight():
+            return cell.minimumHeight()
+        return max(cell.height(), cell.sizeHint().height())
+    
+    def can_dematerialize(self, cell):
+        if isinstance(cell, QNotebookCellPlaceholder):
+            return False
+        return (cell is not self.current_cell and not cell.is_running()
+                and not cell.editor.hasFocus() and cell.cell_id not in self.pending_run)
+    
+    def on_placeholder_activated(self, placeholder):
+        """Materialize and select a placeholder the user clicked."""
+        if placeholder in self.cells:
+            cell = self.materialize(self.cells.index(placeholder))
+            cell.set_selected(True)
+    
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        self.virtualize_timer.start()
+    
     def get_console_shell(self):
         """Get the Python console shell."""
         if self.console:
@@ -345,12 +474,10 @@ class QNotebookWidget(QWidget):
     
     def on_cell_executed(self, cell):
         """Handle cell execution."""
-        self.execution_count += 1
-        
         # Auto advance to next cell
         idx = self.cells.index(cell)
         if idx < len(self.cells) - 1:
-            self.cells[idx + 1].set_selected(True)
+            self.ensure_cell(idx + 1).set_selected(True)
         else:
             # Add new cell at end
             self.add_cell()
@@ -358,9 +485,19 @@ class QNotebookWidget(QWidget):
     def on_cell_deleted(self, cell):
         """Handle cell deletion."""
         if cell in self.cells:
-            self.cells.remove(cell)
+            self.autosave.flush_journal()
+            index = self.cells.index(cell)
+            del self.cells[index]
+            del self.notebook.cells[index]
             cell.deleteLater()
             self.update_cell_count()
+            self.notebook.touch()
+            self.autosave.cell_deleted(index)
+    
+    def on_cell_changed(self, cell):
+        """Mark the notebook as modified."""
+        self.notebook.touch()
+        self.autosave.cell_edited(cell.model)
     
     def on_cell_selected(self, cell):
         """Handle cell selection."""
@@ -371,25 +508,210 @@ class QNotebookWidget(QWidget):
             self.cell_type_combo.setCurrentText(cell.cell_type.capitalize())
     
     def update_cell_count(self):
-        """Update cell count label."""
+        """Update cell count label and cell numbers."""
         self.cell_count_label.setText(f"Cells: {len(self.cells)}")
+        for number, cell in enumerate(self.cells, 1):
+            cell.cell_number = number
     
     def run_current_cell(self, advance=True):
         """Run the currently selected cell."""
         if self.current_cell:
-            self.set_kernel_busy(True)
-            self.current_cell.run_cell(advance)
-            QTimer.singleShot(500, lambda: self.set_kernel_busy(False))
+            if self.reactive and self.current_cell.cell_type == 'code':
+                self.run_dependents([self.current_cell], advance)
+            else:
+                self.current_cell.run_cell(advance)
     
     def run_all_cells(self):
         """Run all cells in order."""
-        self.set_kernel_busy(True)
+        if self.reactive:
+            # Solo le celle modificate (o mai eseguite) e quelle che ne dipendono
+            self.run_dependents([cell for cell in self.cells if cell.cell_type == 'code' and cell.stale],
+                                advance=False)
+            return
         
-        for cell in self.cells:
+        self.run_cells(self.cells)
+    
+    def profile_run_all(self):
+        """Run every cell recording a timeline, then show it."""
+        if self.executor.is_busy():
+            self.show_message("Wait for the running cells to finish", Qgis.Warning)
+            return
+        self.profile_timeline = Timeline()
+        self.executor.timeline = self.profile_timeline
+        # Tutte le celle, anche in modalità reattiva
+        self.run_cells(self.cells)
+        if not self.executor.is_busy():
+            self.finish_profile_run()
+    
+    def on_kernel_busy_changed(self, busy):
+        if not busy and self.profile_timeline is not None and not self.pending_run:
+            self.finish_profile_run()
+    
+    def finish_profile_run(self):
+        """Stop recording and show the timeline panel."""
+        timeline = self.profile_timeline
+        self.profile_timeline = None
+        self.executor.timeline = None
+        if not timeline.spans:
+            return
+        self.timeline_panel.set_timeline(timeline)
+        self.timeline_panel.setVisible(True)
+    
+    def show_cell_number(self, number):
+        """Select and scroll to cell ``number`` (1-based)."""
+        if 0 < number <= len(self.cells):
+            cell = self.ensure_cell(number - 1)
+            cell.set_selected(True)
+            self.scroll_area.ensureWidgetVisible(cell)
+    
+    def run_cells(self, cells):
+        """Run ``cells`` one after the other.
+        
+        Each cell is materialized only when its turn comes, so running a large
+        virtualized notebook does not build every editor at once.
+        """
+        self.pending_run = [cell.cell_id for cell in cells]
+        if self.waiting_cell_id is None:
+            self.run_next_pending()
+    
+    def run_next_pending(self):
+        """Start the next pending cell; code cells continue on completion."""
+        while self.pending_run:
+            cell_id = self.pending_run.pop(0)
+            index = self.index_of_cell_id(cell_id)
+            if index is None:
+                continue
+            cell = self.ensure_cell(index)
             cell.run_cell(advance=False)
-            QApplication.processEvents()
+            if cell.is_running():
+                self.waiting_cell_id = cell_id
+                return
+        self.waiting_cell_id = None
+    
+    def index_of_cell_id(self, cell_id):
+        for index, cell in enumerate(self.cells):
+            if cell.cell_id == cell_id:
+                return index
+        return None
+    
+    def on_cell_execution_finished(self, cell, ok):
+        """Continue pending runs and refresh virtualization."""
+        if cell.cell_id == self.waiting_cell_id:
+            self.waiting_cell_id = None
+            self.run_next_pending()
+        if not self.virtualize_timer.isActive():
+            self.virtualize_timer.start()
+    
+    def keep_profiles(self, filename):
+        """Keep the profile files of the cells (.pstats, .collapsed) next to the notebook ``filename``."""
+        for cell in self.cells:
+            placeholder = isinstance(cell, QNotebookCellPlaceholder)
+            if placeholder:
+                # Output non ancora decodificati: solo se contengono un profilo
+                outputs = cell.model.outputs if cell.model.outputs_mention(PROFILE_KEY) else []
+            else:
+                outputs = cell.outputs
+            for output_data in outputs:
+                if output_data.get('metadata', {}).get(PROFILE_KEY):
+                    for path in keep_profile(output_data, filename):
+                        if path.endswith('.pstats') and not placeholder:
+                            cell.profile_table.setToolTip(f"Raw profile: {path}")
+    
+    def dependency_graph(self):
+        """Build the dependency graph of the code cells."""
+        sources = [cell.source() if cell.cell_type == 'code' else None for cell in self.cells]
+        return DependencyGraph(sources)
+    
+    def run_dependents(self, cells, advance=True):
+        """Run ``cells`` and every cell downstream of them, in notebook order."""
+        roots = [self.cells.index(cell) for cell in cells if cell in self.cells]
+        if not roots:
+            return
+        
+        indexes = self.dependency_graph().downstream(roots)
+        if advance and self.current_cell in self.cells:
+            # Seleziona subito la cella successiva, come Shift+Enter
+            current = self.cells.index(self.current_cell)
+            if current < len(self.cells) - 1:
+                self.ensure_cell(current + 1).set_selected(True)
+            else:
+                self.add_cell()
+        self.run_cells([self.cells[index] for index in indexes])
+    
+    def toggle_result_cache(self, checked):
+        """Enable or disable the persistent cell result cache."""
+        if checked:
+            try:
+                self.session.set_result_cache(True)
+            except OSError as e:
+                self.cache_action.setChecked(False)
+                self.show_message(f"Result cache unavailable: {str(e)}", Qgis.Critical)
+                return
+            self.show_message("Unchanged cells will be restored from the result cache", Qgis.Info)
+        else:
+            self.session.set_result_cache(False)
+            self.show_message("Result cache off", Qgis.Info)
+    
+    def toggle_reactive(self, checked):
+        """Enable or disable reactive re-execution."""
+        self.reactive = checked
+        if checked:
+            self.show_message("Reactive mode: only changed cells and their dependents run", Qgis.Info)
+        else:
+            self.show_message("Reactive mode off", Qgis.Info)
+    
+    def toggle_threaded_execution(self, checked):
+        """Switch between background-thread and GUI-thread execution."""
+        self.session.set_threaded(checked)
+        mode = "background thread" if checked else "main thread"
+        self.show_message(f"Cells will run in the {mode}", Qgis.Info)
+    
+    def toggle_trace_allocations(self, checked):
+        """Enable or disable tracemalloc measurements of the cell runs."""
+        self.session.set_trace_allocations(checked)
+        if checked:
+            self.show_message("Python allocations of each cell will be measured", Qgis.Info)
+    
+    def toggle_sampling(self, checked):
+        """Enable or disable the sampling profiler, also on the running cell."""
+        self.session.set_sampling(checked)
+        if checked and self.executor.is_busy():
+            self.show_message("Sampling the running cell; turn 🔬 off to see its report", Qgis.Info)
+        elif checked:
+            self.show_message("Cell runs will be sampled", Qgis.Info)
+        elif self.executor.is_busy():
+            self.show_message("Sampling report added to the running cell", Qgis.Info)
+    
+    def toggle_process_kernel(self, checked):
+        """Switch between the in-process namespace and a kernel process."""
+        if self.executor.is_busy():
+            self.process_kernel_action.setChecked(not checked)
+            self.show_message("Wait for the running cells to finish", Qgis.Warning)
+            return
         
-        self.set_kernel_busy(False)
+        self.session.set_process_kernel(checked)
+        if checked:
+            self.show_message("Cells will run in a separate kernel process", Qgis.Info)
+        else:
+            self.show_message("Cells will run inside QGIS", Qgis.Info)
+    
+    def update_kernel_actions(self):
+        """Show the session options in the toolbar (they may change from another view)."""
+        self.threaded_action.setChecked(self.session.threaded)
+        self.threaded_action.setEnabled(self.session.process_kernel is None)
+        self.cache_action.setChecked(self.session.result_cache is not None)
+        self.process_kernel_action.setChecked(self.session.process_kernel is not None)
+        self.trace_action.setChecked(self.session.trace_allocations)
+        self.sampling_action.setChecked(self.session.sampling)
+    
+    def on_process_kernel_state(self, state):
+        """Reflect the kernel process state in the status bar."""
+        if state == 'starting':
+            self.kernel_status.setText("⏳ Starting")
+        elif state == 'ready' and not self.executor.is_busy():
+            self.set_kernel_busy(False)
+        elif state == 'dead':
+            self.show_message("Kernel process died; it will restart on the next run", Qgis.Critical)
     
     def set_kernel_busy(self, busy):
         """Update kernel status indicator."""
@@ -430,24 +752,32 @@ class QNotebookWidget(QWidget):
         if reply == QMessageBox.Yes:
             for cell in self.cells:
                 cell.clear_output()
+            self.notebook.touch()
     
     def save_notebook(self):
         """Save notebook to file."""
         filename, _ = QFileDialog.getSaveFileName(
             self, "Save Notebook",
-            os.path.expanduser("~/qgis_notebook.ipynb"),
+            self.autosave.filename or os.path.expanduser("~/qgis_notebook.ipynb"),
             "Jupyter Notebook (*.ipynb);;JSON (*.json)"
         )
         
         if filename:
-            try:
-                notebook_data = self.to_notebook_format()
-                with open(filename, 'w', encoding='utf-8') as f:
-                    json.dump(notebook_data, f, indent=2)
-                
-                self.show_message(f"Notebook saved: {os.path.basename(filename)}", Qgis.Success)
-            except Exception as e:
-                self.show_message(f"Error saving: {str(e)}", Qgis.Critical)
+            # Scrittura in background; l'esito arriva da on_notebook_saved
+            self.autosave.wait()
+            self.manual_save = True
+            if not self.autosave.save(filename):
+                self.manual_save = False
+                self.show_message("Error saving: another save is still running", Qgis.Critical)
+    
+    def on_notebook_saved(self, filename):
+        if self.manual_save:
+            self.manual_save = False
+            self.show_message(f"Notebook saved: {os.path.basename(filename)}", Qgis.Success)
+    
+    def on_notebook_save_failed(self, error):
+        self.manual_save = False
+        self.show_message(f"Error saving: {error}", Qgis.Critical)
     
     def load_notebook(self):
         """Load notebook from file."""
@@ -458,14 +788,57 @@ class QNotebookWidget(QWidget):
         )
         
         if filename:
-            try:
-                with open(filename, 'r', encoding='utf-8') as f:
-                    notebook_data = json.load(f)
-                
-                self.from_notebook_format(notebook_data)
-                self.show_message(f"Loaded: {os.path.basename(filename)}", Qgis.Success)
-            except Exception as e:
-                self.show_message(f"Error loading: {str(e)}", Qgis.Critical)
+            self.open_notebook(filename)
+    
+    def open_notebook(self, filename):
+        """Read ``filename`` on a worker thread, then show it."""
+        if self.loader is not None:
+            self.show_message("A notebook is already being loaded", Qgis.Warning)
+            return
+        
+        self.loader = NotebookLoader(filename, self)
+        self.loader.progress.connect(self.update_progress)
+        self.loader.loaded.connect(self.on_notebook_loaded)
+        self.loader.failed.connect(self.on_notebook_load_failed)
+        self.loader.finished.connect(self.on_loader_finished)
+        self.start_progress(f"Reading {os.path.basename(filename)}", 100)
+        self.loader.start()
+    
+    def on_notebook_loaded(self, notebook):
+        self.finish_progress()
+        filename = self.loader.filename
+        
+        # Modifiche non salvate rimaste nel diario dopo una chiusura anomala
+        entries = self.autosave.pending_recovery(filename)
+        recovered = 0
+        if entries:
+            reply = QMessageBox.question(
+                self, 'Recover Edits',
+                f'{len(entries)} unsaved edits of this notebook were found. Recover them?',
+                QMessageBox.Yes | QMessageBox.No,
+                QMessageBox.Yes
+            )
+            if reply == QMessageBox.Yes:
+                recovered = apply_journal(notebook, entries)
+            else:
+                self.autosave.discard_recovery(filename)
+        
+        try:
+            self.show_notebook(notebook)
+            self.autosave.reset(filename)
+            if recovered:
+                self.notebook.touch()
+            self.show_message(f"Loaded: {os.path.basename(filename)}", Qgis.Success)
+        except Exception as e:
+            self.show_message(f"Error loading: {str(e)}", Qgis.Critical)
+    
+    def on_notebook_load_failed(self, error):
+        self.finish_progress()
+        self.show_message(f"Error loading: {error}", Qgis.Critical)
+    
+    def on_loader_finished(self):
+        self.loader.deleteLater()
+        self.loader = None
     
     def export_notebook(self):
         """Export notebook."""
@@ -485,44 +858,38 @@ class QNotebookWidget(QWidget):
             except Exception as e:
                 self.show_message(f"Error exporting: {str(e)}", Qgis.Critical)
     
+    def sync_notebook(self, filename=None):
+        """Return the notebook model, updated with the text of the open editors.
+        
+        With ``filename``, the spilled full outputs and the profile files are
+        first moved next to it, so the saved notebook does not refer to the
+        temporary folder.
+        """
+        if filename:
+            self.keep_full_outputs(filename)
+            self.keep_profiles(filename)
+        for cell in self.cells:
+            cell.sync_model()
+        return self.notebook
+    
+    def keep_full_outputs(self, filename):
+        """Keep the full outputs of truncated cells next to the notebook ``filename``."""
+        for cell in self.cells:
+            if isinstance(cell, QNotebookCellPlaceholder):
+                keep_reference(cell.model.metadata.get('qnotebook', {}).get('full_output'), filename)
+            else:
+                cell.keep_full_output(filename)
+    
     def to_notebook_format(self):
         """Convert to Jupyter notebook format."""
-        cells = []
-        for cell in self.cells:
-            cell_dict = cell.to_dict()
-            if 'metadata' not in cell_dict:
-                cell_dict['metadata'] = {}
-            if 'outputs' not in cell_dict:
-                cell_dict['outputs'] = []
-            cells.append(cell_dict)
-        
-        return {
-            "cells": cells,
-            "metadata": {
-                "kernelspec": {
-                    "display_name": "QGIS Python",
-                    "language": "python",
-                    "name": "qgis_python"
-                },
-                "language_info": {
-                    "codemirror_mode": {
-                        "name": "ipython",
-                        "version": 3
-                    },
-                    "file_extension": ".py",
-                    "mimetype": "text/x-python",
-                    "name": "python",
-                    "nbconvert_exporter": "python",
-                    "pygments_lexer": "ipython3",
-                    "version": sys.version.split()[0]
-                }
-            },
-            "nbformat": 4,
-            "nbformat_minor": 2
-        }
+        return self.sync_notebook().to_dict()
     
     def from_notebook_format(self, notebook_data):
         """Load from Jupyter notebook format."""
+        self.show_notebook(NotebookModel.from_dict(notebook_data))
+    
+    def show_notebook(self, notebook):
+        """Replace the cells with views of ``notebook``."""
         # Clear existing cells
         for cell in self.cells:
             cell.deleteLater()
@@ -534,10 +901,55 @@ class QNotebookWidget(QWidget):
             if item.widget():
                 item.widget().deleteLater()
         
-        # Load cells
-        for cell_data in notebook_data.get('cells', []):
-            cell = self.add_cell(cell_type=cell_data.get('cell_type', 'code'))
-            cell.from_dict(cell_data)
+        self.current_cell = None
+        self.notebook = notebook
+        
+        # Notebook grande: segnaposto leggeri, editor solo vicino alla vista
+        virtualized = len(notebook.cells) >= self.VIRTUALIZE_THRESHOLD
+        show_progress = len(notebook.cells) >= self.LOAD_PROGRESS_THRESHOLD
+        if show_progress:
+            self.start_progress("Loading cells", len(notebook.cells))
+        
+        # Inserimento in blocco: nessun ridisegno o ricalcolo del layout per cella
+        self.cells_container.setUpdatesEnabled(False)
+        self.cells_layout.setEnabled(False)
+        try:
+            for index, model in enumerate(notebook.cells):
+                view = self.create_placeholder(model) if virtualized else self.create_cell(model)
+                self.cells.append(view)
+                self.cells_layout.addWidget(view)
+                if show_progress and index % 50 == 0:
+                    self.update_progress(index)
+        finally:
+            self.cells_layout.setEnabled(True)
+            self.cells_layout.activate()
+            self.cells_container.setUpdatesEnabled(True)
+            if show_progress:
+                self.finish_progress()
+        
+        self.update_cell_count()
+        if self.cells:
+            self.ensure_cell(0).set_selected(True)
+        if virtualized:
+            self.virtualize_timer.start()
+        self.autosave.reset(None)
+    
+    def start_progress(self, text, maximum):
+        """Show a progress bar in the status bar."""
+        self.progress_label.setText(text)
+        self.progress_bar.setRange(0, maximum)
+        self.progress_bar.setValue(0)
+        self.progress_label.setVisible(True)
+        self.progress_bar.setVisible(True)
+    
+    def update_progress(self, value):
+        self.progress_bar.setValue(value)
+        # Ridisegno immediato: il caricamento blocca il ciclo degli eventi
+        self.progress_bar.repaint()
+    
+    def finish_progress(self):
+        self.progress_label.setVisible(False)
+        self.progress_bar.setVisible(False)
     
     def show_message(self, message, level=Qgis.Info):
         """Show message in QGIS message bar."""
@@ -549,10 +961,16 @@ class QNotebookWidget(QWidget):
             self.current_cell.set_code(code)
     
     def interrupt_execution(self):
-        """Interrupt current execution (placeholder)."""
-        # Nota: L'interruzione vera richiederebbe thread separati
-        self.set_kernel_busy(False)
-        self.show_message("Execution stopped", Qgis.Warning)
+        """Interrupt the running cell and cancel the queued ones."""
+        if not self.executor.is_busy():
+            self.pending_run = []
+            self.show_message("Nothing is running", Qgis.Info)
+            return
+        
+        self.pending_run = []
+        self.waiting_cell_id = None
+        self.executor.interrupt()
+        self.show_message("Execution interrupted", Qgis.Warning)
     
     def restart_kernel(self):
         """Restart Python kernel (clear namespace)."""
@@ -564,18 +982,21 @@ class QNotebookWidget(QWidget):
         )
         
         if reply == QMessageBox.Yes:
-            # Reinizializza il namespace condiviso
-            self.shared_namespace = self.initialize_shared_namespace()
-            
-            # Reset execution count
-            self.execution_count = 0
-            for cell in self.cells:
-                cell.execution_count = 0
-                cell.number_label.setText("[]: ")
-                cell.clear_output()
-            
+            self.pending_run = []
+            self.waiting_cell_id = None
+            self.session.restart()
             self.show_message("Kernel restarted", Qgis.Info)
     
+    def on_kernel_restarted(self):
+        """Reset the cells after the session kernel restarted."""
+        self.pending_run = []
+        self.waiting_cell_id = None
+        for cell in self.cells:
+            cell.execution_count = 0
+            cell.update_number_label()
+            cell.clear_output()
+        self.notebook.touch()
+    
     def add_cell_above(self):
         """Add cell above current."""
         if self.current_cell and self.current_cell in self.cells:
@@ -592,39 +1013,58 @@ class QNotebookWidget(QWidget):
         if self.current_cell:
             self.current_cell.change_type(cell_type.lower())
     
+    def update_parameters_menu(self):
+        cell = self.current_cell
+        self.parameters_cell_action.setEnabled(cell is not None)
+        self.parameters_cell_action.blockSignals(True)
+        self.parameters_cell_action.setChecked(cell is not None and cell.model.has_tag(PARAMETERS_TAG))
+        self.parameters_cell_action.blockSignals(False)
+    
+    def toggle_parameters_cell(self, checked):
+        """Tag the current cell as the one holding the notebook parameters."""
+        if self.current_cell is None:
+            return
+        if checked:
+            # Una sola cella parametri per notebook
+            for cell in self.cells:
+                if cell is not self.current_cell and cell.model.has_tag(PARAMETERS_TAG):
+                    cell.set_tag(PARAMETERS_TAG, False)
+        self.current_cell.set_tag(PARAMETERS_TAG, checked)
+    
+    def run_with_parameters(self):
+        """Ask for parameter values, inject them and run all cells."""
+        notebook = self.sync_notebook()
+        index = notebook.injected_parameters_index()
+        if index is None:
+            index = notebook.parameters_index()
+        text = notebook.cells[index].source if index is not None else ""
+        text, ok = QInputDialog.getMultiLineText(
+            self, "Run with Parameters",
+            "One assignment per line, e.g. layer_path = '/data/roads.gpkg':", text)
+        if not ok:
+            return
+        try:
+            parameters = parse_parameters(text)
+        except ValueError as e:
+            self.show_message(str(e), Qgis.Warning)
+            return
+        self.inject_parameters(parameters)
+        self.run_all_cells()
+    
+    def inject_parameters(self, parameters):
+        """Add (or replace) the cell assigning ``parameters`` after the parameters cell."""
+        index = self.notebook.injected_parameters_index()
+        if index is not None:
+            self.on_cell_deleted(self.cells[index])
+        index = self.notebook.parameters_index()
+        cell = self.add_cell(position=0 if index is None else index + 1)
+        cell.set_tag(INJECTED_PARAMETERS_TAG)
+        cell.set_code(parameters_source(parameters))
+        return cell
+    
     def export_as_html(self, filename):
         """Export notebook as HTML."""
-        html = """<!DOCTYPE html>
-<html>
-<head>
-    <title>QGIS Notebook Export</title>
-    <style>
-        body { font-family: Arial, sans-serif; margin: 20px; }
-        .cell { margin: 20px 0; border: 1px solid #ddd; padding: 10px; }
-        .code { background: #f5f5f5; padding: 10px; font-family: monospace; }
-        .output { background: white; padding: 10px; border-top: 1px solid #ddd; }
-        pre { white-space: pre-wrap; }
-    </style>
-</head>
-<body>
-    <h1>QGIS Notebook Export</h1>
-"""
-        
-        for i, cell in enumerate(self.cells):
-            html += f'<div class="cell">'
-            html += f'<div class="code">In [{cell.execution_count}]:<br>'
-            html += f'<pre>{cell.editor.text()}</pre></div>'
-            
-            output_text = cell.output.toPlainText()
-            if output_text:
-                html += f'<div class="output"><pre>{output_text}</pre></div>'
-            
-            html += '</div>'
-        
-        html += "</body></html>"
-        
-        with open(filename, 'w', encoding='utf-8') as f:
-            f.write(html)
+        export_html(self.sync_notebook(), filename)
     
     def export_as_python(self, filename):
         """Export as Python script."""
@@ -632,10 +1072,10 @@ class QNotebookWidget(QWidget):
         code += "# -*- coding: utf-8 -*-\n"
         code += "# QGIS Notebook Export\n\n"
         
-        for i, cell in enumerate(self.cells):
+        for i, cell in enumerate(self.sync_notebook().cells):
             if cell.cell_type == 'code':
                 code += f"# Cell {i+1}\n"
-                code += cell.editor.text()
+                code += cell.source
                 code += "\n\n"
         
         with open(filename, 'w', encoding='utf-8') as f:
@@ -0,0 +1,255 @@
+# -*- coding: utf-8 -*-
+"""
+QNotebook Run - Execute a notebook from the command line
+
+    python -m QNotebook.run notebook.ipynb [-o executed.ipynb] [--allow-errors]
+    python -m QNotebook.run notebooks/ a.ipynb -j 8 --timeout 3600 --output-dir out/
+    python -m QNotebook.run analysis.ipynb -p layer_path data/roads.gpkg -p buffer 50
+    python -m QNotebook.run analysis.ipynb --parameter-sets towns.json --output-dir out/
+    python -m QNotebook.run analysis.ipynb --trace analysis-trace.json
+    python -m QNotebook.run analysis.ipynb --sample 5
+
+The notebook runs top to bottom in a headless QgsApplication and its outputs
+are written back to the file (or to ``--output``). The exit code is 0 when
+every cell succeeded, 1 when a cell raised and 2 when the notebook could not
+be read or written.
+
+Parameters given with ``-p`` or ``--parameters`` are assigned in a cell
+injected after the cell tagged ``parameters``. With ``--parameter-sets`` every
+notebook runs once per set.
+
+With several notebooks, folders, ``--jobs`` or ``--timeout`` the notebooks
+run in a pool of worker processes (see BatchRunner) and a summary is printed.
+"""
+
+import os
+import sys
+import ast
+import json
+import time
+import argparse
+
+
+def parse_value(text):
+    """Value of a ``-p`` option: a Python literal, or else the text itself."""
+    try:
+        return ast.literal_eval(text)
+    except (ValueError, SyntaxError):
+        return text
+
+
+def read_parameters(arguments):
+    """Parameters from ``--parameters`` and ``-p``; the latter win."""
+    parameters = {}
+    if arguments.parameters:
+        with open(arguments.parameters, encoding='utf-8') as f:
+            parameters.update(json.load(f))
+    for name, value in arguments.parameter or []:
+        parameters[name] = parse_value(value)
+    return parameters
+
+
+def parse_arguments(argv=None):
+    parser = argparse.ArgumentParser(
+        prog='python -m QNotebook.run',
+        description="Run a QNotebook/Jupyter notebook in a headless QGIS.")
+    parser.add_argument('notebooks', nargs='+', metavar='notebook',
+                        help="notebook (.ipynb) to run, or folder of notebooks")
+    parser.add_argument('-o', '--output',
+                        help="write the executed notebook here instead of in place")
+    parser.add_argument('--output-dir',
+                        help="write the executed notebooks to this folder (batch)")
+    parser.add_argument('-j', '--jobs', type=int,
+                        help="notebooks run in parallel (default: number of CPUs)")
+    parser.add_argument('--timeout', type=float,
+                        help="stop a notebook running longer than this (seconds)")
+    parser.add_argument('-p', '--parameter', nargs=2, action='append', metavar=('NAME', 'VALUE'),
+                        help="set a parameter (VALUE is a Python literal or plain text)")
+    parser.add_argument('--parameters', metavar='FILE',
+                        help="JSON file with an object of parameters")
+    parser.add_argument('--parameter-sets', metavar='FILE',
+                        help="JSON file with a list (or an object by name) of parameter "
+                             "objects: each notebook runs once per set")
+    parser.add_argument('--allow-errors', action='store_true',
+                        help="keep running the cells after a failing one")
+    parser.add_argument('--trace-allocations', action='store_true',
+                        help="measure the Python allocations of each cell (slower)")
+    parser.add_argument('--trace', metavar='FILE',
+                        help="write a Chrome trace of the cells, Processing algorithms and "
+                             "GDAL/OGR I/O to this JSON file (slower)")
+    parser.add_argument('--sample', type=float, metavar='MS',
+                        help="sample the stack of each cell every MS milliseconds and add a "
+                             "report to its outputs (low overhead)")
+    parser.add_argument('--no-save', action='store_true',
+                        help="do not write the outputs")
+    parser.add_argument('--report', help="write the timings (or the batch summary) to this JSON file")
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help="only print the summary")
+    return parser.parse_args(argv)
+
+
+def print_result(result, total):
+    from .qnotebook_metrics import format_size
+
+    status = 'ok' if result['ok'] else result['error']
+    metrics = result['metrics'] or {}
+    memory = format_size(metrics['peak_rss_delta']) if 'peak_rss_delta' in metrics else ''
+    if 'alloc_peak' in metrics:
+        memory += f" (python {format_size(metrics['alloc_peak'])})"
+    print(f"[{result['execution_count']:>3}/{total}] cell {result['index'] + 1:<4} "
+          f"{result['seconds']:8.2f} s  cpu {metrics.get('cpu', 0):7.2f} s  {memory:>10}  {status}",
+          file=sys.stderr, flush=True)
+
+
+def keep_profiles(notebook, filename):
+    """Move the .pstats and .collapsed files of profiled cells next to ``filename``."""
+    from .qnotebook_profiler import PROFILE_KEY, keep_profile
+
+    for cell in notebook.cells:
+        for output_data in cell.outputs if cell.outputs_mention(PROFILE_KEY) else []:
+            if output_data.get('metadata', {}).get(PROFILE_KEY):
+                keep_profile(output_data, filename)
+
+
+def run_notebook(filename, output=None, allow_errors=False, save=True, report=None, quiet=False,
+                 parameters=None, trace_allocations=False, trace=None, sample=None):
+    """Run ``filename`` in the current QGIS application; return the exit code."""
+    from .qnotebook_model import NotebookModel
+    from .qnotebook_runner import NotebookRunner
+    from .qnotebook_timeline import Timeline
+    from .qnotebook_attachments import AttachmentStore, attach_store, attachment_directory
+
+    try:
+        notebook = attach_store(NotebookModel.load(filename), filename)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read {filename}: {e}", file=sys.stderr)
+        return 2
+    if parameters:
+        try:
+            notebook.inject_parameters(parameters)
+        except ValueError as e:
+            print(str(e), file=sys.stderr)
+            return 2
+
+    total = len([cell for cell in notebook.code_cells() if cell.source.strip()])
+    runner = NotebookRunner(notebook, allow_errors=allow_errors,
+                            report=None if quiet else lambda result: print_result(result, total),
+                            trace_allocations=trace_allocations,
+                            timeline=Timeline() if trace else None,
+                            sample_interval=sample / 1000.0 if sample else None)
+    # Percorsi relativi come se il notebook fosse aperto dalla sua cartella
+    cwd = os.getcwd()
+    os.chdir(os.path.dirname(os.path.abspath(filename)))
+    start = time.perf_counter()
+    try:
+        ok = runner.run()
+    finally:
+        os.chdir(cwd)
+    seconds = time.perf_counter() - start
+    keep_profiles(notebook, output or filename)
+
+    failed = [result for result in runner.results if not result['ok']]
+    print(f"{os.path.basename(filename)}: {len(runner.results)}/{total} cells in {seconds:.2f} s, "
+          f"{len(failed)} failed", file=sys.stderr)
+
+    try:
+        if save:
+            target = output or filename
+            # I riferimenti agli output salvati a parte tornano inline
+            attachments = None
+            if notebook.attachments is not None:
+                attachments = AttachmentStore(attachment_directory(target), None, notebook.attachments)
+            notebook.save(target, attachments)
+        if report:
+            with open(report, 'w', encoding='utf-8') as f:
+                json.dump({'notebook': filename, 'ok': ok, 'seconds': seconds,
+                           'cells': runner.results}, f, indent=1)
+        if trace:
+            runner.timeline.save(trace)
+    except (OSError, ValueError) as e:
+        print(f"Cannot write the results: {e}", file=sys.stderr)
+        return 2
+    return 0 if ok else 1
+
+
+def run_batch(arguments, parameters):
+    """Run the notebooks in worker processes; return the exit code."""
+    from .qnotebook_batch import BatchRunner, find_notebooks, format_summary
+
+    notebooks = find_notebooks(arguments.notebooks)
+    if not notebooks:
+        print("No notebooks found", file=sys.stderr)
+        return 2
+
+    def print_summary(summary):
+        if not arguments.quiet:
+            name = summary['notebook']
+            if summary['parameters'] is not None:
+                name += f" [{summary['parameters']}]"
+            print(f"{summary['status']:>8}  {name}  ({summary['seconds']:.1f} s)",
+                  file=sys.stderr, flush=True)
+
+    parameter_sets = None
+    if arguments.parameter_sets:
+        try:
+            with open(arguments.parameter_sets, encoding='utf-8') as f:
+                parameter_sets = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Cannot read the parameter sets: {e}", file=sys.stderr)
+            return 2
+        if isinstance(parameter_sets, list):
+            parameter_sets = {str(number): values for number, values in enumerate(parameter_sets, 1)}
+
+    runner = BatchRunner(arguments.jobs, arguments.timeout, arguments.output_dir,
+                         arguments.allow_errors, not arguments.no_save,
+                         arguments.trace_allocations, print_summary)
+    start = time.perf_counter()
+    summaries = runner.run(notebooks, parameters, parameter_sets)
+    seconds = time.perf_counter() - start
+
+    for summary in summaries:
+        if summary.get('log') and not arguments.quiet:
+            print(f"\n--- {summary['output']} ({summary['status']})\n{summary['log']}",
+                  file=sys.stderr)
+    print(format_summary(summaries, seconds))
+    if arguments.report:
+        with open(arguments.report, 'w', encoding='utf-8') as f:
+            json.dump({'seconds': seconds, 'notebooks': summaries}, f, indent=1)
+
+    if any(summary['status'] == 'error' for summary in summaries):
+        return 2
+    return 0 if all(summary['status'] == 'ok' for summary in summaries) else 1
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    try:
+        parameters = read_parameters(arguments)
+    except (OSError, ValueError) as e:
+        print(f"Cannot read the parameters: {e}", file=sys.stderr)
+        return 2
+
+    if (len(arguments.notebooks) > 1 or os.path.isdir(arguments.notebooks[0])
+            or arguments.jobs or arguments.timeout or arguments.output_dir
+            or arguments.parameter_sets):
+        if arguments.output:
+            print("--output needs a single notebook; use --output-dir", file=sys.stderr)
+            return 2
+        if arguments.trace or arguments.sample:
+            print("--trace and --sample need a single notebook", file=sys.stderr)
+            return 2
+        return run_batch(arguments, parameters)
+
+    from .qnotebook_kernel_worker import start_qgis
+    app = start_qgis()
+    try:
+        return run_notebook(arguments.notebooks[0], arguments.output, arguments.allow_errors,
+                            not arguments.no_save, arguments.report, arguments.quiet, parameters,
+                            arguments.trace_allocations, arguments.trace, arguments.sample)
+    finally:
+        if app is not None:
+            app.exitQgis()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
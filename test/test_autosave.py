@@ -0,0 +1,79 @@
+# coding=utf-8
+"""Background save test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from qgis.PyQt.QtCore import QObject, QCoreApplication
+
+from utilities import plugin_module
+
+autosave_module = plugin_module('qnotebook_autosave')
+model = plugin_module('qnotebook_model')
+
+APP = QCoreApplication.instance() or QCoreApplication([])
+
+
+class NotebookView(QObject):
+    """The part of QNotebookWidget used by QNotebookAutosave."""
+
+    def __init__(self):
+        super().__init__()
+        self.notebook = model.NotebookModel()
+
+    def sync_notebook(self, filename=None):
+        return self.notebook
+
+
+class AutosaveTest(unittest.TestCase):
+    """Test saving while an autosave is running."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory, True)
+        self.view = NotebookView()
+        self.autosave = autosave_module.QNotebookAutosave(self.view)
+        self.autosave.timer.stop()
+        self.autosave.recovery_filename = os.path.join(self.directory, 'untitled-1.ipynb')
+        self.saved = []
+        self.autosave.saved.connect(self.saved.append)
+
+    def edit(self, source):
+        self.view.notebook.cells.append(model.CellModel('code', source))
+        self.view.notebook.touch()
+
+    def test_manual_save_during_autosave(self):
+        self.edit('x = 1')
+        self.assertTrue(self.autosave.save())
+        # Salvataggio manuale mentre l'autosave è in corso
+        named = os.path.join(self.directory, 'roads.ipynb')
+        self.autosave.wait()
+        self.assertTrue(self.autosave.save(named))
+        self.autosave.wait()
+
+        self.assertEqual(self.saved, [self.autosave.recovery_filename, named])
+        self.assertFalse(self.autosave.is_dirty())
+        self.assertEqual(model.NotebookModel.load(named).cells[0].source, 'x = 1')
+        # Salvato con un nome: il file di recupero non serve più
+        self.assertFalse(os.path.exists(self.autosave.recovery_filename))
+
+    def test_recovery_removed_on_quit(self):
+        self.edit('x = 1')
+        self.autosave.save()
+        self.autosave.wait()
+        self.assertTrue(os.path.exists(self.autosave.recovery_filename))
+        APP.aboutToQuit.emit()
+        self.assertEqual(os.listdir(self.directory), [])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,152 @@
+# coding=utf-8
+"""Batch runner test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import sys
+import json
+import time
+import shutil
+import tempfile
+import unittest
+
+from utilities import plugin_module
+
+batch = plugin_module('qnotebook_batch')
+run = plugin_module('run')
+
+# Finto "python -m QNotebook.run": il "notebook" dice quanto dura e come finisce
+FAKE_RUN = """
+import sys, json, time
+
+args = sys.argv[1:]
+option = lambda name: args[args.index(name) + 1] if name in args else None
+with open(args[0], encoding='utf-8') as f:
+    spec = json.load(f)
+parameters = {}
+if option('--parameters'):
+    with open(option('--parameters'), encoding='utf-8') as f:
+        parameters = json.load(f)
+
+start = time.time()
+time.sleep(spec.get('sleep', 0))
+print('running', args[0])
+with open(option('--output') or args[0] + '.out', 'w', encoding='utf-8') as f:
+    json.dump({'parameters': parameters, 'start': start, 'end': time.time()}, f)
+failed = spec.get('failed_cell')
+with open(option('--report'), 'w', encoding='utf-8') as f:
+    json.dump({'cells': [{'index': index, 'ok': index + 1 != failed}
+                         for index in range(spec.get('cells', 1))]}, f)
+sys.exit(spec.get('exit', 1 if failed else 0))
+"""
+
+
+class BatchRunnerTest(unittest.TestCase):
+    """Test BatchRunner with a worker script standing in for the notebook runner."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        script = os.path.join(self.directory, 'fake_run.py')
+        with open(script, 'w', encoding='utf-8') as f:
+            f.write(FAKE_RUN)
+
+        original = batch.BatchRunner.command
+
+        def command(runner, *args):
+            # [python, -m, <plugin>.run, argomenti...] -> [python, fake_run.py, argomenti...]
+            return [sys.executable, script] + original(runner, *args)[3:]
+
+        batch.BatchRunner.command = command
+        self.addCleanup(setattr, batch.BatchRunner, 'command', original)
+
+    def notebook(self, name, **spec):
+        path = os.path.join(self.directory, name)
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(spec, f)
+        return path
+
+    def written(self, path):
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+
+    def test_parallel(self):
+        notebooks = [self.notebook(f'nb{i}.ipynb', sleep=0.5) for i in range(4)]
+        output_dir = os.path.join(self.directory, 'out')
+        start = time.perf_counter()
+        summaries = batch.BatchRunner(jobs=4, output_dir=output_dir).run(notebooks)
+
+        self.assertLess(time.perf_counter() - start, 1.8)
+        self.assertEqual([summary['status'] for summary in summaries], ['ok'] * 4)
+        runs = [self.written(os.path.join(output_dir, f'nb{i}.ipynb')) for i in range(4)]
+        # Tutti in esecuzione nello stesso momento
+        self.assertLess(max(r['start'] for r in runs), min(r['end'] for r in runs))
+
+    def test_jobs_limit(self):
+        notebooks = [self.notebook(f'nb{i}.ipynb', sleep=0.3) for i in range(2)]
+        batch.BatchRunner(jobs=1).run(notebooks)
+        first, second = (self.written(notebook + '.out') for notebook in notebooks)
+        self.assertLessEqual(first['end'], second['start'])
+
+    def test_timeout(self):
+        notebooks = [self.notebook('slow.ipynb', sleep=30), self.notebook('fast.ipynb')]
+        start = time.perf_counter()
+        slow, fast = batch.BatchRunner(jobs=2, timeout=0.5).run(notebooks)
+
+        self.assertLess(time.perf_counter() - start, 10)
+        self.assertEqual(slow['status'], 'timeout')
+        self.assertIn('log', slow)
+        self.assertEqual(fast['status'], 'ok')
+
+    def test_parameter_set_outputs(self):
+        notebook = self.notebook('towns.ipynb')
+        output_dir = os.path.join(self.directory, 'out')
+        sets = {'north': {'town': 'Bolzano'}, 'south zone': {'town': 'Palermo'}}
+        summaries = batch.BatchRunner(output_dir=output_dir).run([notebook], {'buffer': 50}, sets)
+
+        self.assertEqual([summary['parameters'] for summary in summaries], ['north', 'south zone'])
+        self.assertEqual([os.path.basename(summary['output']) for summary in summaries],
+                         ['towns-north.ipynb', 'towns-south_zone.ipynb'])
+        self.assertEqual(self.written(summaries[1]['output'])['parameters'],
+                         {'buffer': 50, 'town': 'Palermo'})
+        # Nessun file sovrascritto: nomi uguali dopo la pulizia ricevono un numero
+        paths = batch.output_paths([(notebook, 'a b'), (notebook, 'a_b')], None)
+        self.assertEqual([os.path.basename(path) for path in paths],
+                         ['towns-a_b.ipynb', 'towns-a_b-2.ipynb'])
+
+    def test_summary_and_exit_status(self):
+        folder = os.path.join(self.directory, 'notebooks')
+        os.makedirs(folder)
+        for name, spec in [('a.ipynb', {'cells': 3}), ('b.ipynb', {'cells': 3, 'failed_cell': 2}),
+                           ('c.ipynb', {'exit': 2})]:
+            with open(os.path.join(folder, name), 'w', encoding='utf-8') as f:
+                json.dump(spec, f)
+
+        summaries = batch.BatchRunner(jobs=3).run(batch.find_notebooks([folder]))
+        self.assertEqual([summary['status'] for summary in summaries], ['ok', 'failed', 'error'])
+        self.assertEqual([summary['exit_code'] for summary in summaries], [0, 1, 2])
+        self.assertEqual(summaries[0]['cells'], 3)
+        self.assertEqual(summaries[1]['failed_cell'], 2)
+        self.assertNotIn('log', summaries[0])
+        self.assertIn('running', summaries[1]['log'])
+        text = batch.format_summary(summaries, 1.0)
+        self.assertIn('failed (cell 2)', text)
+        self.assertTrue(text.endswith('3 notebooks in 1.0 s: 1 error, 1 failed, 1 ok'))
+
+        report = os.path.join(self.directory, 'report.json')
+        self.assertEqual(run.main([folder, '-j', '2', '-q', '--report', report]), 2)
+        self.assertEqual(len(self.written(report)['notebooks']), 3)
+        os.remove(os.path.join(folder, 'c.ipynb'))
+        self.assertEqual(run.main([folder, '-q']), 1)
+        os.remove(os.path.join(folder, 'b.ipynb'))
+        self.assertEqual(run.main([folder, '-q']), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()
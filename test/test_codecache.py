@@ -0,0 +1,67 @@
+# coding=utf-8
+"""Compiled code cache test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import linecache
+import traceback
+import unittest
+
+from qnotebook_codecache import CodeCache, cell_filename, new_filename_prefix
+
+
+class CodeCacheTest(unittest.TestCase):
+    """Test the LRU cache of compiled cells."""
+
+    def test_reuses_code_objects(self):
+        """Same source and filename return the same code objects."""
+        cache = CodeCache()
+        first = cache.get('x = 1\nx + 1', '<cell 1>')
+        second = cache.get('x = 1\nx + 1', '<cell 1>')
+        self.assertIs(first, second)
+        self.assertEqual((cache.hits, cache.misses), (1, 1))
+        self.assertIsNotNone(first[1])
+
+    def test_lru_eviction(self):
+        """The least recently used entry is evicted first."""
+        cache = CodeCache(maxsize=2)
+        cache.get('a = 1', '<cell 1>')
+        cache.get('b = 2', '<cell 2>')
+        cache.get('a = 1', '<cell 1>')
+        cache.get('c = 3', '<cell 3>')
+        filenames = [filename for _, filename in cache.entries]
+        self.assertEqual(filenames, ['<cell 1>', '<cell 3>'])
+
+    def test_cell_filenames(self):
+        """Two notebook views get different names for the same cell number."""
+        first, second = new_filename_prefix(), new_filename_prefix()
+        self.assertNotEqual(cell_filename(3, first), cell_filename(3, second))
+        self.assertEqual(cell_filename(3, 'nb2'), '<nb2 cell 3>')
+        self.assertEqual(cell_filename(0, 'nb2'), '<nb2 cell>')
+        self.assertEqual(cell_filename(3), '<cell 3>')
+
+        cache = CodeCache()
+        cache.get('a = 1', cell_filename(1, first))
+        cache.get('b = 2', cell_filename(1, second))
+        self.assertEqual(linecache.getline(cell_filename(1, first), 1), 'a = 1')
+        self.assertEqual(linecache.getline(cell_filename(1, second), 1), 'b = 2')
+
+    def test_traceback_shows_cell_source(self):
+        """Tracebacks point at the cell line through linecache."""
+        body, _ = CodeCache().get('x = 1\nraise ValueError(x)', '<cell 7>')
+        try:
+            exec(body, {})
+        except ValueError:
+            text = traceback.format_exc()
+        self.assertIn('File "<cell 7>", line 2', text)
+        self.assertIn('raise ValueError(x)', text)
+        self.assertEqual(linecache.getline('<cell 7>', 1), 'x = 1\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
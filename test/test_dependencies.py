@@ -0,0 +1,62 @@
+# coding=utf-8
+"""Cell dependency graph test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+
+from qnotebook_dependencies import analyze_source, DependencyGraph
+
+
+class DependencyGraphTest(unittest.TestCase):
+    """Test static analysis of cell names."""
+
+    def test_analyze_source(self):
+        """Globals defined and read by a cell are found."""
+        defines, reads = analyze_source(
+            'import numpy as np\n'
+            'total = np.sum(values)\n'
+            'def scale(x):\n'
+            '    return x * factor\n'
+            'squares = [i * i for i in range(3)]\n'
+            'total += 1\n')
+        self.assertEqual(defines, {'np', 'total', 'scale', 'squares'})
+        self.assertEqual(reads, {'values', 'factor'})
+
+    def test_magics(self):
+        """Magic lines keep their assignment and read the names in their arguments."""
+        defines, reads = analyze_source(
+            'timing = %timeit -n 10 -r 3 -o buffer(layer)\n'
+            '!ls {folder}\n'
+            'result = timing.best * scale\n'
+            '%time total = sum(values)\n'
+            '%run other.py\n')
+        self.assertEqual(defines, {'timing', 'result', 'total'})
+        self.assertEqual(reads, {'buffer', 'layer', 'folder', 'scale', 'values'})
+
+    def test_downstream(self):
+        """Only the edited cell and its dependents are selected."""
+        graph = DependencyGraph([
+            'layer = load()',
+            'count = layer.featureCount()',
+            None,
+            'print(count)',
+            'other = 1',
+        ])
+        self.assertEqual(graph.downstream([0]), [0, 1, 3])
+        self.assertEqual(graph.downstream([4]), [4])
+
+    def test_redefinition(self):
+        """A cell depends on the last definition before it."""
+        graph = DependencyGraph(['x = 1', 'x = 2', 'print(x)'])
+        self.assertEqual(graph.parents[2], {1})
+        self.assertEqual(graph.downstream([0]), [0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,165 @@
+# coding=utf-8
+"""Cell execution and interruption test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import sys
+import time
+import threading
+import unittest
+
+from qgis.PyQt.QtCore import QCoreApplication, QTimer
+
+from utilities import plugin_module
+
+executor = plugin_module('qnotebook_executor')
+
+APP = QCoreApplication.instance() or QCoreApplication([])
+
+
+def run_in_thread(job):
+    """Run ``job`` on a worker thread; return the thread and what escaped from run()."""
+    escaped = []
+
+    def target():
+        try:
+            job.run()
+        except BaseException as e:
+            escaped.append(e)
+
+    thread = threading.Thread(target=target)
+    thread.start()
+    return thread, escaped
+
+
+class ExecutionJobTest(unittest.TestCase):
+    """Test ExecutionJob.run and interrupt on a worker thread."""
+
+    def test_interrupt_running_cell(self):
+        job = executor.ExecutionJob('while True:\n    pass', {}, '<cell 1>')
+        thread, escaped = run_in_thread(job)
+        while job.thread_ident is None:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        self.assertTrue(job.interrupt())
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(escaped, [])
+        self.assertFalse(job.ok)
+        self.assertEqual(job.exception[0], 'KeyboardInterrupt')
+        self.assertIsNone(job.thread_ident)
+
+    def test_interrupt_profiled_cell(self):
+        """After an interrupt the thread runs profiled cells normally."""
+        first = executor.ExecutionJob('while True:\n    pass', {}, '<cell 1>')
+        second = executor.ExecutionJob('x = 1', {}, '<cell 2>')
+        first.spans = []
+        second.spans = []
+
+        def target():
+            first.run()
+            second.run()
+
+        thread = threading.Thread(target=target)
+        thread.start()
+        while first.thread_ident is None:
+            time.sleep(0.01)
+        time.sleep(0.05)
+        self.assertTrue(first.interrupt())
+        thread.join(5)
+
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(first.exception[0], 'KeyboardInterrupt')
+        self.assertTrue(second.ok)
+        self.assertEqual(second.spans[-1]['name'], 'cell 2')
+
+    def test_interrupt_during_bookkeeping(self):
+        """An interrupt arriving after the cell code cannot skip the end of run()."""
+        job = executor.ExecutionJob('x = 1', {}, '<cell 2>')
+        sent = []
+
+        class LateInterruptMetrics(executor.ExecutionMetrics):
+            def stop(self):
+                # ⏹ premuto mentre il job chiude le misure
+                other = threading.Thread(target=lambda: sent.append(job.interrupt()))
+                other.start()
+                other.join()
+                time.sleep(0.01)
+                return super().stop()
+
+        original = executor.ExecutionMetrics
+        executor.ExecutionMetrics = LateInterruptMetrics
+        try:
+            thread, escaped = run_in_thread(job)
+            thread.join(5)
+        finally:
+            executor.ExecutionMetrics = original
+
+        self.assertEqual(escaped, [])
+        self.assertEqual(sent, [False])
+        self.assertTrue(job.ok)
+        self.assertEqual(job.namespace['x'], 1)
+        self.assertNotIn(thread.ident, executor._running_jobs)
+
+    def test_prun_in_profiled_run(self):
+        """A %%prun cell of a profiled run is flagged: its I/O was not traced."""
+        job = executor.ExecutionJob('%%prun\nx = sum(range(10))', {}, '<cell 3>')
+        job.spans = []
+        job.run()
+
+        self.assertTrue(job.ok)
+        self.assertTrue(job.spans[-1]['args']['io_skipped'])
+
+        job = executor.ExecutionJob('x = 1', {}, '<cell 4>')
+        job.spans = []
+        job.run()
+        self.assertNotIn('io_skipped', job.spans[-1]['args'])
+
+    def test_interrupt_on_main_thread(self):
+        """Stop is handled while a cell runs on the GUI thread."""
+        code = ('import time\n'
+                'def wait(seconds):\n'
+                '    end = time.time() + seconds\n'
+                '    while time.time() < end:\n'
+                '        pass\n'
+                'wait(10)')
+        job = executor.ExecutionJob(code, {}, '<cell 5>')
+        QTimer.singleShot(200, job.interrupt)
+        started = time.time()
+        job.run()
+
+        self.assertLess(time.time() - started, 5)
+        self.assertFalse(job.ok)
+        self.assertEqual(job.exception[0], 'KeyboardInterrupt')
+        self.assertIsNone(sys.gettrace())
+
+    def test_sample_on_main_thread(self):
+        """The sampler can be attached to and detached from a cell running on the GUI thread."""
+        code = ('import time\n'
+                'def wait(seconds):\n'
+                '    end = time.time() + seconds\n'
+                '    while time.time() < end:\n'
+                '        pass\n'
+                'wait(10)')
+        job = executor.ExecutionJob(code, {}, '<cell 6>')
+        reports = []
+        QTimer.singleShot(100, lambda: job.start_sampling(0.005))
+        QTimer.singleShot(500, lambda: reports.append(job.stop_sampling()))
+        QTimer.singleShot(700, job.interrupt)
+        job.run()
+
+        self.assertEqual(job.exception[0], 'KeyboardInterrupt')
+        self.assertEqual(len(reports), 1)
+        self.assertIn('wait (<cell 6>:2)', reports[0]['data']['text/plain'])
+        os.remove(reports[0]['metadata']['qnotebook_profile']['collapsed'])
+
+
+if __name__ == "__main__":
+    unittest.main()
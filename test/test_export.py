@@ -0,0 +1,106 @@
+# coding=utf-8
+"""HTML export test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from utilities import plugin_module
+
+export = plugin_module('qnotebook_export')
+model = plugin_module('qnotebook_model')
+
+
+class RecordingFile(io.StringIO):
+    """StringIO remembering the size of every write."""
+
+    def __init__(self):
+        super().__init__()
+        self.sizes = []
+
+    def write(self, text):
+        self.sizes.append(len(text))
+        return super().write(text)
+
+
+def code_cell(source, outputs, execution_count=1):
+    return {'cell_type': 'code', 'source': source, 'metadata': {},
+            'execution_count': execution_count, 'outputs': outputs}
+
+
+def stream(text, name='stdout'):
+    return {'output_type': 'stream', 'name': name, 'text': text}
+
+
+class ExportTest(unittest.TestCase):
+    """Test write_html and export_html."""
+
+    def test_escaping(self):
+        notebook = model.NotebookModel.from_dict({'cells': [
+            code_cell('if a < b and c > d:\n    s = "<b>&amp;</b>"  # <tag>', [
+                stream('<script>alert(1)</script> & more\n'),
+                stream('x < y\n', 'stderr'),
+                {'output_type': 'execute_result', 'execution_count': 1, 'metadata': {},
+                 'data': {'text/plain': "'<b>'"}},
+                {'output_type': 'error', 'ename': 'ValueError', 'evalue': '<bad>',
+                 'traceback': ['\x1b[31mValueError\x1b[0m: <bad>']},
+            ]),
+            {'cell_type': 'raw', 'source': '<raw> & </raw>', 'metadata': {}},
+        ]})
+        f = io.StringIO()
+        export.write_html(f, notebook, title='Roads <&> rivers')
+        page = f.getvalue()
+
+        self.assertIn('<title>Roads &lt;&amp;&gt; rivers</title>', page)
+        self.assertIn('<span class="k">if</span> a &lt; b', page)
+        self.assertIn('<span class="s">&quot;&lt;b&gt;&amp;amp;&lt;/b&gt;&quot;</span>', page)
+        self.assertIn('<span class="c"># &lt;tag&gt;</span>', page)
+        self.assertIn('&lt;script&gt;alert(1)&lt;/script&gt; &amp; more', page)
+        self.assertIn('<div class="output stderr"><pre>x &lt; y', page)
+        self.assertIn('&#x27;&lt;b&gt;&#x27;', page)
+        self.assertIn('ValueError: &lt;bad&gt;', page)
+        self.assertNotIn('\x1b', page)
+        self.assertIn('<pre>&lt;raw&gt; &amp; &lt;/raw&gt;</pre>', page)
+        self.assertNotIn('<script>', page)
+
+    def test_large_outputs_cell_by_cell(self):
+        """Large notebooks are written a cell at a time, never as one page."""
+        text = ''.join(f'{i:07d} <row>\n' for i in range(100000))
+        cells = [code_cell(f'print(rows_{i})', [stream(text)], i + 1) for i in range(5)]
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        filename = os.path.join(directory, 'big.ipynb')
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({'cells': cells, 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 2}, f)
+        notebook = model.NotebookModel.load(filename)
+
+        f = RecordingFile()
+        export.write_html(f, notebook)
+        page = f.getvalue()
+
+        escaped = text.replace('<', '&lt;').replace('>', '&gt;')
+        self.assertEqual(page.count(escaped), 5)
+        self.assertLess(max(f.sizes), len(page) / 4)
+        positions = [page.index(f'rows_{i}') for i in range(5)]
+        self.assertEqual(positions, sorted(positions))
+        # Gli output letti dal file non restano decodificati in memoria
+        self.assertFalse(any(cell.outputs_loaded() for cell in notebook.cells))
+
+        html_file = os.path.join(directory, 'big.html')
+        export.export_html(notebook, html_file)
+        with open(html_file, encoding='utf-8') as f:
+            self.assertEqual(f.read(), page)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,69 @@
+# coding=utf-8
+"""Kernel process protocol test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import json
+import time
+import threading
+import unittest
+
+from qgis.PyQt.QtCore import QCoreApplication
+
+from utilities import plugin_module
+
+worker = plugin_module('qnotebook_kernel_worker')
+executor = plugin_module('qnotebook_executor')
+
+APP = QCoreApplication.instance() or QCoreApplication([])
+
+
+class RecordingWriter:
+    """ProtocolWriter keeping the events in a list.
+
+    Sends from the output pump are slowed down, so the last flush of a cell
+    overtakes a block the pump is still delivering unless they are ordered.
+    """
+
+    def __init__(self):
+        self.events = []
+        self.lock = threading.Lock()
+
+    def send(self, event, **fields):
+        fields['ev'] = event
+        if threading.current_thread() is not threading.main_thread():
+            time.sleep(0.2)
+        with self.lock:
+            self.events.append(fields)
+
+
+class KernelWorkerTest(unittest.TestCase):
+    """Test the request loop of the kernel process."""
+
+    def test_output_before_done(self):
+        """Every chunk, also those taken by the output pump, arrives in order before done."""
+        code = 'for i in range(20000):\n    print(i)'
+        requests = [json.dumps({'op': 'exec', 'id': 1, 'code': code, 'file': '<cell 1>'})]
+        writer = RecordingWriter()
+        original = executor.ExecutionJob.FLUSH_INTERVAL
+        # Pump il più frequente possibile: massima concorrenza con l'ultimo flush
+        executor.ExecutionJob.FLUSH_INTERVAL = 1
+        try:
+            worker.serve(iter(requests), writer, executor, {'__name__': '__main__'})
+        finally:
+            executor.ExecutionJob.FLUSH_INTERVAL = original
+
+        events = [event for event in writer.events if event.get('id') == 1]
+        self.assertEqual(events[-1]['ev'], 'done')
+        self.assertTrue(events[-1]['ok'])
+        text = ''.join(event['text'] for event in events if event['ev'] == 'out')
+        self.assertEqual(text, ''.join(f"{i}\n" for i in range(20000)))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+# coding=utf-8
+"""Line and cell magics test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import io
+import contextlib
+import unittest
+
+from utilities import plugin_module
+
+magics = plugin_module('qnotebook_magics')
+
+
+class MagicDispatcherTest(unittest.TestCase):
+    """Test the cells run through MagicDispatcher."""
+
+    def run_cell(self, namespace, source):
+        with contextlib.redirect_stdout(io.StringIO()) as stdout:
+            value = magics.MagicDispatcher(namespace, '<cell 1>').run(source)
+        return value, stdout.getvalue()
+
+    def test_namespace_stays_clean(self):
+        """The dispatcher is not stored among the user's variables."""
+        namespace = {}
+        _, output = self.run_cell(namespace, 'x = %time 6 * 7\n%timeit -n 1 -r 1 x + 1')
+        self.assertEqual(namespace['x'], 42)
+        self.assertIn('CPU time', output)
+        self.assertIn('per loop', output)
+        self.assertNotIn(magics.MAGIC_NAME, namespace)
+
+        _, output = self.run_cell(namespace, '%%timeit -n 1 -r 1\nx * 2')
+        self.assertIn('per loop', output)
+        self.assertNotIn(magics.MAGIC_NAME, namespace)
+
+    def test_function_with_magics(self):
+        """A function using a magic works when called from a later cell or outside any."""
+        namespace = {}
+        self.run_cell(namespace, 'base = 4\ndef double():\n    value = %time base * 2\n    return value')
+        value, output = self.run_cell(namespace, 'double()')
+        self.assertEqual(value, 8)
+        self.assertIn('CPU time', output)
+        namespace['base'] = 5
+        with contextlib.redirect_stdout(io.StringIO()):
+            self.assertEqual(namespace['double'](), 10)
+
+
+if __name__ == "__main__":
+    unittest.main()
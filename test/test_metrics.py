@@ -0,0 +1,38 @@
+# coding=utf-8
+"""Cell run metrics test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import tracemalloc
+import unittest
+
+from qnotebook_metrics import ExecutionMetrics, format_metrics, format_size
+
+
+class ExecutionMetricsTest(unittest.TestCase):
+    """Test the measurement of a cell run."""
+
+    def test_allocations(self):
+        """Allocations are measured only while tracing, which is then stopped."""
+        measure = ExecutionMetrics(trace_allocations=True)
+        measure.start()
+        data = bytearray(4 * 1024 * 1024)
+        metrics = measure.stop()
+
+        self.assertFalse(tracemalloc.is_tracing())
+        self.assertGreaterEqual(metrics['alloc_delta'], len(data))
+        self.assertIn('Python allocations: +4 MB', format_metrics(metrics, details=True))
+
+    def test_format(self):
+        self.assertEqual(format_size(-2048), '-2 KB')
+        self.assertEqual(format_metrics({'wall': 0.25}), '250 ms')
+        self.assertEqual(format_metrics({'wall': 75}), '1:15.0')
+
+
+if __name__ == "__main__":
+    unittest.main()
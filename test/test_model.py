@@ -0,0 +1,168 @@
+# coding=utf-8
+"""Notebook data model test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import io
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+import qnotebook_model
+from qnotebook_model import (
+    CellModel, NotebookModel, read_notebook, write_snapshot, parse_parameters,
+    PARAMETERS_TAG, INJECTED_PARAMETERS_TAG
+)
+from qnotebook_attachments import AttachmentStore, attach_store, attachment_directory
+
+
+class NotebookModelTest(unittest.TestCase):
+    """Test the widget-free notebook model."""
+
+    def test_round_trip(self):
+        """A notebook saved and loaded again keeps sources and outputs."""
+        notebook = NotebookModel([
+            CellModel('markdown', '# Title\n'),
+            CellModel('code', 'x = 1\nprint(x)', execution_count=3, outputs=[
+                {'output_type': 'stream', 'name': 'stdout', 'text': '1\n'}]),
+        ])
+        handle, path = tempfile.mkstemp(suffix='.ipynb')
+        os.close(handle)
+        try:
+            notebook.save(path)
+            loaded = NotebookModel.load(path)
+        finally:
+            os.remove(path)
+
+        self.assertEqual([cell.source for cell in loaded.cells], ['# Title\n', 'x = 1\nprint(x)'])
+        self.assertEqual(loaded.cells[1].execution_count, 3)
+        self.assertEqual(loaded.cells[1].output_text(), '1\n')
+        self.assertNotIn('outputs', loaded.cells[0].to_dict())
+
+    def test_streaming_reader(self):
+        """Cells are read in small chunks and outputs are decoded on demand."""
+        data = {
+            'cells': [
+                {'cell_type': 'code', 'source': ['s = "a\\"]}{"\n', 'x = 1'], 'execution_count': 2,
+                 'metadata': {'tags': ['parameters']},
+                 'outputs': [{'output_type': 'stream', 'name': 'stdout', 'text': 'ok "]"\n'}]},
+                {'cell_type': 'markdown', 'source': '# Titolo è', 'metadata': {}},
+            ],
+            'metadata': {'kernelspec': {'name': 'qgis_python'}},
+            'nbformat': 4,
+            'nbformat_minor': 4,
+        }
+        original_chunk_size = qnotebook_model._JSONScanner.CHUNK_SIZE
+        qnotebook_model._JSONScanner.CHUNK_SIZE = 5
+        try:
+            notebook = read_notebook(io.BytesIO(json.dumps(data, indent=1).encode('utf-8')))
+        finally:
+            qnotebook_model._JSONScanner.CHUNK_SIZE = original_chunk_size
+
+        code, markdown = notebook.cells
+        self.assertEqual(code.source, 's = "a\\"]}{"\nx = 1')
+        self.assertEqual(code.metadata, {'tags': ['parameters']})
+        self.assertFalse(code.outputs_loaded())
+        self.assertTrue(code.has_outputs())
+        self.assertEqual(code.outputs, data['cells'][0]['outputs'])
+        self.assertEqual(markdown.source, '# Titolo è')
+        self.assertEqual(notebook.nbformat_minor, 4)
+
+    def test_cell_ids(self):
+        """Notebooks in nbformat 4.5 keep their cell ids; new cells get one."""
+        data = {
+            'cells': [{'id': 'intro', 'cell_type': 'markdown', 'source': '# Roads', 'metadata': {}}],
+            'metadata': {},
+            'nbformat': 4,
+            'nbformat_minor': 5,
+        }
+        notebook = read_notebook(io.BytesIO(json.dumps(data).encode('utf-8')))
+        notebook.cells.append(CellModel('code', 'x = 1'))
+        notebook.cells.append(CellModel('code', 'y = 2'))
+        notebook.cells[2].nb_id = 'intro'
+
+        output = io.BytesIO()
+        write_snapshot(output, notebook.snapshot())
+        saved = json.loads(output.getvalue().decode('utf-8'))
+        ids = [cell.get('id') for cell in saved['cells']]
+        self.assertEqual(saved['nbformat_minor'], 5)
+        self.assertEqual(ids[0], 'intro')
+        self.assertTrue(all(ids))
+        self.assertEqual(len(set(ids)), 3)
+
+        # Prima della 4.5 gli id non sono ammessi
+        self.assertNotIn('id', NotebookModel([CellModel()]).to_dict()['cells'][0])
+
+    def test_attachments(self):
+        """Large outputs are saved once in the store and read back transparently."""
+        big = {'output_type': 'stream', 'name': 'stdout', 'text': 'x' * 100000}
+        small = {'output_type': 'stream', 'name': 'stdout', 'text': 'ok\n'}
+        notebook = NotebookModel([CellModel(outputs=[big, small]), CellModel(outputs=[big])])
+        folder = tempfile.mkdtemp()
+        path = os.path.join(folder, 'big.ipynb')
+
+        def save(notebook, threshold):
+            store = AttachmentStore(attachment_directory(path), threshold, notebook.attachments)
+            with open(path, 'wb') as f:
+                write_snapshot(f, notebook.snapshot(), store)
+            return store
+
+        try:
+            save(notebook, 1024).prune()
+            self.assertLess(os.path.getsize(path), 2000)
+            self.assertEqual(len(os.listdir(attachment_directory(path))), 1)
+
+            loaded = attach_store(NotebookModel.load(path), path)
+            self.assertEqual(loaded.cells[0].outputs, [big, small])
+            save(loaded, 1024).prune()
+            self.assertEqual(len(os.listdir(attachment_directory(path))), 1)
+
+            # Salvato da un altro programma con un'altra formattazione JSON
+            with open(path, encoding='utf-8') as f:
+                data = json.load(f)
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, separators=(',', ':'))
+            save(attach_store(NotebookModel.load(path), path), 1024).prune()
+            self.assertEqual(len(os.listdir(attachment_directory(path))), 1)
+            self.assertEqual(attach_store(NotebookModel.load(path), path).cells[1].outputs, [big])
+
+            # Senza soglia gli output tornano inline
+            save(attach_store(NotebookModel.load(path), path), None)
+            self.assertEqual(NotebookModel.load(path).cells[1].outputs, [big])
+        finally:
+            shutil.rmtree(folder)
+
+    def test_inject_parameters(self):
+        """Parameters are injected after the parameters cell, replacing earlier ones."""
+        parameters = CellModel(source='town = "x"')
+        parameters.set_tag(PARAMETERS_TAG)
+        notebook = NotebookModel([CellModel(source='import os'), parameters, CellModel(source='print(town)')])
+
+        notebook.inject_parameters({'town': 'Parma', 'bbox': [1, 2, 3, 4]})
+        self.assertEqual(notebook.inject_parameters({'town': 'Lugo'}), 2)
+        self.assertEqual(len(notebook.cells), 4)
+        self.assertTrue(notebook.cells[2].has_tag(INJECTED_PARAMETERS_TAG))
+        self.assertEqual(parse_parameters(notebook.cells[2].source), {'town': 'Lugo'})
+        self.assertRaises(ValueError, parse_parameters, 'town = input()')
+
+    def test_find(self):
+        """Search looks at the source of every cell."""
+        notebook = NotebookModel([CellModel(source='layer = iface.activeLayer()'),
+                                  CellModel(source='print(Layer)')])
+        self.assertEqual(notebook.find('layer'), [0, 1])
+        self.assertEqual(notebook.find('(Layer)', case_sensitive=True), [1])
+
+    def test_unique_ids(self):
+        """Every cell gets its own id."""
+        self.assertNotEqual(CellModel().cell_id, CellModel().cell_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
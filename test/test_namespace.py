@@ -0,0 +1,63 @@
+# coding=utf-8
+"""Lazy namespace modules test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import sys
+import types
+import unittest
+
+from qnotebook_namespace import LazyModule, MAX_TIMINGS, is_available, startup_timings, timed
+
+from utilities import plugin_module
+
+
+class LazyModuleTest(unittest.TestCase):
+    """Test the modules imported on first use."""
+
+    def test_imports_on_first_access(self):
+        """The proxy imports the module and replaces itself in the namespace."""
+        sys.modules.pop('colorsys', None)
+        namespace = {}
+        namespace['colorsys'] = LazyModule('colorsys', namespace, 'colorsys')
+        self.assertNotIn('colorsys', sys.modules)
+
+        exec("value = colorsys.rgb_to_hsv(1, 0, 0)", namespace)
+        self.assertEqual(namespace['value'], (0.0, 1.0, 1))
+        self.assertIs(namespace['colorsys'], sys.modules['colorsys'])
+
+    def test_processing_hook(self):
+        """processing imported by a cell gets the cancellable run wrappers."""
+        namespace_module = plugin_module('qnotebook_namespace')
+        processing = types.ModuleType('processing')
+        processing.run = lambda algorithm, parameters=None: algorithm
+        sys.modules['processing'] = processing
+        try:
+            namespace = {}
+            namespace['processing'] = namespace_module.LazyModule('processing', namespace, 'processing')
+            run = namespace['processing'].run
+            self.assertTrue(getattr(run, '_qnotebook_wrapped', False))
+            self.assertTrue(processing.run._qnotebook_wrapped)
+        finally:
+            del sys.modules['processing']
+
+    def test_timings_capped(self):
+        """Restarts do not make the recorded timings grow without limit."""
+        for _ in range(MAX_TIMINGS * 2):
+            with timed("namespace"):
+                pass
+        self.assertEqual(len(startup_timings), MAX_TIMINGS)
+
+    def test_availability(self):
+        """Missing modules are detected without importing them."""
+        self.assertTrue(is_available('json'))
+        self.assertFalse(is_available('qnotebook_missing_module.pyplot'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+# coding=utf-8
+"""Bounded cell output test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from qnotebook_output import CellOutputStore, keep_reference
+
+
+class CellOutputStoreTest(unittest.TestCase):
+    """Test the truncation of long outputs and its round trip."""
+
+    def setUp(self):
+        self.store = CellOutputStore(limit=100)
+        self.text = ''.join(f"{i:04d}\n" for i in range(200))
+        self.store.write(self.text)
+        self.addCleanup(self.store.reset)
+
+    def test_reference_only_after_run(self):
+        # Il file temporaneo è ancora aperto: non va nel notebook
+        self.assertIsNone(self.store.reference())
+        self.store.close()
+        self.assertEqual(self.store.reference(), {'path': self.store.path, 'size': 1000})
+
+    def test_reload_keeps_full_output(self):
+        self.store.close()
+        saved_text = self.store.text()
+        reference = self.store.reference()
+        self.assertIn('900 characters not shown', saved_text)
+
+        # Ricaricato (o rimaterializzato) più volte: nessun nuovo file, stesso testo
+        for _ in range(2):
+            reloaded = CellOutputStore(limit=100)
+            reloaded.load_truncated(saved_text, dict(reference))
+            self.assertEqual(reloaded.text(), saved_text)
+            self.assertEqual(reloaded.reference(), reference)
+            self.assertFalse(reloaded.owned)
+            saved_text = reloaded.text()
+        with open(reference['path'], encoding='utf-8') as f:
+            self.assertEqual(f.read(), self.text)
+
+    def test_keep_next_to_notebook(self):
+        self.store.close()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        notebook = os.path.join(directory, 'roads.ipynb')
+        self.assertTrue(self.store.keep(notebook))
+        path = self.store.reference()['path']
+        self.assertEqual(os.path.dirname(path), directory)
+        self.assertTrue(os.path.basename(path).startswith('roads.output-'))
+        # Appartiene al notebook salvato: reset non lo cancella
+        self.store.reset()
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), self.text)
+
+    def test_saves_after_renumbering(self):
+        """Cells inserted or deleted between saves do not overwrite each other's output."""
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        notebook = os.path.join(directory, 'nb.ipynb')
+        stores = []
+        for letter in 'AB':
+            store = CellOutputStore(limit=100)
+            store.write(letter * 1000)
+            store.close()
+            self.addCleanup(store.reset)
+            stores.append(store)
+
+        # Primo salvataggio, poi una cella inserita sopra e un nuovo salvataggio
+        for _ in range(2):
+            for store in stores:
+                store.keep(notebook)
+        for store, letter in zip(stores, 'AB'):
+            with open(store.reference()['path'], encoding='utf-8') as f:
+                self.assertEqual(f.read(), letter * 1000)
+        self.assertEqual(len(os.listdir(directory)), 2)
+
+    def test_save_as_copies(self):
+        """Saving under another name leaves the first notebook's files in place."""
+        self.store.close()
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.store.keep(os.path.join(directory, 'first.ipynb'))
+        reference = self.store.reference()
+
+        reloaded = CellOutputStore(limit=100)
+        reloaded.load_truncated(self.store.text(), dict(reference))
+        self.assertTrue(reloaded.keep(os.path.join(directory, 'second.ipynb')))
+        self.assertTrue(os.path.exists(reference['path']))
+        self.assertNotEqual(reloaded.reference()['path'], reference['path'])
+
+        moved = dict(reference)
+        self.assertTrue(keep_reference(moved, os.path.join(directory, 'third.ipynb')))
+        self.assertTrue(os.path.exists(reference['path']))
+        self.assertEqual(len(os.listdir(directory)), 3)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+# coding=utf-8
+"""Cell output batching and back-pressure test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import time
+import threading
+import unittest
+
+from qgis.PyQt.QtCore import QCoreApplication
+
+from utilities import plugin_module
+
+executor = plugin_module('qnotebook_executor')
+
+APP = QCoreApplication.instance() or QCoreApplication([])
+
+
+class OutputStreamTest(unittest.TestCase):
+    """Test OutputStream on its own and inside a streaming ExecutionJob."""
+
+    def test_batches(self):
+        stream = executor.OutputStream(flush_size=10, max_pending=100)
+        self.assertFalse(stream.write('stdout', 'abc'))
+        self.assertFalse(stream.write('stdout', 'def'))
+        self.assertFalse(stream.write('stderr', 'E'))
+        # Una sola richiesta di flush finché il buffer non viene prelevato
+        self.assertTrue(stream.write('stdout', 'ghij'))
+        self.assertFalse(stream.write('stdout', 'klmnopq'))
+
+        self.assertEqual(stream.take(), [('stdout', 'abcdef'), ('stderr', 'E'),
+                                         ('stdout', 'ghijklmnopq')])
+        self.assertEqual(stream.size, 0)
+        self.assertEqual(stream.take(), [])
+        self.assertTrue(stream.write('stdout', 'x' * 10))
+
+    def test_back_pressure(self):
+        """A blocking writer waits for the reader once max_pending characters are queued."""
+        stream = executor.OutputStream(flush_size=10, max_pending=100)
+        stream.blocking = True
+        written = []
+
+        def writer():
+            for _ in range(30):
+                stream.write('stdout', 'x' * 10)
+                written.append(1)
+
+        thread = threading.Thread(target=writer)
+        thread.start()
+        time.sleep(0.3)
+        self.assertEqual(len(written), 10)
+        self.assertEqual(stream.size, 100)
+
+        received = ''
+        while thread.is_alive() or stream.size:
+            chunks = stream.take()
+            received += ''.join(text for _, text in chunks)
+            time.sleep(0.01)
+        thread.join()
+        self.assertEqual(received, 'x' * 300)
+
+        # Il lettore se ne va: lo scrittore non resta bloccato
+        for _ in range(10):
+            stream.write('stdout', 'x' * 10)
+        thread = threading.Thread(target=stream.write, args=('stdout', 'y'))
+        thread.start()
+        stream.release()
+        thread.join(1)
+        self.assertFalse(thread.is_alive())
+
+    def test_streaming_job(self):
+        """Output written much faster than the flush interval arrives in few bounded batches."""
+        code = 'for i in range(20000):\n    print(i)'
+        job = executor.ExecutionJob(code, {}, '<cell 1>')
+        job.output.max_pending = 4096
+        batches = []
+        pending = []
+        job.stdout.connect(lambda text: (batches.append(text), pending.append(job.output.size)))
+        finished = []
+        job.finished.connect(finished.append)
+
+        job.start_streaming()
+        thread = threading.Thread(target=job.run)
+        thread.start()
+        deadline = time.time() + 30
+        while not finished and time.time() < deadline:
+            APP.processEvents()
+            time.sleep(0.005)
+        thread.join(5)
+
+        self.assertEqual(finished, [True])
+        self.assertEqual(''.join(batches), ''.join(f'{i}\n' for i in range(20000)))
+        self.assertLess(len(batches), 200)
+        self.assertLessEqual(max(len(batch) for batch in batches), 4096 + 16)
+        self.assertLessEqual(max(pending), 4096 + 16)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+# coding=utf-8
+"""Cell profiling magics test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from qnotebook_profiler import (PROFILE_MIME, PROFILE_KEY, create_profiler, keep_profile,
+                                split_cell_magic)
+
+
+SOURCE = """%%{}
+def square(n):
+    return n * n
+total = 0
+for i in range(100):
+    total += square(i)
+"""
+
+
+def run(profiler, body, filename):
+    namespace = {}
+    profiler.run(exec, compile(body, filename, 'exec'), namespace)
+    return namespace
+
+
+class ProfilerTest(unittest.TestCase):
+    """Test %%prun and %%lprun."""
+
+    def test_split(self):
+        self.assertEqual(split_cell_magic('%%prun -s cumulative\nx = 1'),
+                         ('prun', '-s cumulative', '\nx = 1'))
+        self.assertEqual(split_cell_magic('x = 1'), (None, '', 'x = 1'))
+
+    def test_functions(self):
+        name, args, body = split_cell_magic(SOURCE.format('prun -s ncalls'))
+        profiler = create_profiler(name, args, body, '<cell 1>')
+        self.assertEqual(run(profiler, body, '<cell 1>')['total'], 328350)
+
+        output = profiler.output()
+        profile = output['data'][PROFILE_MIME]
+        self.assertEqual(profile['rows'][0][0], '100')
+        self.assertEqual(profile['rows'][0][-1], '<cell 1>:2(square)')
+        path = output['metadata'][PROFILE_KEY]['pstats']
+        self.assertTrue(os.path.getsize(path))
+        os.remove(path)
+
+    def test_lines(self):
+        name, args, body = split_cell_magic(SOURCE.format('lprun'))
+        profiler = create_profiler(name, args, body, '<cell 2>')
+        run(profiler, body, '<cell 2>')
+
+        rows = profiler.output()['data'][PROFILE_MIME]['rows']
+        lines = {row[0]: row for row in rows}
+        # Le righe sono quelle della cella, compresa la riga %%lprun
+        self.assertEqual(lines[3][1], 100)
+        self.assertEqual(lines[5][1], 101)
+        self.assertEqual(lines[5][-1], 'for i in range(100):')
+
+
+class KeepProfileTest(unittest.TestCase):
+    """Test keeping the profile files next to the saved notebook."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def profiled_output(self, source):
+        name, args, body = split_cell_magic(source)
+        profiler = create_profiler(name, args, body, '<cell 1>')
+        run(profiler, body, '<cell 1>')
+        return profiler.output()
+
+    def test_saves_after_renumbering(self):
+        """Profiles of cells renumbered between saves do not overwrite each other."""
+        notebook = os.path.join(self.directory, 'nb.ipynb')
+        outputs = [self.profiled_output(SOURCE.format('prun')),
+                   self.profiled_output('%%prun\nx = sorted(range(1000))')]
+        temporary = [output['metadata'][PROFILE_KEY]['pstats'] for output in outputs]
+        for _ in range(2):
+            for output in outputs:
+                keep_profile(output, notebook)
+
+        paths = [output['metadata'][PROFILE_KEY]['pstats'] for output in outputs]
+        self.assertEqual(len(set(paths)), 2)
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         sorted(os.path.basename(path) for path in paths))
+        self.assertFalse(any(os.path.exists(path) for path in temporary))
+
+    def test_save_as_copies(self):
+        output = self.profiled_output(SOURCE.format('prun'))
+        keep_profile(output, os.path.join(self.directory, 'first.ipynb'))
+        first = output['metadata'][PROFILE_KEY]['pstats']
+
+        self.assertEqual(len(keep_profile(output, os.path.join(self.directory, 'second.ipynb'))), 1)
+        self.assertTrue(os.path.exists(first))
+        self.assertTrue(os.path.basename(output['metadata'][PROFILE_KEY]['pstats'])
+                        .startswith('second.profile-'))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,104 @@
+# coding=utf-8
+"""Result cache test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import shutil
+import tempfile
+import unittest
+
+from qgis.PyQt.QtCore import QCoreApplication
+
+from utilities import plugin_module
+
+resultcache = plugin_module('qnotebook_resultcache')
+executor = plugin_module('qnotebook_executor')
+
+APP = QCoreApplication.instance() or QCoreApplication([])
+
+
+def make_adder(step):
+    def add(x):
+        return x + step
+    return add
+
+
+class ResultCacheTest(unittest.TestCase):
+    """Test cache hits and misses of cells run through ExecutionJob."""
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.cache = resultcache.ResultCache(directory, max_bytes=10 * 1024 * 1024)
+
+    def run_cell(self, code, namespace):
+        job = executor.ExecutionJob(code, namespace, '<cell 1>')
+        job.result_cache = self.cache
+        job.run()
+        self.assertTrue(job.ok, job.exception)
+        return job
+
+    def test_hit(self):
+        code = 'total = sum(values)\nprint(total)'
+        first = self.run_cell(code, {'values': [1, 2, 3]})
+        namespace = {'values': [1, 2, 3]}
+        second = self.run_cell(code, namespace)
+
+        self.assertFalse(first.from_cache)
+        self.assertTrue(second.from_cache)
+        self.assertEqual(namespace['total'], 6)
+        self.assertEqual(''.join(text for _, text in second.transcript), '6\n')
+
+    def test_miss_on_changed_input(self):
+        code = 'total = sum(values)'
+        self.run_cell(code, {'values': [1, 2, 3]})
+        namespace = {'values': [1, 2, 4]}
+        job = self.run_cell(code, namespace)
+
+        self.assertFalse(job.from_cache)
+        self.assertEqual(namespace['total'], 7)
+
+    def test_in_place_mutation(self):
+        """A hit leaves a variable changed in place as the run did."""
+        code = 'values.append(5)'
+        executed = {'values': [1, 2]}
+        self.run_cell(code, executed)
+        replayed = {'values': [1, 2]}
+        job = self.run_cell(code, replayed)
+
+        self.assertTrue(job.from_cache)
+        self.assertEqual(replayed['values'], executed['values'])
+        self.assertEqual(replayed['values'], [1, 2, 5])
+
+    def test_changed_closure(self):
+        code = 'y = add(1)'
+        self.run_cell(code, {'add': make_adder(1)})
+        namespace = {'add': make_adder(10)}
+        job = self.run_cell(code, namespace)
+
+        self.assertFalse(job.from_cache)
+        self.assertEqual(namespace['y'], 11)
+
+    def test_changed_global_of_function(self):
+        namespace = {}
+        exec('scale = 2\ndef grow(x):\n    return x * scale', namespace)
+        self.run_cell('y = grow(3)', namespace)
+        namespace['scale'] = 5
+        job = self.run_cell('y = grow(3)', namespace)
+
+        self.assertFalse(job.from_cache)
+        self.assertEqual(namespace['y'], 15)
+
+    def test_changed_default(self):
+        first = resultcache.fingerprint(lambda x, step=1: x + step)
+        second = resultcache.fingerprint(lambda x, step=2: x + step)
+        self.assertNotEqual(first, second)
+
+
+if __name__ == "__main__":
+    unittest.main()
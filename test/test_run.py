@@ -0,0 +1,107 @@
+# coding=utf-8
+"""Headless notebook runner test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import json
+import shutil
+import tempfile
+import unittest
+
+from qgis.PyQt.QtCore import QCoreApplication
+
+from utilities import plugin_module
+
+run = plugin_module('run')
+model = plugin_module('qnotebook_model')
+
+APP = QCoreApplication.instance() or QCoreApplication([])
+
+
+class RunNotebookTest(unittest.TestCase):
+    """Test run_notebook: exit codes, saved outputs and --report."""
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def notebook(self, *sources):
+        filename = os.path.join(self.directory, 'analysis.ipynb')
+        cells = [{'cell_type': 'code', 'source': source, 'metadata': {},
+                  'execution_count': None, 'outputs': []} for source in sources]
+        with open(filename, 'w', encoding='utf-8') as f:
+            json.dump({'cells': cells, 'metadata': {}, 'nbformat': 4, 'nbformat_minor': 2}, f)
+        return filename
+
+    def test_success(self):
+        filename = self.notebook('x = 20', 'print(x + 1)')
+        report = os.path.join(self.directory, 'report.json')
+        self.assertEqual(run.run_notebook(filename, report=report, quiet=True), 0)
+
+        cells = model.NotebookModel.load(filename).cells
+        self.assertEqual([cell.execution_count for cell in cells], [1, 2])
+        self.assertEqual(cells[1].output_text(), '21\n')
+        with open(report, encoding='utf-8') as f:
+            data = json.load(f)
+        self.assertEqual(data['notebook'], filename)
+        self.assertTrue(data['ok'])
+        self.assertEqual([cell['index'] for cell in data['cells']], [0, 1])
+        self.assertTrue(all(cell['ok'] and cell['seconds'] >= 0 for cell in data['cells']))
+
+    def test_cell_error(self):
+        """A failing cell gives exit code 1 and stops the run unless errors are allowed."""
+        filename = self.notebook('x = 1', '1 / 0', 'y = 2')
+        report = os.path.join(self.directory, 'report.json')
+        output = os.path.join(self.directory, 'executed.ipynb')
+        self.assertEqual(run.run_notebook(filename, output, report=report, quiet=True), 1)
+
+        with open(report, encoding='utf-8') as f:
+            data = json.load(f)
+        self.assertFalse(data['ok'])
+        self.assertEqual(len(data['cells']), 2)
+        self.assertEqual(data['cells'][1]['error'], 'ZeroDivisionError')
+        self.assertEqual(model.NotebookModel.load(output).cells[2].execution_count, 0)
+        # Il notebook originale non viene toccato con --output
+        self.assertFalse(model.NotebookModel.load(filename).cells[0].execution_count)
+
+        self.assertEqual(run.run_notebook(filename, output, allow_errors=True, quiet=True), 1)
+        self.assertEqual(model.NotebookModel.load(output).cells[2].execution_count, 3)
+
+    def test_unreadable_notebook(self):
+        broken = os.path.join(self.directory, 'broken.ipynb')
+        with open(broken, 'w', encoding='utf-8') as f:
+            f.write('{"cells": [')
+        self.assertEqual(run.run_notebook(broken, quiet=True), 2)
+        self.assertEqual(run.run_notebook(os.path.join(self.directory, 'missing.ipynb'),
+                                          quiet=True), 2)
+
+    def test_unwritable_report(self):
+        filename = self.notebook('x = 1')
+        report = os.path.join(self.directory, 'missing', 'report.json')
+        self.assertEqual(run.run_notebook(filename, report=report, quiet=True), 2)
+
+    def test_parameters(self):
+        filename = self.notebook('buffer = 10', 'print(buffer * 2)')
+        notebook = model.NotebookModel.load(filename)
+        notebook.cells[0].set_tag(model.PARAMETERS_TAG)
+        notebook.save(filename)
+        self.assertEqual(run.run_notebook(filename, quiet=True, parameters={'buffer': 25}), 0)
+        cells = model.NotebookModel.load(filename).cells
+        self.assertEqual(cells[-1].output_text(), '50\n')
+
+    def test_bad_arguments(self):
+        """Arguments that cannot be used give exit code 2 before anything runs."""
+        filename = self.notebook('x = 1')
+        missing = os.path.join(self.directory, 'missing.json')
+        self.assertEqual(run.main([filename, '--parameters', missing]), 2)
+        self.assertEqual(run.main([filename, filename, '-o', 'out.ipynb']), 2)
+        self.assertFalse(model.NotebookModel.load(filename).cells[0].execution_count)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+# coding=utf-8
+"""Sampling profiler test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import os
+import time
+import threading
+import unittest
+
+from utilities import plugin_module
+
+sampler = plugin_module('qnotebook_sampler')
+STACKS_MIME, PROFILE_KEY, StackSampler = sampler.STACKS_MIME, sampler.PROFILE_KEY, sampler.StackSampler
+
+
+def busy_loop(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+class SamplerTest(unittest.TestCase):
+    """Test StackSampler on a busy thread."""
+
+    def test_attach_to_running_thread(self):
+        stop = threading.Event()
+        thread = threading.Thread(target=busy_loop, args=(stop,))
+        thread.start()
+        try:
+            # Agganciato a un thread già in esecuzione
+            sampler = StackSampler(thread.ident, 0.002)
+            sampler.start()
+            time.sleep(0.2)
+            sampler.stop()
+        finally:
+            stop.set()
+            thread.join()
+
+        label = f'busy_loop (test_sampler.py:{busy_loop.__code__.co_firstlineno})'
+        self.assertGreater(sampler.samples, 0)
+        self.assertIn(label, sampler.collapsed())
+        self.assertEqual(sampler.functions()[0][0], label)
+        self.assertIn('busy_loop (test_sampler.py:', sampler.last_stack[-1])
+
+        output = sampler.output()
+        self.assertEqual(output['data'][STACKS_MIME]['samples'], sampler.samples)
+        self.assertIn('Last stack', output['data']['text/plain'])
+        path = output['metadata'][PROFILE_KEY]['collapsed']
+        with open(path, encoding='utf-8') as f:
+            self.assertEqual(f.read(), sampler.collapsed())
+        os.remove(path)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,55 @@
+# coding=utf-8
+"""Kernel session test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import unittest
+
+from qgis.PyQt.QtCore import QCoreApplication
+
+from utilities import plugin_module
+
+session_module = plugin_module('qnotebook_session')
+
+APP = QCoreApplication.instance() or QCoreApplication([])
+
+
+class SessionTest(unittest.TestCase):
+    """Test the state shared by the notebook views."""
+
+    def test_execution_count(self):
+        """Runs are numbered by the session, and a restart starts again from 1."""
+        session = session_module.QNotebookSession()
+        self.assertEqual(session.next_execution_count(), 1)
+        self.assertEqual(session.next_execution_count(), 2)
+        session.restart()
+        self.assertEqual(session.next_execution_count(), 1)
+
+    def test_restart_keeps_console_attached(self):
+        """After a restart the console shares the new namespace with the notebooks."""
+        class Shell:
+            locals = {'console_name': 1}
+
+        shell = Shell()
+        session = session_module.QNotebookSession()
+        session.attach_console(shell)
+        session.namespace['x'] = 1
+        self.assertEqual(shell.locals['x'], 1)
+
+        session.restart()
+        self.assertIs(session.console_shell, shell)
+        self.assertIs(shell.locals, session.namespace)
+        self.assertNotIn('x', shell.locals)
+        self.assertEqual(shell.locals['console_name'], 1)
+        self.assertIn('QgsProject', shell.locals)
+        session.namespace['y'] = 2
+        self.assertEqual(shell.locals['y'], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,87 @@
+# coding=utf-8
+"""Profiled run timeline test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+import sys
+import time
+import cProfile
+import unittest
+
+from qnotebook_timeline import IOTracer, Timeline, make_span
+
+
+class TimelineTest(unittest.TestCase):
+    """Test the timeline of a "Profile Run All"."""
+
+    def setUp(self):
+        self.timeline = Timeline()
+        self.timeline.extend([
+            make_span('cell 1', 'cell', 100.0, 110.0),
+            make_span('processing.run(native:buffer)', 'processing', 101.0, 104.0),
+            make_span('processing.run(native:dissolve)', 'processing', 102.0, 103.0),
+            make_span('cell 2', 'cell', 110.0, 112.0),
+        ])
+
+    def test_layout(self):
+        """Nested spans are one level below the spans containing them."""
+        depths = [(span['name'], depth) for span, depth in self.timeline.layout()]
+        self.assertEqual(depths, [('cell 1', 0), ('processing.run(native:buffer)', 1),
+                                  ('processing.run(native:dissolve)', 2), ('cell 2', 0)])
+        # Gli algoritmi annidati non sono contati due volte
+        self.assertEqual(self.timeline.totals(), {'cell': 12.0, 'processing': 3.0})
+
+    def test_chrome_trace(self):
+        events = self.timeline.to_chrome_trace()['traceEvents']
+        self.assertEqual(events[-1], {'name': 'cell 2', 'cat': 'cell', 'ph': 'X', 'pid': 1, 'tid': 1,
+                                      'ts': 10e6, 'dur': 2e6, 'args': {}})
+
+    def test_io_tracer(self):
+        """Consecutive calls to the same I/O function become one span."""
+        spans = []
+        tracer = IOTracer(spans)
+        tracer.classify = lambda function: 'sleep' if function is time.sleep else None
+        tracer.start()
+        try:
+            time.sleep(0.01)
+            time.sleep(0.01)
+        finally:
+            tracer.stop()
+
+        self.assertEqual(len(spans), 1)
+        self.assertEqual(spans[0]['args']['calls'], 2)
+        self.assertGreaterEqual(tracer.total, 0.02)
+
+    def test_io_tracer_with_profiler(self):
+        """cProfile replacing the hook is detected, and an active one is left alone."""
+        tracer = IOTracer([])
+        tracer.start()
+        profile = cProfile.Profile()
+        profile.enable()
+        profile.disable()
+        tracer.stop()
+        self.assertTrue(tracer.skipped)
+        self.assertIsNone(sys.getprofile())
+
+        profile.enable()
+        try:
+            tracer = IOTracer([])
+            tracer.start()
+            tracer.stop()
+            self.assertIs(sys.getprofile(), profile)
+        finally:
+            profile.disable()
+        self.assertTrue(tracer.skipped)
+        tracer = IOTracer([])
+        tracer.start()
+        tracer.stop()
+        self.assertFalse(tracer.skipped)
+
+
+if __name__ == "__main__":
+    unittest.main()
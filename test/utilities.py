@@ -1,8 +1,10 @@
 # coding=utf-8
 """Common functionality used by regression tests."""
 
+import os
 import sys
 import logging
+import importlib
 
 
 LOGGER = logging.getLogger('QGIS')
@@ -12,6 +14,19 @@ PARENT = None
 IFACE = None
 
 
+def plugin_module(name):
+    """Import the plugin module ``name`` as part of the plugin package.
+
+    For the modules using relative imports, which cannot be imported on
+    their own like qnotebook_model.
+    """
+    plugin_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    parent, package = os.path.split(plugin_dir)
+    if parent not in sys.path:
+        sys.path.insert(0, parent)
+    return importlib.import_module(f"{package}.{name}")
+
+
 def get_qgis_app():
     """ Start one QGIS application to test against.
 